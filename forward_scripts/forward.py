@@ -4,7 +4,6 @@ import logging
 from omegaconf import OmegaConf
 import os
 import sys
-import numpy as np
 
 
 DIR = os.path.dirname(os.path.realpath(__file__))
@@ -22,6 +21,7 @@ from src.datasets.base_dataset import BaseDataset
 # Import from metrics
 from src.metrics.colored_tqdm import Coloredtqdm as Ctq
 from src.metrics.model_checkpoint import ModelCheckpoint
+from src.metrics.prediction_writer import PredictionWriter, RemainingSamples
 
 # Utils import
 from src.utils.colors import COLORS
@@ -29,26 +29,26 @@ from src.utils.colors import COLORS
 log = logging.getLogger(__name__)
 
 
-def save(prefix, predicted):
-    for key, value in predicted.items():
-        filename = os.path.splitext(key)[0]
-        out_file = filename + "_pred"
-        np.save(os.path.join(prefix, out_file), value)
-
-
-def run(model: BaseModel, dataset: BaseDataset, device, output_path):
+def run(model: BaseModel, dataset: BaseDataset, device, writer: PredictionWriter):
     loaders = dataset.test_dataloaders
-    predicted = {}
     for loader in loaders:
-        loader.dataset.name
         with Ctq(loader) as tq_test_loader:
             for data in tq_test_loader:
                 with torch.no_grad():
                     model.set_input(data, device)
                     model.forward()
-                predicted = {**predicted, **dataset.predict_original_samples(data, model.conv_type, model.get_output())}
+                output = model.get_output()
+                if writer.save_probabilities:
+                    predicted, probabilities = dataset.predict_original_samples(
+                        data, model.conv_type, output, with_probabilities=True
+                    )
+                else:
+                    predicted, probabilities = dataset.predict_original_samples(data, model.conv_type, output), {}
 
-    save(output_path, predicted)
+                # All the points of a sample are in the same batch, its predictions are complete
+                for name, prediction in predicted.items():
+                    writer.write(name, prediction, probabilities.get(name))
+    writer.close()
 
 
 @hydra.main(config_path="conf/config.yaml")
@@ -82,6 +82,16 @@ def main(cfg):
     log.info(model)
     log.info("Model size = %i", sum(param.numel() for param in model.parameters() if param.requires_grad))
 
+    writer = PredictionWriter(
+        cfg.output_path,
+        output_format=cfg.get("output_format", "npy"),
+        save_probabilities=cfg.get("save_probabilities", False),
+    )
+
+    # Skip the samples predicted by a previous run
+    if cfg.get("resume", False):
+        dataset.test_dataset = [RemainingSamples(test_dataset, writer) for test_dataset in dataset.test_dataset]
+
     # Set dataloaders
     dataset.create_dataloaders(
         model, cfg.batch_size, cfg.shuffle, cfg.num_workers, False,
@@ -93,11 +103,7 @@ def main(cfg):
         model.enable_dropout_in_eval()
     model = model.to(device)
 
-    # Run training / evaluation
-    if not os.path.exists(cfg.output_path):
-        os.makedirs(cfg.output_path)
-
-    run(model, dataset, device, cfg.output_path)
+    run(model, dataset, device, writer)
 
 
 if __name__ == "__main__":
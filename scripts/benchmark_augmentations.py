@@ -0,0 +1,64 @@
+# Benchmark of the per sample time of an augmentation chain applied transform by transform and with the affine
+# transforms fused into a single transformation (fuse_augmentations option of the datasets).
+# Run it with `python scripts/benchmark_augmentations.py --points 50000`
+import os
+import sys
+import time
+import argparse
+import torch
+import torch_geometric.transforms as T
+from torch_geometric.data import Data
+
+DIR = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(DIR, ".."))
+
+from src.core.data_transform import (
+    RandomNoise,
+    RandomScaleAnisotropic,
+    RandomSymmetry,
+    fuse_affine_transforms,
+)
+
+
+def timeit(transform, pos, repeats, rounds=5):
+    """ Best of rounds, the variance of the time of the random number generation is large
+    """
+    durations = []
+    for _ in range(rounds):
+        start = time.time()
+        for _ in range(repeats):
+            transform(Data(pos=pos))
+        durations.append((time.time() - start) / repeats)
+    return min(durations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Augmentation chain benchmark")
+    parser.add_argument("--points", type=int, nargs="+", default=[5000, 50000, 200000])
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+
+    # Same process as a DataLoader worker
+    torch.set_num_threads(1)
+
+    affine = [T.RandomRotate(180, axis=2), RandomScaleAnisotropic([0.8, 1.2]), RandomSymmetry([True, False, False])]
+    # The generation of the noise costs more than the affine transforms
+    chains = {"affine": T.Compose(affine), "noise + affine": T.Compose([RandomNoise(sigma=0.001)] + affine)}
+
+    print("{:>16}{:>10}{:>16}{:>16}".format("", "points", "chain", "fused"))
+    for name, transform in chains.items():
+        fused = fuse_affine_transforms(transform)
+        for num_points in args.points:
+            pos = torch.randn(num_points, 3)
+            print(
+                "{:>16}{:>10}{:>13.3f} ms{:>13.3f} ms".format(
+                    name,
+                    num_points,
+                    timeit(transform, pos, args.repeats) * 1000,
+                    timeit(fused, pos, args.repeats) * 1000,
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# Benchmark of the cpu furthest point sampling: torch_cluster and the exact and approximate modes of
+# FurthestPointSampling with different numbers of threads. The coverage radius measures the quality of a sampling,
+# it is the largest distance between a point and its closest sample (lower is better).
+# Run it with `python scripts/benchmark_fps.py --batch_size 8 --points 100000 --ratio 0.05`
+import os
+import sys
+import time
+import argparse
+from torch_geometric.nn import fps
+
+DIR = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(DIR, ".."))
+
+from src.core.spatial_ops.fps import FurthestPointSampling, coverage_radius
+from benchmark_neighbour_search import synthetic_batch
+
+
+def timeit(func, repeats):
+    out = func()  # warm up, compiles the kernels
+    start = time.time()
+    for _ in range(repeats):
+        func()
+    return out, (time.time() - start) / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU furthest point sampling benchmark")
+    parser.add_argument("--batch_size", type=int, default=8)
+    parser.add_argument("--points", type=int, default=100000)
+    parser.add_argument("--ratio", type=float, default=0.05)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--repeats", type=int, default=1)
+    args = parser.parse_args()
+
+    pos, batch, _, _ = synthetic_batch(args.batch_size, args.points, 1)
+    print("{} clouds of {} points, ratio {}".format(args.batch_size, args.points, args.ratio))
+
+    results = [("torch_cluster.fps",) + timeit(lambda: fps(pos, batch, args.ratio, random_start=False), args.repeats)]
+    for num_threads in args.threads:
+        for approximate in [False, True]:
+            sampler = FurthestPointSampling(approximate=approximate, num_threads=num_threads)
+            results.append(
+                ("{} ({} threads)".format("approximate" if approximate else "exact", num_threads),)
+                + timeit(lambda: sampler.sample(pos, args.ratio, batch), args.repeats)
+            )
+
+    print("{:<28}{:>12}{:>20}".format("", "time", "coverage radius"))
+    for name, idx, duration in results:
+        radius = coverage_radius(pos, idx, batch).mean()
+        print("{:<28}{:>10.1f} s{:>20.4f}".format(name, duration, radius))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# Compares GridSphereSampling with the former implementation that queries the kd tree and clones the data
+# for each grid centre, on a synthetic room made of a floor, a ceiling, four walls and some furniture.
+# Run it with `python scripts/benchmark_grid_sphere_sampling.py --points 1000000`
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import torch
+from sklearn.neighbors import KDTree
+from torch_geometric.data import Data
+
+DIR = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(DIR, ".."))
+
+from src.core.data_transform import GridSampling, GridSphereSampling
+
+
+def synthetic_room(num_points, size=(10.0, 8.0, 3.0), seed=0):
+    rng = np.random.RandomState(seed)
+    size = np.asarray(size)
+    pos = rng.rand(num_points, 3) * size
+    surface = rng.randint(0, 7, num_points)
+    for axis in range(3):
+        pos[surface == 2 * axis, axis] = 0
+        pos[surface == 2 * axis + 1, axis] = size[axis]
+    # Furniture: points in boxes standing on the floor
+    furniture = surface == 6
+    pos[furniture] = pos[furniture] * [1, 1, 0.3]
+    pos += rng.randn(num_points, 3) * 0.005
+    return Data(
+        pos=torch.from_numpy(pos).float(),
+        rgb=torch.from_numpy(rng.rand(num_points, 3)).float(),
+        y=torch.from_numpy(surface).long(),
+    )
+
+
+def reference(data, radius, grid_size):
+    """ Former implementation, one kd tree query and a clone of all attributes per grid centre
+    """
+    num_points = data.pos.shape[0]
+    tree = KDTree(np.asarray(data.pos), leaf_size=50)
+    grid_data = GridSampling(grid_size)(data.clone())
+    datas = []
+    for grid_center in np.asarray(grid_data.pos):
+        pts = np.asarray(grid_center)[np.newaxis]
+        ind = torch.LongTensor(tree.query(pts, k=1)[1][0])
+        grid_label = data.y[ind]
+        t_center = torch.FloatTensor(grid_center)
+        ind = torch.LongTensor(tree.query_radius(pts, r=radius)[0])
+        new_data = Data()
+        for key in set(data.keys):
+            item = data[key].clone()
+            if num_points == item.shape[0]:
+                item = item[ind]
+                if key == "pos":
+                    item -= t_center
+                setattr(new_data, key, item)
+        new_data.center_label = grid_label
+        datas.append(new_data)
+    return datas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GridSphereSampling benchmark")
+    parser.add_argument("--points", type=int, default=1000000)
+    parser.add_argument("--radius", type=float, default=2.0)
+    parser.add_argument("--grid_size", type=float, default=None)
+    args = parser.parse_args()
+    grid_size = args.grid_size or args.radius
+
+    data = synthetic_room(args.points)
+
+    start = time.time()
+    spheres = GridSphereSampling(args.radius, grid_size)(data.clone())
+    vectorized = time.time() - start
+
+    start = time.time()
+    expected = reference(data.clone(), args.radius, grid_size)
+    loop = time.time() - start
+
+    assert len(spheres) == len(expected)
+    for sphere, sphere_expected in zip(spheres, expected):
+        for key in sphere_expected.keys:
+            assert torch.equal(sphere[key], sphere_expected[key]), key
+
+    print("{} points, {} spheres".format(args.points, len(spheres)))
+    print("per centre loop: {:.2f}s".format(loop))
+    print("vectorized:      {:.2f}s ({:.1f}x faster)".format(vectorized, loop / vectorized))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# Micro benchmark of the peak cpu memory and run time of a KPConv forward pass (eval) and of a
+# forward + backward pass (train) with and without a memory budget. Each configuration runs in its own
+# process since the peak resident set size of a process can only grow.
+# Run it with `python scripts/benchmark_kpconv_memory.py --points 20000 --budgets 0 64 16`
+import os
+import sys
+import time
+import resource
+import argparse
+import multiprocessing
+import torch
+
+DIR = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(DIR, ".."))
+
+from src.modules.KPConv.convolution_ops import KPConv_ops, KPConv_deform_ops
+
+
+def peak_memory_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def run(args, memory_budget, deformable, training, queue):
+    torch.manual_seed(0)
+    torch.set_num_threads(args.threads)
+    support_points = torch.rand(args.points, 3)
+    neighbors = torch.randint(0, args.points, (args.points, args.neighbors))
+    features = torch.rand(args.points, args.in_features, requires_grad=True)
+    K_points = torch.rand(args.kernel_points, 3) * 0.1 - 0.05
+    K_values = torch.rand(args.kernel_points, args.in_features, args.out_features, requires_grad=True)
+    offsets = torch.zeros(args.points, args.kernel_points, 3, requires_grad=True)
+
+    start_memory = peak_memory_mb()
+    start = time.time()
+    with torch.set_grad_enabled(training):
+        loss = conv(support_points, neighbors, features, K_points, K_values, offsets, memory_budget, deformable)
+    if training:
+        loss.backward()
+    queue.put((peak_memory_mb() - start_memory, time.time() - start))
+
+
+def conv(support_points, neighbors, features, K_points, K_values, offsets, memory_budget, deformable):
+    if deformable:
+        output, sq_distances, _ = KPConv_deform_ops(
+            support_points,
+            support_points,
+            neighbors,
+            features,
+            K_points,
+            offsets,
+            None,
+            K_values,
+            0.04,
+            "linear",
+            "sum",
+            memory_budget=memory_budget,
+        )
+        loss = output.sum() + sq_distances.min(dim=1)[0].mean()
+    else:
+        output = KPConv_ops(
+            support_points,
+            support_points,
+            neighbors,
+            features,
+            K_points,
+            K_values,
+            0.04,
+            "linear",
+            "sum",
+            memory_budget=memory_budget,
+        )
+        loss = output.sum()
+    return loss
+
+
+def main():
+    parser = argparse.ArgumentParser(description="KPConv peak memory benchmark")
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--neighbors", type=int, default=34)
+    parser.add_argument("--kernel_points", type=int, default=15)
+    parser.add_argument("--in_features", type=int, default=64)
+    parser.add_argument("--out_features", type=int, default=64)
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--budgets", type=float, nargs="+", default=[0, 64, 16], help="In MB, 0 means no budget")
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    print("{:<12}{:<10}{:>12}{:>18}{:>12}".format("conv", "mode", "budget (MB)", "peak memory (MB)", "time (s)"))
+    for deformable in [False, True]:
+        for training in [False, True]:
+            for budget in args.budgets:
+                memory_budget = int(budget * 1024 ** 2) if budget > 0 else None
+                queue = ctx.Queue()
+                process = ctx.Process(target=run, args=(args, memory_budget, deformable, training, queue))
+                process.start()
+                memory, duration = queue.get()
+                process.join()
+                print(
+                    "{:<12}{:<10}{:>12}{:>18.1f}{:>12.2f}".format(
+                        "deformable" if deformable else "rigid",
+                        "train" if training else "eval",
+                        budget if budget > 0 else "-",
+                        memory,
+                        duration,
+                    )
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# Benchmark of the neighbour search of the multiscale grouping layers of the PointNet++ MSG and RSConv MSG models:
+# one radius search per scale against a single search at the largest radius (nested: True in the model configs).
+# Run it with `python scripts/benchmark_multiscale_search.py --batch_size 16 --points 4096`, on gpu if available
+import os
+import sys
+import time
+import argparse
+import torch
+from omegaconf import OmegaConf
+
+DIR = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(DIR, ".."))
+
+from src.core.spatial_ops import MultiscaleRadiusNeighbourFinder, DenseRadiusNeighbourFinder
+from benchmark_neighbour_search import synthetic_batch
+
+MODELS = {
+    "segmentation/pointnet2.yaml": ["pointnet2ms", "pointnet2_onehot", "pointnet2_charlesmsg"],
+    "segmentation/rsconv.yaml": ["RSConv_MSN", "RSConv_MSN_S3DIS"],
+}
+
+
+def timeit(func, repeats, device):
+    func()  # warm up
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+    start = time.time()
+    for _ in range(repeats):
+        func()
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+    return (time.time() - start) / repeats
+
+
+def benchmark_layer(finder, search, repeats, device):
+    """ Run time of the search of the layer with one search per scale and with a single search
+    """
+    finder.nested = False
+    per_scale = timeit(search, repeats, device)
+    finder.nested = True
+    return per_scale, timeit(search, repeats, device)
+
+
+def benchmark_model(down_conv, x, batch_x, repeats, device):
+    """ Total run time of the searches of the down layers, the query points of a layer (a regular subsampling
+    instead of the furthest point sampling of the models) are the input points of the next one
+    """
+    timings = []
+    if "radii" in down_conv:
+        pos = x.view(int(batch_x.max()) + 1, -1, 3)
+        for radii, nsamples, npoint in zip(down_conv.radii, down_conv.nsamples, down_conv.npoint):
+            query = pos[:, :: max(1, pos.shape[1] // npoint)][:, :npoint].contiguous()
+            finder = DenseRadiusNeighbourFinder(list(radii), list(nsamples))
+            search = lambda: finder.find_multiscale_neighbours(pos, query)
+            timings.append(benchmark_layer(finder, search, repeats, device))
+            pos = query
+    else:
+        for radii, nsamples, ratio in zip(down_conv.radius, down_conv.radius_num_points, down_conv.ratios):
+            query, batch_query = x[:: int(1 / ratio)], batch_x[:: int(1 / ratio)]
+            finder = MultiscaleRadiusNeighbourFinder(list(radii), list(nsamples))
+            search = lambda: finder.find_multiscale_neighbours(x, query, batch_x, batch_query)
+            timings.append(benchmark_layer(finder, search, repeats, device))
+            x, batch_x = query, batch_query
+    return [sum(timing) for timing in zip(*timings)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multiscale neighbour search benchmark")
+    parser.add_argument("--batch_size", type=int, default=16)
+    parser.add_argument("--points", type=int, default=4096)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--cpu", action="store_true", help="Run on cpu even if cuda is available")
+    args = parser.parse_args()
+
+    device = torch.device("cuda" if torch.cuda.is_available() and not args.cpu else "cpu")
+    x, batch_x, _, _ = synthetic_batch(args.batch_size, args.points, 1)
+    x, batch_x = x.to(device), batch_x.to(device)
+    print("{} clouds of {} points on {}".format(args.batch_size, args.points, device))
+
+    print("{:<24}{:>16}{:>16}".format("", "per scale", "nested"))
+    for path, names in MODELS.items():
+        models = OmegaConf.load(os.path.join(DIR, "..", "conf", "models", path)).models
+        for name in names:
+            per_scale, nested = benchmark_model(models[name].down_conv, x, batch_x, args.repeats, device)
+            print("{:<24}{:>13.1f} ms{:>13.1f} ms".format(name, per_scale * 1000, nested * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# Benchmark of the cpu neighbour searches: torch_cluster (radius, knn), torch_points_kernels (ball_query)
+# and the voxel grid backend with different numbers of threads, on batches of synthetic clouds.
+# Run it with `python scripts/benchmark_neighbour_search.py --batch_size 16 --points 20000`
+import os
+import sys
+import time
+import argparse
+import torch
+from torch_geometric.nn import knn, radius
+import torch_points_kernels as tp
+
+DIR = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(DIR, ".."))
+
+from src.core.spatial_ops.voxel_search import VoxelGridSearch
+
+
+def synthetic_batch(batch_size, num_points, ratio):
+    """ Each cloud is made of points on a sphere (surface) and points in a cube (volume)
+    """
+    pos = []
+    for _ in range(batch_size):
+        surface = torch.randn(num_points // 2, 3)
+        surface = surface / surface.norm(dim=1, keepdim=True)
+        volume = torch.rand(num_points - num_points // 2, 3) * 2 - 1
+        pos.append(torch.cat([surface, volume]))
+    x = torch.cat(pos)
+    batch_x = torch.arange(batch_size).repeat_interleave(num_points)
+    step = int(1 / ratio)
+    return x, batch_x, x[::step].contiguous(), batch_x[::step].contiguous()
+
+
+def timeit(func, repeats):
+    func()  # warm up, compiles the voxel grid kernels
+    start = time.time()
+    for _ in range(repeats):
+        func()
+    return (time.time() - start) / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU neighbour search benchmark")
+    parser.add_argument("--batch_size", type=int, default=16)
+    parser.add_argument("--points", type=int, default=20000)
+    parser.add_argument("--ratio", type=float, default=0.25, help="Ratio of query points")
+    parser.add_argument("--radius", type=float, default=0.1)
+    parser.add_argument("--max_num_neighbors", type=int, default=32)
+    parser.add_argument("--k", type=int, default=16)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    x, batch_x, y, batch_y = synthetic_batch(args.batch_size, args.points, args.ratio)
+    r, max_num, k = args.radius, args.max_num_neighbors, args.k
+    print("{} clouds of {} points, {} queries".format(args.batch_size, args.points, y.shape[0]))
+
+    results = [
+        (
+            "torch_cluster.radius",
+            timeit(lambda: radius(x, y, r, batch_x, batch_y, max_num_neighbors=max_num), args.repeats),
+        ),
+        (
+            "tp.ball_query partial_dense",
+            timeit(lambda: tp.ball_query(r, max_num, x, y, "partial_dense", batch_x, batch_y), args.repeats),
+        ),
+        ("torch_cluster.knn", timeit(lambda: knn(x, y, k, batch_x, batch_y), args.repeats)),
+    ]
+    for num_threads in args.threads:
+        backend = VoxelGridSearch(num_threads=num_threads)
+        results.append(
+            (
+                "voxel_grid radius ({} threads)".format(num_threads),
+                timeit(lambda: backend.radius(x, y, r, max_num, batch_x, batch_y), args.repeats),
+            )
+        )
+        results.append(
+            (
+                "voxel_grid knn ({} threads)".format(num_threads),
+                timeit(lambda: backend.knn(x, y, k, batch_x, batch_y), args.repeats),
+            )
+        )
+
+    for name, duration in results:
+        print("{:<36}{:>10.1f} ms".format(name, duration * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -70,8 +70,8 @@ class BaseDenseConvolutionDown(BaseConvolution):
         new_pos = pos.gather(1, idx)
 
         ms_x = []
-        for scale_idx in range(self.neighbour_finder.num_scales):
-            radius_idx = self.neighbour_finder(pos, new_pos, scale_idx=scale_idx)
+        neighbours = self.neighbour_finder.find_multiscale_neighbours(pos, new_pos)
+        for scale_idx, radius_idx in enumerate(neighbours):
             ms_x.append(self.conv(x, pos, new_pos, radius_idx, scale_idx))
         new_x = torch.cat(ms_x, 1)
         return Data(pos=new_pos, x=new_x)
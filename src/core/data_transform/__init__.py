@@ -8,6 +8,9 @@ from .inference_transforms import *
 from .feature_augment import *
 from .features import *
 from .filters import *
+from .multiscale_cache import *
+from .affine_fusion import *
+from .batch_transforms import *
 
 _custom_transforms = sys.modules[__name__]
 _torch_geometric_transforms = sys.modules["torch_geometric.transforms"]
@@ -0,0 +1,190 @@
+import math
+import numbers
+import random
+import torch
+import torch_geometric.transforms as T
+
+from .transforms import RandomSymmetry, RandomNoise, RandomScaleAnisotropic, ShiftVoxels
+
+
+def _symmetry(transform, pos):
+    scale = torch.ones(3)
+    for i, ax in enumerate(transform.axis):
+        if ax:
+            if torch.rand(1) < 0.5:
+                scale[i] = -1
+    return torch.diag(scale), None
+
+
+def _scale_anisotropic(transform, pos):
+    scale = transform.scales[0] + torch.rand((3,)) * (transform.scales[1] - transform.scales[0])
+    return torch.diag(scale), None
+
+
+def _shift_voxels(transform, pos):
+    return None, (torch.rand(3) * 100).type_as(pos)
+
+
+def _rotate(transform, pos):
+    degree = math.pi * random.uniform(*transform.degrees) / 180.0
+    sin, cos = math.sin(degree), math.cos(degree)
+    if transform.axis == 0:
+        matrix = [[1, 0, 0], [0, cos, sin], [0, -sin, cos]]
+    elif transform.axis == 1:
+        matrix = [[cos, 0, -sin], [0, 1, 0], [sin, 0, cos]]
+    else:
+        matrix = [[cos, sin, 0], [-sin, cos, 0], [0, 0, 1]]
+    return torch.tensor(matrix), None
+
+
+def _scale(transform, pos):
+    return torch.eye(3) * random.uniform(*transform.scales), None
+
+
+def _flip(transform, pos):
+    scale = torch.ones(3)
+    if random.random() < transform.p:
+        scale[transform.axis] = -1
+    return torch.diag(scale), None
+
+
+def _linear(transform, pos):
+    return transform.matrix, None
+
+
+def _noise(transform, pos):
+    return torch.randn(pos.shape).mul_(transform.sigma).clamp_(-transform.clip, transform.clip)
+
+
+def _translate(transform, pos):
+    t = transform.translate
+    if isinstance(t, numbers.Number):
+        t = [t] * 3
+    return torch.stack([pos.new_empty(pos.shape[0]).uniform_(-abs(t[d]), abs(t[d])) for d in range(3)], dim=-1)
+
+
+# Draw the random parameters of a transform exactly like its __call__ does (same random generator and same
+# sequence of draws) and return them as a [3, 3] matrix M and a [3] translation t such that pos -> pos @ M + t
+# (None for the identity or a null translation).
+AFFINE_SAMPLERS = {
+    RandomSymmetry: _symmetry,
+    RandomScaleAnisotropic: _scale_anisotropic,
+    ShiftVoxels: _shift_voxels,
+    T.RandomRotate: _rotate,
+    T.RandomScale: _scale,
+    T.RandomFlip: _flip,
+    T.LinearTransformation: _linear,
+}
+
+# Same for the transforms adding a random offset to each point, returns the [N, 3] offsets
+NOISE_SAMPLERS = {
+    RandomNoise: _noise,
+    T.RandomTranslate: _translate,
+}
+
+
+def _add(pos, other, owned):
+    """ pos + other, computed in place in pos (or in other) when it is a buffer of the fused transform
+    """
+    if owned and pos.dtype == other.dtype:
+        return pos.add_(other), True
+    if pos.dtype == other.dtype and other.shape == pos.shape:
+        return other.add_(pos), True
+    return pos + other, True
+
+
+def is_fusable(transform):
+    return type(transform) in AFFINE_SAMPLERS or type(transform) in NOISE_SAMPLERS
+
+
+class FusedAffineTransform(object):
+    """ Applies a chain of affine augmentations (rotations, scaling, symmetries, ...) and point wise noises
+    to ``data.pos`` in a single pass. The random parameters of each transform are drawn in the same order
+    and with the same distribution as when the transforms are applied one after the other, they are then
+    composed into a single affine transformation:
+
+        pos @ M + t + sum_k noise_k @ M_k
+
+    where ``M_k`` is the linear part of the transforms applied after the noise ``k``. Noises drawn before any
+    affine transform are simply added to the positions.
+    Only 3D positions are fused, other clouds go through the transforms one after the other.
+
+    Parameters
+    ----------
+    transforms: List
+        Transforms registered in ``AFFINE_SAMPLERS`` or ``NOISE_SAMPLERS``
+    """
+
+    def __init__(self, transforms):
+        for transform in transforms:
+            assert is_fusable(transform), "{} cannot be fused".format(transform)
+        self.transforms = transforms
+
+    def __call__(self, data):
+        pos = data.pos
+        if pos.dim() != 2 or pos.shape[1] != 3:
+            for transform in self.transforms:
+                data = transform(data)
+            return data
+
+        # Buffers created here are updated in place, data.pos is never modified
+        owned = False
+        matrix, translation, noises = None, None, []
+        for transform in self.transforms:
+            noise_sampler = NOISE_SAMPLERS.get(type(transform))
+            if noise_sampler is not None:
+                noise = noise_sampler(transform, pos)
+                if matrix is None and translation is None:
+                    pos, owned = _add(pos, noise, owned)
+                else:
+                    noises.append([noise, None])
+                continue
+
+            m, t = AFFINE_SAMPLERS[type(transform)](transform, pos)
+            if m is not None:
+                m = m.to(pos.dtype)
+                matrix = m if matrix is None else matrix @ m
+                translation = None if translation is None else translation @ m
+                for noise in noises:
+                    noise[1] = m if noise[1] is None else noise[1] @ m
+            if t is not None:
+                translation = t if translation is None else translation + t
+
+        if matrix is not None:
+            pos, owned = torch.mm(pos, matrix), True
+        if translation is not None:
+            pos, owned = _add(pos, translation, owned)
+        for noise, m in noises:
+            pos, owned = _add(pos, noise if m is None else torch.mm(noise, m), owned)
+        data.pos = pos
+        return data
+
+    def __repr__(self):
+        return "{}([{}])".format(self.__class__.__name__, ", ".join([repr(t) for t in self.transforms]))
+
+
+def fuse_affine_transforms(transform):
+    """ Replaces the runs of consecutive affine augmentations and noises of a ``Compose`` by a
+    :class:`FusedAffineTransform`. Runs made of a single transform or of noises only are left untouched.
+    """
+    if transform is None:
+        return None
+    transforms = transform.transforms if isinstance(transform, T.Compose) else [transform]
+
+    fused, run = [], []
+
+    def flush():
+        if len(run) > 1 and any(type(t) in AFFINE_SAMPLERS for t in run):
+            fused.append(FusedAffineTransform(list(run)))
+        else:
+            fused.extend(run)
+        run.clear()
+
+    for t in transforms:
+        if is_fusable(t):
+            run.append(t)
+        else:
+            flush()
+            fused.append(t)
+    flush()
+    return T.Compose(fused)
@@ -0,0 +1,175 @@
+import math
+import numbers
+import torch
+
+
+def _num_samples(data):
+    """ Number of samples of a collated batch, dense (``pos`` is [B, N, 3]) or message passing (``pos`` is
+    [N, 3] with a ``batch`` vector)
+    """
+    if data.pos.dim() == 3:
+        return data.pos.shape[0]
+    return int(data.batch.max()) + 1 if data.pos.shape[0] > 0 else 0
+
+
+def _apply_linear(data, matrices):
+    """ Multiplies the positions of each sample by its matrix, pos -> pos @ matrices[b] with matrices [B, 3, 3].
+    The points of a sample are contiguous in a collated batch, a matrix product per sample is much cheaper
+    than gathering a matrix per point
+    """
+    matrices = matrices.to(data.pos)
+    if data.pos.dim() == 3:
+        data.pos = torch.bmm(data.pos, matrices)
+        return data
+    counts = torch.bincount(data.batch, minlength=matrices.shape[0]).tolist()
+    pos = data.pos.contiguous()
+    out = torch.empty_like(pos)
+    for sample_pos, sample_out, matrix in zip(pos.split(counts), out.split(counts), matrices):
+        torch.mm(sample_pos, matrix, out=sample_out)
+    data.pos = out
+    return data
+
+
+class BatchRandomRotate(object):
+    """ Rotates each sample of a batch around an axis by a random angle, like ``RandomRotate`` on each sample
+
+    Parameters
+    ----------
+    degrees: float or Tuple[float, float]
+        Rotation interval from which the rotation angle is sampled, [-degrees, degrees] for a number
+    axis: int, optional
+        Rotation axis
+    """
+
+    def __init__(self, degrees, axis=0):
+        if isinstance(degrees, numbers.Number):
+            degrees = (-abs(degrees), abs(degrees))
+        assert len(degrees) == 2
+        self.degrees = tuple(degrees)
+        self.axis = axis
+
+    def __call__(self, data):
+        num_samples = _num_samples(data)
+        degree = self.degrees[0] + torch.rand(num_samples) * (self.degrees[1] - self.degrees[0])
+        sin, cos = torch.sin(degree * math.pi / 180.0), torch.cos(degree * math.pi / 180.0)
+
+        # Same matrices as torch_geometric.transforms.RandomRotate
+        i, j = [axis for axis in range(3) if axis != self.axis]
+        sign = -1 if self.axis == 1 else 1
+        matrices = torch.eye(3).repeat(num_samples, 1, 1)
+        matrices[:, i, i] = cos
+        matrices[:, i, j] = sign * sin
+        matrices[:, j, i] = -sign * sin
+        matrices[:, j, j] = cos
+        return _apply_linear(data, matrices)
+
+    def __repr__(self):
+        return "{}({}, axis={})".format(self.__class__.__name__, self.degrees, self.axis)
+
+
+class BatchRandomScaleAnisotropic(object):
+    """ Scales each axis of each sample by a factor sampled in ``scales``, like ``RandomScaleAnisotropic``
+    on each sample
+    """
+
+    def __init__(self, scales=None):
+        assert len(scales) == 2 and scales[0] <= scales[1]
+        self.scales = scales
+
+    def __call__(self, data):
+        scale = self.scales[0] + torch.rand((_num_samples(data), 3)) * (self.scales[1] - self.scales[0])
+        return _apply_linear(data, torch.diag_embed(scale))
+
+    def __repr__(self):
+        return "{}({})".format(self.__class__.__name__, self.scales)
+
+
+class BatchRandomSymmetry(object):
+    """ Flips each sample along each of the selected axis with probability 0.5, like ``RandomSymmetry``
+    on each sample
+    """
+
+    def __init__(self, axis=[False, False, False]):
+        self.axis = axis
+
+    def __call__(self, data):
+        flip = (torch.rand((_num_samples(data), 3)) < 0.5) & torch.tensor([bool(ax) for ax in self.axis])
+        return _apply_linear(data, torch.diag_embed(1 - 2 * flip.float()))
+
+    def __repr__(self):
+        return "{}(axis={})".format(self.__class__.__name__, self.axis)
+
+
+class BatchRandomNoise(object):
+    """ Clipped gaussian noise added to each point, like ``RandomNoise``
+    """
+
+    def __init__(self, sigma=0.01, clip=0.05):
+        self.sigma = sigma
+        self.clip = clip
+
+    def __call__(self, data):
+        noise = torch.randn(data.pos.shape).mul_(self.sigma).clamp_(-self.clip, self.clip)
+        data.pos = data.pos + noise.to(data.pos)
+        return data
+
+    def __repr__(self):
+        return "{}(sigma={}, clip={})".format(self.__class__.__name__, self.sigma, self.clip)
+
+
+class BatchRandomDropout(object):
+    """ Drops ``dropout_ratio`` of the points of a sample with probability ``dropout_application_ratio``,
+    like ``RandomDropout`` on each sample.
+
+    Dense batches keep their number of points, the dropped points are replaced by copies of randomly
+    chosen kept points of the same sample. All the per point attributes are updated.
+    """
+
+    def __init__(self, dropout_ratio=0.2, dropout_application_ratio=0.5):
+        self.dropout_ratio = dropout_ratio
+        self.dropout_application_ratio = dropout_application_ratio
+
+    def __call__(self, data):
+        applied = torch.rand(_num_samples(data)) < self.dropout_application_ratio
+        if not applied.any():
+            return data
+        if data.pos.dim() == 3:
+            return self._dense(data, applied)
+        return self._message_passing(data, applied)
+
+    def _dense(self, data, applied):
+        num_samples, num_points = data.pos.shape[:2]
+        num_kept = max(int(num_points * (1 - self.dropout_ratio)), 1)
+        idx = torch.arange(num_points).repeat(num_samples, 1)
+        kept = torch.rand(int(applied.sum()), num_points).argsort(1)[:, :num_kept]
+        copies = kept.gather(1, torch.randint(num_kept, (kept.shape[0], num_points - num_kept)))
+        idx[applied] = torch.cat([kept, copies], 1)
+
+        for key, item in data:
+            if torch.is_tensor(item) and item.dim() > 1 and item.shape[:2] == (num_samples, num_points):
+                gather_idx = idx.to(item.device).view(num_samples, num_points, *([1] * (item.dim() - 2)))
+                data[key] = item.gather(1, gather_idx.expand_as(item))
+        return data
+
+    def _message_passing(self, data, applied):
+        batch = data.batch.cpu()
+        num_points = batch.shape[0]
+        counts = torch.bincount(batch, minlength=applied.shape[0])
+        num_kept = (counts.double() * (1 - self.dropout_ratio)).long().clamp(min=1)
+
+        # Rank of each point in a random order of its sample, batch is sorted
+        order = torch.argsort(batch.double() + 0.5 * torch.rand(num_points, dtype=torch.double))
+        ptr = torch.cat([counts.new_zeros(1), counts.cumsum(0)])
+        rank = torch.empty_like(order)
+        rank[order] = torch.arange(num_points) - ptr[batch[order]]
+        mask = ~applied[batch] | (rank < num_kept[batch])
+
+        for key, item in data:
+            if torch.is_tensor(item) and item.dim() > 0 and item.shape[0] == num_points:
+                data[key] = item[mask.to(item.device)]
+        return data
+
+    def __repr__(self):
+        return "{}(dropout_ratio={}, dropout_application_ratio={})".format(
+            self.__class__.__name__, self.dropout_ratio, self.dropout_application_ratio
+        )
@@ -1,12 +1,94 @@
 import re
+from collections import namedtuple
 import torch
-import torch.nn.functional as F
-from torch_scatter import scatter_mean, scatter_add
-from torch_geometric.nn.pool.consecutive import consecutive_cluster
-from torch_geometric.nn import voxel_grid
+from torch_scatter import scatter_max
 
 
-def group_data(data, cluster, unique_pos_indices, mode="last"):
+VoxelClusters = namedtuple("VoxelClusters", ["cluster", "perm", "counts", "labels"])
+
+
+def voxel_key(pos, size, batch=None, start=None, end=None):
+    """ Linear key of the voxel of each point, ordered like the clusters of ``torch_geometric.nn.voxel_grid``:
+    by batch element and then by voxel coordinates with the first axis varying the fastest
+    """
+    num_dims = pos.shape[1]
+    size = pos.new_tensor(size).expand(num_dims)
+    start = pos.min(0)[0] if start is None else pos.new_tensor(start).expand(num_dims)
+    end = pos.max(0)[0] if end is None else pos.new_tensor(end).expand(num_dims)
+    num_voxels = ((end - start) / size).long() + 1
+    coords = ((pos - start) / size).long()
+    key = coords[:, -1]
+    for dim in reversed(range(num_dims - 1)):
+        key = key * num_voxels[dim] + coords[:, dim]
+    if batch is not None:
+        key = key + batch * int(num_voxels.prod())
+    return key
+
+
+def voxel_clusters(key, labels=None):
+    """ Groups the points sharing the same voxel key with a single sort of the keys. Clusters are numbered
+    by increasing key like ``torch_geometric.nn.pool.consecutive.consecutive_cluster``.
+
+    Parameters
+    ----------
+    key : torch.Tensor
+        [N] voxel key of each point, see :func:`voxel_key`
+    labels : torch.Tensor, optional
+        [N] integer labels, the most frequent label of each voxel is returned (smallest label in case of a tie).
+        Labels are sorted together with the keys so this does not require a one hot encoding of the labels
+
+    Returns
+    -------
+    VoxelClusters
+        ``cluster`` [N] cluster index of each point, ``perm`` index of the last point of each cluster,
+        ``counts`` number of points in each cluster and ``labels`` the majority label of each cluster (or None)
+    """
+    if labels is None:
+        _, cluster = torch.unique(key, return_inverse=True)
+        return _voxel_clusters(cluster, None)
+
+    label_min = labels.min()
+    num_labels = int(labels.max() - label_min) + 1
+    labels = labels - label_min
+    if int(key.max()) >= (2 ** 62) // num_labels:
+        # Keys too large to be combined with the labels
+        key = torch.unique(key, return_inverse=True)[1]
+    # Single sort of the keys and labels, the (voxel, label) pairs of a voxel are consecutive
+    unique_key, inverse, label_counts = torch.unique(
+        key * num_labels + labels, return_inverse=True, return_counts=True
+    )
+    unique_key = unique_key // num_labels
+    new_voxel = torch.ones_like(unique_key, dtype=torch.bool)
+    new_voxel[1:] = unique_key[1:] != unique_key[:-1]
+    pair_cluster = new_voxel.long().cumsum(0) - 1
+    pair_label = inverse.new_zeros(unique_key.shape[0]).scatter_(0, inverse, labels)
+
+    # The score orders the labels of a voxel by count and then by decreasing label
+    score = label_counts * num_labels + (num_labels - 1 - pair_label)
+    best = scatter_max(score, pair_cluster, dim=0)[0]
+    majority = num_labels - 1 - best % num_labels + label_min
+    return _voxel_clusters(pair_cluster[inverse], majority)
+
+
+def _voxel_clusters(cluster, labels):
+    num_clusters = int(cluster.max()) + 1 if cluster.shape[0] else 0
+    index = torch.arange(cluster.shape[0], device=cluster.device)
+    perm = scatter_max(index, cluster, dim=0, dim_size=num_clusters)[0]
+    counts = torch.bincount(cluster, minlength=num_clusters)
+    return VoxelClusters(cluster, perm, counts, labels)
+
+
+def pool_mean(item, cluster, counts):
+    """ Mean of item within each cluster
+    """
+    dtype = item.dtype if item.is_floating_point() else torch.float
+    out = torch.zeros((counts.shape[0],) + item.shape[1:], dtype=dtype, device=item.device)
+    out.index_add_(0, cluster, item.to(dtype))
+    out /= counts.view((-1,) + (1,) * (item.dim() - 1)).to(dtype)
+    return out.to(item.dtype)
+
+
+def group_data(data, cluster, unique_pos_indices, mode="last", counts=None, labels=None):
     """ Group data based on indices in cluster. 
     The option ``mode`` controls how data gets agregated within each cluster.
     
@@ -21,8 +103,15 @@ def group_data(data, cluster, unique_pos_indices, mode="last"):
     mode : str
         Option to select how the features and labels for each voxel is computed. Can be ``last`` or ``mean``.
         ``last`` selects the last point falling in a voxel as the representent, ``mean`` takes the average.
+        In ``mean`` mode, ``y`` gets the most frequent label of the voxel
+    counts : torch.Tensor, optional
+        Number of points in each cluster, computed if not provided
+    labels : torch.Tensor, optional
+        Majority label of each cluster as returned by :func:`voxel_clusters`, computed if not provided
     """
     num_nodes = data.num_nodes
+    if mode == "mean" and counts is None:
+        counts = torch.bincount(cluster, minlength=unique_pos_indices.shape[0])
     for key, item in data:
         if bool(re.search("edge", key)):
             raise ValueError("Edges not supported. Wrong data type.")
@@ -32,12 +121,9 @@ def group_data(data, cluster, unique_pos_indices, mode="last"):
                 data[key] = item[unique_pos_indices]
             elif mode == "mean":
                 if key == "y":
-                    item_min = item.min()
-                    item = F.one_hot(item - item_min)
-                    item = scatter_add(item, cluster, dim=0)
-                    data[key] = item.argmax(dim=-1) + item_min
+                    data[key] = labels if labels is not None else voxel_clusters(cluster, item).labels
                 else:
-                    data[key] = scatter_mean(item, cluster, dim=0)
+                    data[key] = pool_mean(item, cluster, counts)
     return data
 
 
@@ -54,27 +140,25 @@ class GridSampling:
     end: float
         End coordinates of the grid (in each dimension). \
         If set to `None`, will be set to the maximum coordinates found in `data.pos`. (default: `None`)
-    num_classes: max number of classes for one hot encoding of y vector
+    num_classes: unused, kept for backward compatibility of the configurations
+    mode: str
+        ``mean`` averages the features of the points of each voxel and takes their most frequent label,
+        ``last`` takes the features and label of the last point of each voxel. (default: `mean`)
     """
 
-    def __init__(self, size, start=None, end=None, num_classes=-1):
+    def __init__(self, size, start=None, end=None, num_classes=-1, mode="mean"):
         self.size = size
         self.start = start
         self.end = end
         self.num_classes = num_classes
+        self.mode = mode
 
     def _process(self, data):
-        num_nodes = data.num_nodes
-
-        if "batch" not in data:
-            batch = data.pos.new_zeros(num_nodes, dtype=torch.long)
-        else:
-            batch = data.batch
-
-        cluster = voxel_grid(data.pos, batch, self.size, self.start, self.end)
-        cluster, perm = consecutive_cluster(cluster)
-
-        return group_data(data, cluster, perm, mode="mean")
+        batch = data.batch if "batch" in data else None
+        key = voxel_key(data.pos, self.size, batch, self.start, self.end)
+        labels = data.y if self.mode == "mean" and torch.is_tensor(data.y) else None
+        cluster, perm, counts, labels = voxel_clusters(key, labels)
+        return group_data(data, cluster, perm, mode=self.mode, counts=counts, labels=labels)
 
     def __call__(self, data):
         if isinstance(data, list):
@@ -84,7 +168,7 @@ class GridSampling:
         return data
 
     def __repr__(self):
-        return "{}(size={})".format(self.__class__.__name__, self.size)
+        return "{}(size={}, mode={})".format(self.__class__.__name__, self.size, self.mode)
 
 
 class SaveOriginalPosId:
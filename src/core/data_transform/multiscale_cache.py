@@ -0,0 +1,129 @@
+import os
+import inspect
+import hashlib
+import logging
+import numpy as np
+import torch
+from torch_geometric.data import Data
+from omegaconf.listconfig import ListConfig
+from omegaconf.dictconfig import DictConfig
+
+from src.utils.file_utils import atomic_write
+
+log = logging.getLogger(__name__)
+
+
+def describe_spatial_op(op):
+    """ Returns a stable string representation of a spatial operation (sampler, neighbour finder, upsample op ...)
+    built from its class name and parameters. Contrary to ``repr``, it does not contain any memory address
+    and can therefore be used to identify a configuration across runs.
+    """
+    if op is None or isinstance(op, (bool, int, float, str)):
+        return repr(op)
+    if isinstance(op, (list, tuple, ListConfig)):
+        return "[{}]".format(",".join([describe_spatial_op(o) for o in op]))
+    if isinstance(op, (dict, DictConfig)):
+        return "{{{}}}".format(",".join(["{}:{}".format(k, describe_spatial_op(op[k])) for k in sorted(op.keys())]))
+    if isinstance(op, np.generic):
+        return repr(op.item())
+    if torch.is_tensor(op) or isinstance(op, np.ndarray):
+        return repr(op.tolist())
+    if inspect.isroutine(op):
+        return getattr(op, "__qualname__", op.__name__)
+    if hasattr(op, "__dict__"):
+        return "{}({})".format(op.__class__.__name__, describe_spatial_op(vars(op)))
+    return op.__class__.__name__
+
+
+class MultiScaleCache:
+    """ Content addressed on-disk cache for the ``multiscale`` and ``upsample`` structures
+    computed by :class:`MultiScaleTransform`.
+
+    Each entry is addressed by a hash of the input data, entries are stored in a sub folder named after
+    a hash of the spatial operations configuration (as returned by ``model.get_spatial_ops()``) so that changing
+    the model automatically invalidates the cache. It should only be used on deterministic inputs (validation and
+    test sets), random augmentations would otherwise always miss the cache.
+
+    Parameters
+    ----------
+    root: str
+        Folder in which the cache is stored
+    strategies: Dict[str, object]
+        Dictionary that contains the samplers, neighbour finders and upsample ops
+    """
+
+    def __init__(self, root, strategies):
+        self._signature = hashlib.sha1(describe_spatial_op(strategies).encode()).hexdigest()
+        self._root = os.path.join(root, self._signature)
+        os.makedirs(self._root, exist_ok=True)
+
+    @property
+    def root(self):
+        return self._root
+
+    @staticmethod
+    def hash_data(data: Data) -> str:
+        """ Computes a hash of all the attributes contained in data
+        """
+        hasher = hashlib.sha1()
+        for key in sorted(data.keys):
+            item = data[key]
+            hasher.update(key.encode())
+            if torch.is_tensor(item):
+                item = item.detach().cpu().contiguous()
+                hasher.update("{}{}".format(item.dtype, tuple(item.shape)).encode())
+                hasher.update(item.numpy().tobytes())
+            else:
+                hasher.update(repr(item).encode())
+        return hasher.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self._root, "{}.pt".format(key))
+
+    @staticmethod
+    def _to_dict(data: Data, special_params):
+        return {
+            "num_nodes": data.num_nodes,
+            "tensors": {key: data[key] for key in data.keys if torch.is_tensor(data[key])},
+            "special_params": special_params,
+        }
+
+    @staticmethod
+    def _from_dict(entry):
+        data = Data(**entry["tensors"])
+        data.num_nodes = entry["num_nodes"]
+        return data, entry["special_params"]
+
+    def load(self, key):
+        """ Returns the cached ``(multiscale, multiscale_params, upsample, upsample_params)`` tuple
+        for the given key or None if it is not in the cache
+        """
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            entry = torch.load(path)
+        except Exception:
+            log.warning("Corrupted multiscale cache entry %s, recomputing it", path)
+            return None
+        multiscale = [self._from_dict(e) for e in entry["multiscale"]]
+        upsample = [self._from_dict(e) for e in entry["upsample"]]
+        return (
+            [m[0] for m in multiscale],
+            [m[1] for m in multiscale],
+            [u[0] for u in upsample],
+            [u[1] for u in upsample],
+        )
+
+    def save(self, key, multiscale, multiscale_params, upsample, upsample_params):
+        """ Saves an entry, the file is first written to a temporary location and then renamed so that
+        concurrent data loader workers never read a partially written entry
+        """
+        entry = {
+            "multiscale": [self._to_dict(d, p) for d, p in zip(multiscale, multiscale_params)],
+            "upsample": [self._to_dict(d, p) for d, p in zip(upsample, upsample_params)],
+        }
+        atomic_write(self._path(key), lambda f: torch.save(entry, f))
+
+    def __repr__(self):
+        return "{}(root={})".format(self.__class__.__name__, self._root)
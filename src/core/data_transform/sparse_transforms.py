@@ -19,7 +19,10 @@ from src.datasets.multiscale_data import MultiScaleData
 from src.utils.transform_utils import SamplingStrategy
 from src.utils.config import is_list
 from src.utils import is_iterable
-from .grid_transform import group_data
+from .grid_transform import group_data, voxel_clusters
+
+# Voxel of each input point, incremented by the number of voxels when collated like the other index keys
+INVERSE_KEY = "inverse_index"
 
 
 def shuffle_data(data):
@@ -32,11 +35,48 @@ def shuffle_data(data):
     return data
 
 
-def quantize_data(data, mode="last"):
+def pack_coords(coords, batch=None):
+    """ Packs integer coordinates into 64-bit keys ordered like the rows of ``(batch, coords)``, each axis
+    being shifted by its minimum and stored on just enough values to hold its extent.
+
+    Parameters
+    ----------
+    coords : torch.Tensor
+        [N, D] integer coordinates
+    batch : torch.Tensor, optional
+        [N] batch element of each point, most significant part of the key
+
+    Returns
+    -------
+    torch.Tensor
+        [N] keys, None if the extent of the coordinates does not fit in 63 bits
+    """
+    coords = coords.long()
+    if batch is not None:
+        coords = torch.cat([batch.long().unsqueeze(-1), coords], dim=-1)
+    low = coords.min(0)[0]
+    extent = (coords.max(0)[0] - low + 1).tolist()
+    num_keys = 1
+    for axis_extent in extent:
+        num_keys *= axis_extent
+    if num_keys >= 2 ** 63:
+        return None
+
+    coords = coords - low
+    key = coords[:, 0].clone()
+    for dim in range(1, coords.shape[1]):
+        key = key * extent[dim] + coords[:, dim]
+    return key
+
+
+def quantize_data(data, mode="last", save_inverse=False):
     """ Creates the quantized version of a data object in which ``pos`` has
     already been quantized. It either averages all points in the same cell or picks
     the last one as being the representent for that cell.
 
+    Voxels are deduplicated by sorting their coordinates packed into 64-bit keys (see :func:`pack_coords`),
+    falling back to ``torch.unique`` on the rows of the coordinates when they do not fit.
+
     Parameters
     ----------
     data : Data
@@ -45,6 +85,8 @@ def quantize_data(data, mode="last"):
     mode : str
         Option to select how the features and labels for each voxel is computed. Can be ``last`` or ``mean``.
         ``last`` selects the last point falling in a voxel as the representent, ``mean`` takes the average.
+    save_inverse : bool
+        If True, the voxel of each input point is saved in ``data.inverse_index`` (see :class:`ToSparseInput`)
 
     Returns
     -------
@@ -55,21 +97,36 @@ def quantize_data(data, mode="last"):
     assert mode=="last" or mode=="mean"
 
     # Build clusters
-    if hasattr(data, "batch"):
-        pos = torch.cat([data.batch.unsqueeze(-1), data.pos], dim=-1)
+    batch = data.batch if hasattr(data, "batch") else None
+    key = pack_coords(data.pos, batch)
+    if key is not None:
+        labels = data.y if mode == "mean" and torch.is_tensor(data.y) else None
+        cluster, unique_pos_indices, counts, labels = voxel_clusters(key, labels)
     else:
-        pos = data.pos.clone()
-    unique_pos, cluster = torch.unique(pos, return_inverse=True, dim=0)
-    unique_pos_indices = torch.arange(cluster.size(0), dtype=cluster.dtype, device=cluster.device)
-    unique_pos_indices = cluster.new_empty(unique_pos.size(0)).scatter_(0, cluster, unique_pos_indices)
+        if batch is not None:
+            pos = torch.cat([batch.unsqueeze(-1), data.pos], dim=-1)
+        else:
+            pos = data.pos.clone()
+        unique_pos, cluster = torch.unique(pos, return_inverse=True, dim=0)
+        unique_pos_indices = torch.arange(cluster.size(0), dtype=cluster.dtype, device=cluster.device)
+        unique_pos_indices = cluster.new_empty(unique_pos.size(0)).scatter_(0, cluster, unique_pos_indices)
+        counts, labels = None, None
 
     # Agregate features within the same voxel
-    data = group_data(data, cluster, unique_pos_indices, mode=mode)
+    data = group_data(data, cluster, unique_pos_indices, mode=mode, counts=counts, labels=labels)
+    if save_inverse:
+        data[INVERSE_KEY] = cluster
     return data
 
 
 def to_sparse_input(
-    data, grid_size, save_delta=False, save_delta_norm=False, mode="last", quantizing_func=torch.floor,
+    data,
+    grid_size,
+    save_delta=False,
+    save_delta_norm=False,
+    mode="last",
+    quantizing_func=torch.floor,
+    save_inverse=False,
 ):
     assert mode=="last" or mode=="mean" or mode =="keep_duplicate"
     if quantizing_func not in [torch.floor, torch.ceil, torch.round]:
@@ -92,7 +149,9 @@ def to_sparse_input(
 
     # Agregate
     if mode != "keep_duplicate":
-        data = quantize_data(data, mode=mode)
+        data = quantize_data(data, mode=mode, save_inverse=save_inverse)
+    elif save_inverse:
+        data[INVERSE_KEY] = torch.arange(data.pos.shape[0])
     return data
 
 
@@ -172,6 +231,9 @@ class ToSparseInput(object):
         Option to select how the features and labels for each voxel are computed. Can be ``keep_duplicate``, ``last`` or ``mean``.
         ``last`` selects the last point falling in a voxel as the representent, ``mean`` takes the average. ``keep_duplicate``
         keeps potential duplicate coordinates in cells
+    save_inverse: bool
+        If True, the index of the voxel of each input point is saved in ``inverse_index``. Since it is incremented
+        when samples are collated, ``output[batch.inverse_index]`` projects the predictions back to all the points
 
     Returns
     -------
@@ -179,8 +241,17 @@ class ToSparseInput(object):
         Returns the same data object with only one point per voxel
     """
 
-    def __init__(self, grid_size=None, save_delta:bool=False, save_delta_norm:bool=False, mode="last", quantizing_func="floor"):
+    def __init__(
+        self,
+        grid_size=None,
+        save_delta: bool = False,
+        save_delta_norm: bool = False,
+        mode="last",
+        quantizing_func="floor",
+        save_inverse: bool = False,
+    ):
         self._grid_size = grid_size
+        self._save_inverse = save_inverse
         self._save_delta = save_delta
         self._save_delta_norm = save_delta_norm
         self._mode = mode
@@ -188,7 +259,15 @@ class ToSparseInput(object):
         self._quantizing_func = getattr(torch, quantizing_func)
 
     def _process(self, data):
-        return to_sparse_input(data, self._grid_size, save_delta=self._save_delta, save_delta_norm=self._save_delta_norm, mode=self._mode, quantizing_func=self._quantizing_func)
+        return to_sparse_input(
+            data,
+            self._grid_size,
+            save_delta=self._save_delta,
+            save_delta_norm=self._save_delta_norm,
+            mode=self._mode,
+            quantizing_func=self._quantizing_func,
+            save_inverse=self._save_inverse,
+        )
 
     def __call__(self, data):
         if isinstance(data, list):
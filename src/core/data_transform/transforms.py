@@ -20,8 +20,10 @@ from src.datasets.registration.pair import Pair
 from src.utils.transform_utils import SamplingStrategy
 from src.utils.config import is_list
 from src.utils import is_iterable
+from src.utils.timer import time_func
 from .grid_transform import group_data, GridSampling
 from .sparse_transforms import shuffle_data
+from .multiscale_cache import MultiScaleCache
 
 
 class RemoveAttributes(object):
@@ -95,6 +97,10 @@ class GridSphereSampling(object):
         If True, KDTREE_KEY should be deleted as an attribute if it exists
     center: bool, optional
         If True, a centre transform is apply on each sphere.
+
+    The spatial index in KDTREE_KEY can be any object with the ``query`` and ``query_radius`` methods of
+    ``sklearn.neighbors.KDTree``, such as the memory mapped :class:`src.datasets.spatial_index.VoxelGridIndex`
+    attached by the datasets. A KDTree is built when there is none.
     """
 
     KDTREE_KEY = "kd_tree"
@@ -121,30 +127,31 @@ class GridSphereSampling(object):
 
         # apply grid sampling
         grid_data = self._grid_sampling(data.clone())
+        grid_centers = np.asarray(grid_data.pos)
 
-        datas = []
-        for grid_center in np.asarray(grid_data.pos):
-            pts = np.asarray(grid_center)[np.newaxis]
-
-            # Find closest point within the original data
-            ind = torch.LongTensor(tree.query(pts, k=1)[1][0])
-            grid_label = data.y[ind]
+        # Closest point and neighbours within the original data of all the centres at once
+        closest = torch.from_numpy(tree.query(grid_centers, k=1)[1]).long()
+        grid_labels = data.y[closest]
+        neighbours = tree.query_radius(grid_centers, r=self._radius)
+        counts = [len(ind) for ind in neighbours]
+        ind = torch.from_numpy(np.concatenate(neighbours)).long()
 
-            # Find neighbours within the original data
-            t_center = torch.FloatTensor(grid_center)
-            ind = torch.LongTensor(tree.query_radius(pts, r=self._radius)[0])
+        # Gathers the points of all the spheres and splits them per sphere
+        spheres = {}
+        for key in set(data.keys):
+            item = data[key]
+            if torch.is_tensor(item) and num_points == item.shape[0]:
+                item = item[ind]
+                if self._center and key == "pos":  # Center the spheres.
+                    item -= torch.from_numpy(np.repeat(grid_centers, counts, axis=0)).to(item.dtype)
+                spheres[key] = item.split(counts)
 
-            # Create a new data holder.
+        datas = []
+        for i in range(len(grid_centers)):
             new_data = Data()
-            for key in set(data.keys):
-                item = data[key].clone()
-                if num_points == item.shape[0]:
-                    item = item[ind]
-                    if self._center and key == "pos":  # Center the sphere.
-                        item -= t_center
-                    setattr(new_data, key, item)
-            new_data.center_label = grid_label
-
+            for key, items in spheres.items():
+                setattr(new_data, key, items[i])
+            new_data.center_label = grid_labels[i]
             datas.append(new_data)
         return datas
 
@@ -197,6 +204,8 @@ class RandomSphere(object):
     strategy: str
         choose between `random` and `freq_class_based`. The `freq_class_based` \
         favors points with low frequency class. This can be used to balance unbalanced datasets
+
+    The spatial index in KDTREE_KEY is used when present, see :class:`GridSphereSampling`
     """
 
     KDTREE_KEY = "kd_tree"
@@ -383,11 +392,14 @@ class MultiScaleTransform(object):
     -----------
     strategies: Dict[str, object]
         Dictionary that contains the samplers and neighbour_finder
+    cache: MultiScaleCache, optional
+        If provided, the pre-computed structures are read from / written to this on-disk cache
     """
 
-    def __init__(self, strategies):
+    def __init__(self, strategies, cache: MultiScaleCache = None):
         self.strategies = strategies
         self.num_layers = len(self.strategies["sampler"])
+        self._cache = cache
 
     @staticmethod
     def __inc__wrapper(func, special_params):
@@ -399,12 +411,14 @@ class MultiScaleTransform(object):
 
         return partial(new__inc__, special_params=special_params, func=func)
 
-    def __call__(self, data: Data) -> MultiScaleData:
-        # Compute sequentially multi_scale indexes on cpu
-        data.contiguous()
-        ms_data = MultiScaleData.from_data(data)
+    def _set_special_params(self, data, special_params):
+        setattr(data, "__inc__", self.__inc__wrapper(data.__inc__, special_params))
+
+    def _precompute(self, data):
         precomputed = [data]
+        precomputed_params = []
         upsample = []
+        upsample_params = []
         upsample_index = 0
         for index in range(self.num_layers):
             sampler, neighbour_finder = self.strategies["sampler"][index], self.strategies["neighbour_finder"][index]
@@ -421,10 +435,7 @@ class MultiScaleTransform(object):
                     upsample_index += 1
                     pre_up = upsampler.precompute(query, support)
                     upsample.append(pre_up)
-                    special_params = {}
-                    special_params["x_idx"] = query.num_nodes
-                    special_params["y_idx"] = support.num_nodes
-                    setattr(pre_up, "__inc__", self.__inc__wrapper(pre_up.__inc__, special_params))
+                    upsample_params.append({"x_idx": query.num_nodes, "y_idx": support.num_nodes})
             else:
                 query = support.clone()
 
@@ -438,21 +449,43 @@ class MultiScaleTransform(object):
                 )
 
             idx_neighboors, _ = neighbour_finder(s_pos, q_pos, batch_x=s_batch, batch_y=q_batch)
-            special_params = {}
-            special_params["idx_neighboors"] = s_pos.shape[0]
             setattr(query, "idx_neighboors", idx_neighboors)
-            setattr(query, "__inc__", self.__inc__wrapper(query.__inc__, special_params))
             precomputed.append(query)
-        ms_data.multiscale = precomputed[1:]
+            precomputed_params.append({"idx_neighboors": s_pos.shape[0]})
+        return precomputed[1:], precomputed_params, upsample, upsample_params
+
+    @time_func()
+    def __call__(self, data: Data) -> MultiScaleData:
+        # Compute sequentially multi_scale indexes on cpu
+        data.contiguous()
+        ms_data = MultiScaleData.from_data(data)
+
+        precomputed = None
+        if self._cache is not None:
+            key = self._cache.hash_data(data)
+            precomputed = self._cache.load(key)
+        if precomputed is None:
+            precomputed = self._precompute(data)
+            if self._cache is not None:
+                self._cache.save(key, *precomputed)
+
+        multiscale, multiscale_params, upsample, upsample_params = precomputed
+        for query, special_params in zip(multiscale, multiscale_params):
+            self._set_special_params(query, special_params)
+        for pre_up, special_params in zip(upsample, upsample_params):
+            self._set_special_params(pre_up, special_params)
+
+        ms_data.multiscale = multiscale
         upsample.reverse()  # Switch to inner layer first
         ms_data.upsample = upsample
         return ms_data
 
     def __repr__(self):
+        if self._cache is not None:
+            return "{}(cache={})".format(self.__class__.__name__, self._cache)
         return "{}".format(self.__class__.__name__)
 
 
-
 class ShuffleData(object):
     """ This transform allow to shuffle feature, pos and label tensors within data
     """
@@ -0,0 +1,182 @@
+import math
+import numpy as np
+import torch
+from numba import njit
+
+from .voxel_search import TaskPool, VoxelGridSearch, _batch_ptr
+
+# Voxel coordinates of the approximate mode are packed on 21 bits per axis
+_AXIS_BITS = 21
+
+
+@njit(nogil=True, cache=True)
+def _fps(pos, start, out):
+    """ Furthest point sampling of pos starting from the point start, fills out with the sampled indices.
+    Same iterations as torch_cluster.fps and torch_points_kernels.furthest_point_sample: the squared distance
+    of each point to the sampled set is updated with the last sample and the furthest point is sampled next,
+    the first one in case of a tie
+    """
+    n = pos.shape[0]
+    dist = np.full(n, np.inf, dtype=pos.dtype)
+    last = start
+    out[0] = start
+    for i in range(1, out.shape[0]):
+        best = -1.0
+        best_idx = 0
+        for j in range(n):
+            dx = pos[j, 0] - pos[last, 0]
+            dy = pos[j, 1] - pos[last, 1]
+            dz = pos[j, 2] - pos[last, 2]
+            d = dx * dx + dy * dy + dz * dz
+            if d < dist[j]:
+                dist[j] = d
+            if dist[j] > best:
+                best = dist[j]
+                best_idx = j
+        out[i] = best_idx
+        last = best_idx
+
+
+def grid_representatives(pos, num_representatives, max_iterations=6):
+    """ Subset of the points with one point per occupied voxel, the voxel size is adjusted until there are
+    at least num_representatives voxels (or max_iterations is reached).
+
+    Returns
+    -------
+    representatives: np.ndarray
+        Index of the first point of each voxel
+    voxel_size: float
+    """
+    low = pos.min(0)
+    extent = pos.max(0) - low
+    extent = np.maximum(extent, max(extent.max(), 1e-6) / 100.0)  # flat clouds
+    voxel_size = float((np.prod(extent) / num_representatives) ** (1 / 3.0))
+    for _ in range(max_iterations):
+        coords = ((pos - low) / voxel_size).astype(np.int64)
+        keys = (coords[:, 0] << (2 * _AXIS_BITS)) | (coords[:, 1] << _AXIS_BITS) | coords[:, 2]
+        _, representatives = np.unique(keys, return_index=True)
+        if len(representatives) >= num_representatives:
+            break
+        # Clouds are mostly surfaces, the number of voxels grows with the square of 1 / voxel_size
+        voxel_size *= max(0.5, math.sqrt(len(representatives) / float(num_representatives)))
+    return representatives, voxel_size
+
+
+class FurthestPointSampling:
+    """ CPU furthest point sampling, batch elements are sampled in parallel on a thread pool.
+
+    The exact mode follows the iterations of ``torch_cluster.fps`` and ``torch_points_kernels.furthest_point_sample``
+    and returns the same indices for the same starting point, its cost is O(N * num_to_sample) per batch element.
+
+    The approximate mode keeps one point per voxel of a grid holding about ``oversampling * num_to_sample``
+    occupied voxels and runs the exact sampling on those points only, which costs O(N log N + oversampling *
+    num_to_sample^2). Every point is within a voxel diagonal of a point of the grid subset, the coverage radius
+    of the approximate sampling is therefore at most the coverage radius of the exact sampling of the subset plus
+    the voxel diagonal. Use :func:`coverage_radius` to compare both modes on your data: exact furthest point
+    sampling is within a factor 2 of the best possible coverage radius.
+
+    Parameters
+    ----------
+    approximate: bool, optional
+        Samples a voxel grid subset of the points, used when the cloud has more than
+        ``oversampling * num_to_sample`` points
+    oversampling: int, optional
+        Number of grid points per sampled point in the approximate mode
+    num_threads: int, optional
+        Number of threads, defaults to ``torch.get_num_threads()`` which is 1 within DataLoader workers
+    """
+
+    def __init__(self, approximate=False, oversampling=4, num_threads=None):
+        self.approximate = approximate
+        self.oversampling = oversampling
+        self._tasks = TaskPool(num_threads)
+
+    def sample(self, pos, ratio, batch=None, random_start=False):
+        """ Samples ``ceil(ratio * N_b)`` points of each batch element like ``torch_cluster.fps``
+
+        Arguments:
+            pos -- [N, 3]
+            batch -- [N] batch element of each point, sorted
+
+        Returns:
+            indexes -- [sum(ceil(ratio * N_b))] indices in pos
+        """
+        ptr = _batch_ptr(batch, pos.shape[0])
+        counts = np.diff(ptr)
+        num_to_sample = np.ceil(counts.astype(np.float32) * np.float32(ratio)).astype(np.int64)
+        out_ptr = np.concatenate([[0], np.cumsum(num_to_sample)])
+        pos_np = pos.detach().cpu().numpy()
+        out = np.empty(out_ptr[-1], dtype=np.int64)
+
+        tasks = []
+        for b in range(len(counts)):
+            if num_to_sample[b] > 0:
+                start = int(torch.randint(int(counts[b]), (1,))) if random_start else 0
+                tasks.append((pos_np[ptr[b] : ptr[b + 1]], start, out[out_ptr[b] : out_ptr[b + 1]], ptr[b]))
+        self._tasks.map(self._sample, tasks)
+        return torch.from_numpy(out).to(pos.device)
+
+    def sample_dense(self, pos, num_to_sample):
+        """ Samples ``num_to_sample`` points of each batch element like ``torch_points_kernels.furthest_point_sample``
+
+        Arguments:
+            pos -- [B, N, 3]
+
+        Returns:
+            indexes -- [B, num_to_sample] indices within each batch element
+        """
+        pos_np = pos.detach().cpu().numpy()
+        out = np.empty((pos_np.shape[0], num_to_sample), dtype=np.int64)
+        if num_to_sample > 0:
+            self._tasks.map(self._sample, [(pos_np[b], 0, out[b], 0) for b in range(pos_np.shape[0])])
+        return torch.from_numpy(out).to(pos.device)
+
+    def _sample(self, pos, start, out, offset):
+        pos = np.ascontiguousarray(pos)
+        if self.approximate and pos.shape[0] > self.oversampling * out.shape[0]:
+            representatives, _ = grid_representatives(pos, self.oversampling * out.shape[0])
+            if len(representatives) >= out.shape[0]:
+                start = np.searchsorted(representatives, start)
+                start = min(start, len(representatives) - 1)
+                _fps(np.ascontiguousarray(pos[representatives]), start, out)
+                out[:] = representatives[out]
+                out += offset
+                return
+        _fps(pos, start, out)
+        out += offset
+
+    @property
+    def num_threads(self):
+        return self._tasks.num_threads
+
+    def __repr__(self):
+        return "{}(approximate={}, oversampling={}, num_threads={})".format(
+            self.__class__.__name__, self.approximate, self.oversampling, self.num_threads
+        )
+
+
+def coverage_radius(pos, idx, batch=None):
+    """ Coverage quality of a sampling: distance from the points of each batch element to their closest
+    sampled point, the largest of those distances is the radius of the balls centred on the samples that
+    cover the whole cloud. Lower is better.
+
+    Arguments:
+        pos -- [N, 3] or [B, N, 3]
+        idx -- indices in pos as returned by FurthestPointSampling.sample or sample_dense
+        batch -- [N] batch element of each point for sparse clouds
+
+    Returns:
+        radius -- [B] coverage radius of each batch element
+    """
+    if pos.dim() == 3:
+        num_batches, num_points = pos.shape[0], pos.shape[1]
+        idx = idx + torch.arange(num_batches).view(-1, 1) * num_points
+        pos, idx = pos.reshape(-1, 3), idx.reshape(-1)
+        batch = torch.arange(num_batches).repeat_interleave(num_points)
+    if batch is None:
+        batch = torch.zeros(pos.shape[0], dtype=torch.long)
+    pos, idx, batch = pos.cpu(), idx.cpu(), batch.cpu()
+    _, sq_dist = VoxelGridSearch().knn(pos[idx], pos, 1, batch[idx], batch, mode="partial_dense")
+    radius = np.zeros(int(batch.max()) + 1, dtype=np.float64)
+    np.maximum.at(radius, batch.numpy(), sq_dist.view(-1).double().clamp(min=0).numpy())
+    return torch.from_numpy(np.sqrt(radius))
@@ -3,11 +3,14 @@ from torch_geometric.nn import knn_interpolate, knn
 from torch_scatter import scatter_add
 from torch_geometric.data import Data
 
+from src.utils.timer import time_func
+
 
 class KNNInterpolate:
     def __init__(self, k):
         self.k = k
 
+    @time_func()
     def precompute(self, query, support):
         """ Precomputes a data structure that can be used in the transform itself to speed things up
         """
@@ -31,6 +34,7 @@ class KNNInterpolate:
 
         return Data(num_nodes=support.num_nodes, x_idx=x_idx, y_idx=y_idx, weights=weights, normalisation=normalisation)
 
+    @time_func()
     def __call__(self, query, support, precomputed: Data = None):
         """ Computes a new set of features going from the query resolution position to the support
         resolution position
@@ -6,11 +6,48 @@ import torch_points_kernels as tp
 import torchnet as tnt
 from src.utils.config import is_list
 from src.utils.enums import ConvolutionFormat
+from src.utils.timer import time_func
 
 from src.utils.debugging_vars import DEBUGGING_VARS, DistributionNeighbour
 
+_SEARCH_BACKEND = None
 
-class BaseNeighbourFinder(ABC):
+
+def get_search_backend(backend=None):
+    """ Returns the CPU search backend ``backend`` or the global one if None. A backend is either an object
+    implementing ``radius`` and ``knn`` with the interface of
+    :class:`src.core.spatial_ops.voxel_search.VoxelGridSearch` or one of the following names:
+        - ``voxel_grid``: :class:`src.core.spatial_ops.voxel_search.VoxelGridSearch`
+    """
+    if backend is None:
+        backend = _SEARCH_BACKEND
+    if isinstance(backend, str):
+        if backend == "voxel_grid":
+            from .voxel_search import VoxelGridSearch
+
+            return VoxelGridSearch()
+        raise ValueError("Unknown search backend {}".format(backend))
+    return backend
+
+
+def set_search_backend(backend):
+    """ Sets the CPU search backend used by the neighbour finders created without a backend.
+    None uses torch_cluster and torch_points_kernels.
+    """
+    global _SEARCH_BACKEND
+    _SEARCH_BACKEND = get_search_backend(backend) if backend else None
+
+
+class SearchBackendMixin:
+    def _cpu_backend(self, x):
+        """ Search backend to use for the tensor x, None if the default kernels should be used
+        """
+        if x.is_cuda:
+            return None
+        return get_search_backend(getattr(self, "_backend", None))
+
+
+class BaseNeighbourFinder(ABC, SearchBackendMixin):
     def __call__(self, x, y, batch_x, batch_y):
         return self.find_neighbours(x, y, batch_x, batch_y)
 
@@ -23,12 +60,24 @@ class BaseNeighbourFinder(ABC):
 
 
 class RadiusNeighbourFinder(BaseNeighbourFinder):
-    def __init__(self, radius: float, max_num_neighbors: int = 64, conv_type=ConvolutionFormat.MESSAGE_PASSING.value):
+    def __init__(
+        self,
+        radius: float,
+        max_num_neighbors: int = 64,
+        conv_type=ConvolutionFormat.MESSAGE_PASSING.value,
+        backend=None,
+    ):
         self._radius = radius
         self._max_num_neighbors = max_num_neighbors
         self._conv_type = conv_type.lower()
+        self._backend = get_search_backend(backend) if backend else None
 
+    @time_func()
     def find_neighbours(self, x, y, batch_x=None, batch_y=None):
+        backend = self._cpu_backend(x)
+        if backend is not None:
+            return backend.radius(x, y, self._radius, self._max_num_neighbors, batch_x, batch_y, mode=self._conv_type)
+
         if self._conv_type == ConvolutionFormat.MESSAGE_PASSING.value:
             return radius(x, y, self._radius, batch_x, batch_y, max_num_neighbors=self._max_num_neighbors)
         elif self._conv_type == ConvolutionFormat.DENSE.value or ConvolutionFormat.PARTIAL_DENSE.value:
@@ -40,19 +89,25 @@ class RadiusNeighbourFinder(BaseNeighbourFinder):
 
 
 class KNNNeighbourFinder(BaseNeighbourFinder):
-    def __init__(self, k):
+    def __init__(self, k, backend=None):
         self.k = k
+        self._backend = get_search_backend(backend) if backend else None
 
+    @time_func()
     def find_neighbours(self, x, y, batch_x, batch_y):
+        backend = self._cpu_backend(x)
+        if backend is not None:
+            return backend.knn(x, y, self.k, batch_x, batch_y, mode=ConvolutionFormat.MESSAGE_PASSING.value)
         return knn(x, y, self.k, batch_x, batch_y)
 
 
 class DilatedKNNNeighbourFinder(BaseNeighbourFinder):
-    def __init__(self, k, dilation):
+    def __init__(self, k, dilation, backend=None):
         self.k = k
         self.dilation = dilation
-        self.initialFinder = KNNNeighbourFinder(k * dilation)
+        self.initialFinder = KNNNeighbourFinder(k * dilation, backend=backend)
 
+    @time_func()
     def find_neighbours(self, x, y, batch_x, batch_y):
         # find the self.k * self.dilation closest neighbours in x for each y
         row, col = self.initialFinder.find_neighbours(x, y, batch_x, batch_y)
@@ -68,7 +123,7 @@ class DilatedKNNNeighbourFinder(BaseNeighbourFinder):
         return row, col
 
 
-class BaseMSNeighbourFinder(ABC):
+class BaseMSNeighbourFinder(ABC, SearchBackendMixin):
     def __call__(self, x, y, batch_x=None, batch_y=None, scale_idx=0):
         return self.find_neighbours(x, y, batch_x=batch_x, batch_y=batch_y, scale_idx=scale_idx)
 
@@ -76,6 +131,11 @@ class BaseMSNeighbourFinder(ABC):
     def find_neighbours(self, x, y, batch_x=None, batch_y=None, scale_idx=0):
         pass
 
+    def find_multiscale_neighbours(self, x, y, batch_x=None, batch_y=None):
+        """ Returns the neighbours of y in x for all the scales, one search per scale by default
+        """
+        return [self(x, y, batch_x=batch_x, batch_y=batch_y, scale_idx=i) for i in range(self.num_scales)]
+
     @property
     @abstractmethod
     def num_scales(self):
@@ -94,14 +154,23 @@ class MultiscaleRadiusNeighbourFinder(BaseMSNeighbourFinder):
 
         Keyword Arguments:
             max_num_neighbors {Union[int, List[int]]}  (default: {64})
+            backend {Union[str, object]} -- CPU search backend, see get_search_backend (default: {None})
+            nested {bool} -- find_multiscale_neighbours searches once with the largest radius and derives
+                the smaller scales from it (default: {False})
 
         Raises:
             ValueError: [description]
     """
 
     def __init__(
-        self, radius: Union[float, List[float]], max_num_neighbors: Union[int, List[int]] = 64,
+        self,
+        radius: Union[float, List[float]],
+        max_num_neighbors: Union[int, List[int]] = 64,
+        backend=None,
+        nested=False,
     ):
+        self._backend = get_search_backend(backend) if backend else None
+        self.nested = nested
 
         if DEBUGGING_VARS["FIND_NEIGHBOUR_DIST"]:
             self._dist_meters = [DistributionNeighbour(r) for r in radius]
@@ -127,14 +196,83 @@ class MultiscaleRadiusNeighbourFinder(BaseMSNeighbourFinder):
         self._max_num_neighbors = [max_num_neighbors]
         self._radius = [radius]
 
+    @time_func()
     def find_neighbours(self, x, y, batch_x=None, batch_y=None, scale_idx=0):
         if scale_idx >= self.num_scales:
             raise ValueError("Scale %i is out of bounds %i" % (scale_idx, self.num_scales))
+        return self._search(x, y, self._radius[scale_idx], self._max_num_neighbors[scale_idx], batch_x, batch_y)
 
-        radius_idx = radius(
-            x, y, self._radius[scale_idx], batch_x, batch_y, max_num_neighbors=self._max_num_neighbors[scale_idx]
-        )
-        return radius_idx
+    def _search(self, x, y, radius_value, max_num_neighbors, batch_x=None, batch_y=None):
+        backend = self._cpu_backend(x)
+        if backend is not None:
+            return backend.radius(
+                x, y, radius_value, max_num_neighbors, batch_x, batch_y, mode=ConvolutionFormat.MESSAGE_PASSING.value,
+            )
+        return radius(x, y, radius_value, batch_x, batch_y, max_num_neighbors=max_num_neighbors)
+
+    def _reuse_search(self):
+        """ True if the smaller scales are derived from the search at the largest radius
+        """
+        return self.nested and self.num_scales > 1 and not DEBUGGING_VARS["FIND_NEIGHBOUR_DIST"]
+
+    def _sorted_neighbours(self, x):
+        """ True if the search returns the closest neighbours first, see VoxelGridSearch
+        """
+        return getattr(self._cpu_backend(x), "SORTED_NEIGHBOURS", False)
+
+    @time_func()
+    def find_multiscale_neighbours(self, x, y, batch_x=None, batch_y=None):
+        """ Returns a list of (row, col) for each scale. When nested, a single search is done with the largest
+        radius and number of neighbours, the edges of a given scale are then the first max_num_neighbors edges
+        of each query point that are within its radius.
+        A query point for which the largest search hit its max_num_neighbors limit may have neighbours that were
+        not returned. If it has less than max_num_neighbors edges within the radius of a scale, that scale is
+        searched again for this query point only. This is not needed when the neighbours are sorted by distance.
+        """
+        if not self._reuse_search():
+            return super().find_multiscale_neighbours(x, y, batch_x, batch_y)
+
+        max_num_neighbors = max(self._max_num_neighbors)
+        row, col = self._search(x, y, max(self._radius), max_num_neighbors, batch_x, batch_y)
+        sq_dist = (x[col] - y[row]).pow(2).sum(-1)
+
+        # Edges are grouped by query point, start of each group in the edge list
+        counts = torch.bincount(row, minlength=y.shape[0])
+        start = (counts.cumsum(0) - counts)[row]
+        saturated = None if self._sorted_neighbours(x) else counts >= max_num_neighbors
+
+        neighbours = []
+        for radius_value, num_neighbours in zip(self._radius, self._max_num_neighbors):
+            mask = (sq_dist <= radius_value ** 2).long()
+            before = mask.cumsum(0) - mask
+            rank = before - before[start]
+            keep = (mask > 0) & (rank < num_neighbours)
+            scale_row, scale_col = row[keep], col[keep]
+            if saturated is not None:
+                num_in_radius = torch.bincount(scale_row, minlength=y.shape[0])
+                incomplete = saturated & (num_in_radius < num_neighbours)
+                if incomplete.any():
+                    scale_row, scale_col = self._search_again(
+                        x, y, radius_value, num_neighbours, batch_x, batch_y, scale_row, scale_col, incomplete
+                    )
+            neighbours.append((scale_row, scale_col))
+        return neighbours
+
+    def _search_again(self, x, y, radius_value, max_num_neighbors, batch_x, batch_y, row, col, queries_mask):
+        """ Replaces the edges of the query points in queries_mask by the result of a new search
+        """
+        queries = queries_mask.nonzero().view(-1)
+        sub_batch_y = batch_y[queries] if batch_y is not None else None
+        sub_row, sub_col = self._search(x, y[queries], radius_value, max_num_neighbors, batch_x, sub_batch_y)
+
+        kept = ~queries_mask[row]
+        row = torch.cat([row[kept], queries[sub_row]])
+        col = torch.cat([col[kept], sub_col])
+
+        # Groups the edges by query point again, keeping the order within each group
+        order = torch.arange(row.shape[0], device=row.device)
+        order = (row * row.shape[0] + order).argsort()
+        return row[order], col[order]
 
     @property
     def num_scales(self):
@@ -150,11 +288,12 @@ class DenseRadiusNeighbourFinder(MultiscaleRadiusNeighbourFinder):
     """ Multiscale radius search for dense graphs
     """
 
+    @time_func()
     def find_neighbours(self, x, y, scale_idx=0):
         if scale_idx >= self.num_scales:
             raise ValueError("Scale %i is out of bounds %i" % (scale_idx, self.num_scales))
         num_neighbours = self._max_num_neighbors[scale_idx]
-        neighbours = tp.ball_query(self._radius[scale_idx], num_neighbours, x, y)[0]
+        neighbours = self._search(x, y, self._radius[scale_idx], num_neighbours)[0]
 
         if DEBUGGING_VARS["FIND_NEIGHBOUR_DIST"]:
             for i in range(neighbours.shape[0]):
@@ -165,6 +304,56 @@ class DenseRadiusNeighbourFinder(MultiscaleRadiusNeighbourFinder):
                 self._dist_meters[scale_idx].add_valid_neighbours(valid_neighbours)
         return neighbours
 
+    def _search(self, x, y, radius_value, max_num_neighbors, batch_x=None, batch_y=None):
+        backend = self._cpu_backend(x)
+        if backend is not None:
+            return backend.radius(x, y, radius_value, max_num_neighbors, mode=ConvolutionFormat.DENSE.value)
+        return tp.ball_query(radius_value, max_num_neighbors, x, y)
+
+    @time_func()
+    def find_multiscale_neighbours(self, x, y, batch_x=None, batch_y=None):
+        """ Returns a list of [B, npoints, nsample] indices, one for each scale. When nested, a single ball query
+        is done with the largest radius and number of neighbours and each scale keeps the first nsample
+        neighbours within its radius, padded with the first one like the ball query does. Query points whose
+        largest search is saturated are searched again when needed, see MultiscaleRadiusNeighbourFinder.
+        """
+        if not self._reuse_search():
+            return super().find_multiscale_neighbours(x, y, batch_x, batch_y)
+
+        max_num_neighbors = max(self._max_num_neighbors)
+        idx, sq_dist = self._search(x, y, max(self._radius), max_num_neighbors)
+        found = sq_dist >= 0
+        saturated = None if self._sorted_neighbours(x) else found.sum(-1) >= max_num_neighbors
+
+        neighbours = []
+        for radius_value, num_neighbours in zip(self._radius, self._max_num_neighbors):
+            valid = found & (sq_dist <= radius_value ** 2)
+            rank = valid.long().cumsum(-1) - 1
+            # Neighbours that are not kept are written in an extra column that is dropped
+            rank[~valid | (rank >= num_neighbours)] = num_neighbours
+            scale_idx = idx.new_full((idx.shape[0], idx.shape[1], num_neighbours + 1), -1)
+            scale_idx.scatter_(-1, rank, idx)
+            scale_idx = scale_idx[:, :, :num_neighbours]
+            first = scale_idx[:, :, :1].clamp(min=0).expand_as(scale_idx)
+            scale_idx = torch.where(scale_idx >= 0, scale_idx, first)
+            if saturated is not None:
+                incomplete = saturated & (valid.sum(-1) < num_neighbours)
+                if incomplete.any():
+                    scale_idx = self._search_again(x, y, radius_value, num_neighbours, scale_idx, incomplete)
+            neighbours.append(scale_idx)
+        return neighbours
+
+    def _search_again(self, x, y, radius_value, num_neighbours, idx, queries_mask):
+        """ Replaces the neighbours of the query points in queries_mask [B, npoints] by the result of a new
+        search. All the samples search the same number of query points, samples with less incomplete query points
+        also search some complete ones, which then get the result of the search at that scale as well
+        """
+        num_queries = int(queries_mask.sum(-1).max())
+        queries = queries_mask.long().sort(-1, descending=True)[1][:, :num_queries]
+        sub_y = y.gather(1, queries.unsqueeze(-1).expand(-1, -1, y.shape[-1])).contiguous()
+        sub_idx = self._search(x, sub_y, radius_value, num_neighbours)[0]
+        return idx.scatter(1, queries.unsqueeze(-1).expand(-1, -1, num_neighbours), sub_idx)
+
     def __call__(self, x, y, scale_idx=0, **kwargs):
         """ Dense interface of the neighboorhood finder
         """
@@ -1,13 +1,12 @@
 from abc import ABC, abstractmethod
 import math
 import torch
-from torch_geometric.nn import voxel_grid
-from torch_geometric.nn.pool.consecutive import consecutive_cluster
-from torch_geometric.nn.pool.pool import pool_pos, pool_batch
 import torch_points_kernels as tp
 
 from src.utils.config import is_list
 from src.utils.enums import ConvolutionFormat
+from src.utils.timer import time_func
+from src.core.data_transform.grid_transform import voxel_key, voxel_clusters, pool_mean
 
 
 class BaseSampler(ABC):
@@ -50,17 +49,45 @@ class BaseSampler(ABC):
         pass
 
 
-class FPSSampler(BaseSampler):
+class BaseFPSSampler(BaseSampler):
+    """ Furthest point sampling, cpu tensors are sampled by
+        :class:`src.core.spatial_ops.fps.FurthestPointSampling` with one thread per batch element.
+
+        Keyword Arguments:
+            approximate {bool} -- Samples a voxel grid subset of large clouds on cpu (default: {False})
+            num_threads {int} -- Number of threads on cpu (default: {torch.get_num_threads()})
+    """
+
+    def __init__(self, ratio=None, num_to_sample=None, subsampling_param=None, approximate=False, num_threads=None):
+        super(BaseFPSSampler, self).__init__(ratio, num_to_sample, subsampling_param)
+        self._approximate = approximate
+        self._num_threads = num_threads
+        self._cpu_fps = None
+
+    @property
+    def cpu_fps(self):
+        if self._cpu_fps is None:
+            from .fps import FurthestPointSampling
+
+            self._cpu_fps = FurthestPointSampling(approximate=self._approximate, num_threads=self._num_threads)
+        return self._cpu_fps
+
+
+class FPSSampler(BaseFPSSampler):
     """If num_to_sample is provided, sample exactly
         num_to_sample points. Otherwise sample floor(pos[0] * ratio) points
     """
 
+    @time_func()
     def sample(self, pos, batch, **kwargs):
         from torch_geometric.nn import fps
 
         if len(pos.shape) != 2:
             raise ValueError(" This class is for sparse data and expects the pos tensor to be of dimension 2")
-        return fps(pos, batch, ratio=self._get_ratio_to_sample(pos.shape[0]))
+        ratio = self._get_ratio_to_sample(pos.shape[0])
+        if not pos.is_cuda:
+            return self.cpu_fps.sample(pos, ratio, batch, random_start=True)
+        return fps(pos, batch, ratio=ratio)
 
 
 class GridSampler(BaseSampler):
@@ -68,24 +95,25 @@ class GridSampler(BaseSampler):
         num_to_sample points. Otherwise sample floor(pos[0] * ratio) points
     """
 
+    @time_func()
     def sample(self, pos=None, x=None, batch=None):
         if len(pos.shape) != 2:
             raise ValueError("This class is for sparse data and expects the pos tensor to be of dimension 2")
 
-        pool = voxel_grid(pos, batch, self._subsampling_param)
-        pool, perm = consecutive_cluster(pool)
-        batch = pool_batch(perm, batch)
+        cluster, perm, counts, _ = voxel_clusters(voxel_key(pos, self._subsampling_param, batch))
+        batch = batch[perm]
         if x is not None:
-            return pool_pos(pool, x), pool_pos(pool, pos), batch
+            return pool_mean(x, cluster, counts), pool_mean(pos, cluster, counts), batch
         else:
-            return None, pool_pos(pool, pos), batch
+            return None, pool_mean(pos, cluster, counts), batch
 
 
-class DenseFPSSampler(BaseSampler):
+class DenseFPSSampler(BaseFPSSampler):
     """If num_to_sample is provided, sample exactly
         num_to_sample points. Otherwise sample floor(pos[0] * ratio) points
     """
 
+    @time_func()
     def sample(self, pos, **kwargs):
         """ Sample pos
 
@@ -97,6 +125,8 @@ class DenseFPSSampler(BaseSampler):
         """
         if len(pos.shape) != 3:
             raise ValueError(" This class is for dense data and expects the pos tensor to be of dimension 2")
+        if not pos.is_cuda:
+            return self.cpu_fps.sample_dense(pos, self._get_num_to_sample(pos.shape[1]))
         return tp.furthest_point_sample(pos, self._get_num_to_sample(pos.shape[1]))
 
 
@@ -105,6 +135,7 @@ class RandomSampler(BaseSampler):
         num_to_sample points. Otherwise sample floor(pos[0] * ratio) points
     """
 
+    @time_func()
     def sample(self, pos, batch, **kwargs):
         if len(pos.shape) != 2:
             raise ValueError(" This class is for sparse data and expects the pos tensor to be of dimension 2")
@@ -119,6 +150,7 @@ class DenseRandomSampler(BaseSampler):
             pos -- [B, N, 3]
     """
 
+    @time_func()
     def sample(self, pos, **kwargs):
         if len(pos.shape) != 3:
             raise ValueError(" This class is for dense data and expects the pos tensor to be of dimension 2")
@@ -0,0 +1,465 @@
+import os
+import math
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import torch
+from numba import njit
+
+from src.utils.enums import ConvolutionFormat
+
+# Voxel coordinates are packed on 21 bits per axis
+_AXIS_BITS = 21
+_AXIS_OFFSET = 1 << (_AXIS_BITS - 1)
+_EMPTY = -1
+
+
+@njit(nogil=True, cache=True)
+def _pack(ix, iy, iz):
+    return ((ix + _AXIS_OFFSET) << (2 * _AXIS_BITS)) | ((iy + _AXIS_OFFSET) << _AXIS_BITS) | (iz + _AXIS_OFFSET)
+
+
+@njit(nogil=True, cache=True)
+def _hash(key, mask):
+    # Mixes the bits of the three axes before keeping the lowest ones
+    key = (key ^ (key >> 21) ^ (key >> 42)) * 2654435761
+    return (key ^ (key >> 32)) & mask
+
+
+@njit(nogil=True, cache=True)
+def _build_grid(pos, voxel_size):
+    """ Sorts the points by voxel and builds an open addressing hash table from the voxel key
+    to the range of its points in the sorted order
+    """
+    n = pos.shape[0]
+    coords = np.empty((n, 3), dtype=np.int64)
+    keys = np.empty(n, dtype=np.int64)
+    for i in range(n):
+        for d in range(3):
+            coords[i, d] = int(math.floor(pos[i, d] / voxel_size))
+        keys[i] = _pack(coords[i, 0], coords[i, 1], coords[i, 2])
+    order = np.argsort(keys, kind="mergesort")
+
+    num_voxels = 0
+    for i in range(n):
+        if i == 0 or keys[order[i]] != keys[order[i - 1]]:
+            num_voxels += 1
+    table_size = 1
+    while table_size < 2 * num_voxels:
+        table_size *= 2
+    mask = table_size - 1
+    table_keys = np.full(table_size, _EMPTY, dtype=np.int64)
+    table_start = np.zeros(table_size, dtype=np.int64)
+    table_end = np.zeros(table_size, dtype=np.int64)
+
+    slot = -1
+    for i in range(n):
+        key = keys[order[i]]
+        if i == 0 or key != keys[order[i - 1]]:
+            if slot >= 0:
+                table_end[slot] = i
+            slot = _hash(key, mask)
+            while table_keys[slot] != _EMPTY:
+                slot = (slot + 1) & mask
+            table_keys[slot] = key
+            table_start[slot] = i
+    if slot >= 0:
+        table_end[slot] = n
+
+    low = np.zeros(3, dtype=np.int64)
+    high = np.zeros(3, dtype=np.int64)
+    if n > 0:
+        for d in range(3):
+            low[d] = coords[:, d].min()
+            high[d] = coords[:, d].max()
+    return pos[order], order, table_keys, table_start, table_end, low, high
+
+
+@njit(nogil=True, cache=True)
+def _lookup(table_keys, key):
+    mask = table_keys.shape[0] - 1
+    slot = _hash(key, mask)
+    while table_keys[slot] != _EMPTY:
+        if table_keys[slot] == key:
+            return slot
+        slot = (slot + 1) & mask
+    return -1
+
+
+@njit(nogil=True, cache=True)
+def _insert(best_idx, best_dist, count, k, idx, dist):
+    """ Inserts a candidate in the list of the k closest neighbours sorted by increasing distance
+    """
+    if count == k and dist >= best_dist[k - 1]:
+        return count
+    j = count if count < k else k - 1
+    while j > 0 and best_dist[j - 1] > dist:
+        best_idx[j] = best_idx[j - 1]
+        best_dist[j] = best_dist[j - 1]
+        j -= 1
+    best_idx[j] = idx
+    best_dist[j] = dist
+    return count + 1 if count < k else count
+
+
+@njit(nogil=True, cache=True)
+def _visit_cell(
+    qx, qy, qz, cx, cy, cz, sorted_pos, table_keys, table_start, table_end, best_idx, best_dist, count, k, max_dist
+):
+    slot = _lookup(table_keys, _pack(cx, cy, cz))
+    if slot < 0:
+        return count
+    for j in range(table_start[slot], table_end[slot]):
+        dx = sorted_pos[j, 0] - qx
+        dy = sorted_pos[j, 1] - qy
+        dz = sorted_pos[j, 2] - qz
+        dist = dx * dx + dy * dy + dz * dz
+        if dist <= max_dist:
+            count = _insert(best_idx, best_dist, count, k, j, dist)
+    return count
+
+
+@njit(nogil=True, cache=True)
+def _radius_query(
+    queries, start, end, voxel_size, r2, sorted_pos, order, table_keys, table_start, table_end, out_idx, out_dist
+):
+    k = out_idx.shape[1]
+    best_idx = np.empty(k, dtype=np.int64)
+    best_dist = np.empty(k, dtype=out_dist.dtype)
+    for q in range(start, end):
+        qx, qy, qz = queries[q, 0], queries[q, 1], queries[q, 2]
+        cx = int(math.floor(qx / voxel_size))
+        cy = int(math.floor(qy / voxel_size))
+        cz = int(math.floor(qz / voxel_size))
+        count = 0
+        for dx in range(-1, 2):
+            for dy in range(-1, 2):
+                for dz in range(-1, 2):
+                    count = _visit_cell(
+                        qx,
+                        qy,
+                        qz,
+                        cx + dx,
+                        cy + dy,
+                        cz + dz,
+                        sorted_pos,
+                        table_keys,
+                        table_start,
+                        table_end,
+                        best_idx,
+                        best_dist,
+                        count,
+                        k,
+                        r2,
+                    )
+        for j in range(count):
+            out_idx[q, j] = order[best_idx[j]]
+            out_dist[q, j] = best_dist[j]
+
+
+@njit(nogil=True, cache=True)
+def _knn_query(
+    queries, start, end, voxel_size, low, high, sorted_pos, order, table_keys, table_start, table_end, out_idx, out_dist
+):
+    k = out_idx.shape[1]
+    best_idx = np.empty(k, dtype=np.int64)
+    best_dist = np.empty(k, dtype=out_dist.dtype)
+    for q in range(start, end):
+        qx, qy, qz = queries[q, 0], queries[q, 1], queries[q, 2]
+        cx = int(math.floor(qx / voxel_size))
+        cy = int(math.floor(qy / voxel_size))
+        cz = int(math.floor(qz / voxel_size))
+        # Number of rings needed to cover all the voxels
+        max_ring = max(
+            max(abs(cx - low[0]), abs(cx - high[0])),
+            max(max(abs(cy - low[1]), abs(cy - high[1])), max(abs(cz - low[2]), abs(cz - high[2]))),
+        )
+        count = 0
+        ring = 0
+        while ring <= max_ring:
+            # Visits the voxels at a chebyshev distance ring of the voxel of the query
+            for dx in range(-ring, ring + 1):
+                for dy in range(-ring, ring + 1):
+                    on_border = abs(dx) == ring or abs(dy) == ring
+                    dz = -ring
+                    while dz <= ring:
+                        count = _visit_cell(
+                            qx,
+                            qy,
+                            qz,
+                            cx + dx,
+                            cy + dy,
+                            cz + dz,
+                            sorted_pos,
+                            table_keys,
+                            table_start,
+                            table_end,
+                            best_idx,
+                            best_dist,
+                            count,
+                            k,
+                            np.inf,
+                        )
+                        dz += 1 if on_border or ring == 0 else 2 * ring
+            # All the points closer than ring * voxel_size have been visited
+            if count == k and best_dist[k - 1] <= (ring * voxel_size) ** 2:
+                break
+            ring += 1
+        for j in range(count):
+            out_idx[q, j] = order[best_idx[j]]
+            out_dist[q, j] = best_dist[j]
+
+
+@njit(nogil=True, cache=True)
+def _radius_all(
+    queries, voxel_size, radius, sorted_pos, order, table_keys, table_start, table_end, low, high, ptr, out
+):
+    """ All the points within radius of each query, without limit on their number. With an empty out,
+    ptr[q + 1] is set to the number of neighbours of the query q, otherwise they are written in
+    out[ptr[q]:ptr[q + 1]]
+    """
+    r2 = radius * radius
+    fill = out.shape[0] > 0
+    for q in range(queries.shape[0]):
+        qx, qy, qz = queries[q, 0], queries[q, 1], queries[q, 2]
+        x0 = max(int(math.floor((qx - radius) / voxel_size)), low[0])
+        x1 = min(int(math.floor((qx + radius) / voxel_size)), high[0])
+        y0 = max(int(math.floor((qy - radius) / voxel_size)), low[1])
+        y1 = min(int(math.floor((qy + radius) / voxel_size)), high[1])
+        z0 = max(int(math.floor((qz - radius) / voxel_size)), low[2])
+        z1 = min(int(math.floor((qz + radius) / voxel_size)), high[2])
+        count = 0
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                for cz in range(z0, z1 + 1):
+                    slot = _lookup(table_keys, _pack(cx, cy, cz))
+                    if slot < 0:
+                        continue
+                    for j in range(table_start[slot], table_end[slot]):
+                        dx = sorted_pos[j, 0] - qx
+                        dy = sorted_pos[j, 1] - qy
+                        dz = sorted_pos[j, 2] - qz
+                        if dx * dx + dy * dy + dz * dz <= r2:
+                            if fill:
+                                out[ptr[q] + count] = order[j]
+                            count += 1
+        if not fill:
+            ptr[q + 1] = count
+
+
+class _Grid:
+    def __init__(self, pos, voxel_size):
+        self.voxel_size = voxel_size
+        (
+            self.sorted_pos,
+            self.order,
+            self.table_keys,
+            self.table_start,
+            self.table_end,
+            self.low,
+            self.high,
+        ) = _build_grid(pos, voxel_size)
+
+
+class TaskPool:
+    """ Runs tasks on a thread pool, the numba kernels release the GIL. The pool is created lazily
+    and recreated in forked processes (DataLoader workers) since thread pools do not survive a fork
+    """
+
+    def __init__(self, num_threads=None):
+        self._num_threads = num_threads
+        self._pool = None
+        self._pool_pid = None
+
+    @property
+    def num_threads(self):
+        return self._num_threads or torch.get_num_threads()
+
+    def map(self, func, tasks):
+        if self.num_threads <= 1 or len(tasks) <= 1:
+            return [func(*task) for task in tasks]
+        if self._pool is None or self._pool_pid != os.getpid() or self._pool._max_workers != self.num_threads:
+            self._pool = ThreadPoolExecutor(max_workers=self.num_threads)
+            self._pool_pid = os.getpid()
+        return list(self._pool.map(lambda task: func(*task), tasks))
+
+    def __getstate__(self):
+        return {"_num_threads": self._num_threads, "_pool": None, "_pool_pid": None}
+
+
+def _batch_ptr(batch, size):
+    if batch is None:
+        return np.array([0, size], dtype=np.int64)
+    counts = np.bincount(batch.cpu().numpy(), minlength=1)
+    return np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+
+class VoxelGridSearch:
+    """ Multithreaded CPU neighbour search based on a voxel hash grid.
+
+    The support points of each batch element are sorted by voxel and indexed by a hash table. Radius queries
+    visit the 27 voxels around the query with voxels as large as the radius, knn queries visit rings of voxels
+    until the k-th neighbour found is closer than the visited rings. Grids are built for each batch element
+    and queries are split in chunks of ``chunk_size`` points, both are processed on a thread pool.
+
+    Neighbours are sorted by increasing distance: when more than ``max_num_neighbors`` points are within
+    the radius, the closest ones are kept.
+
+    Parameters
+    ----------
+    num_threads: int, optional
+        Number of threads, defaults to ``torch.get_num_threads()`` which is 1 within DataLoader workers
+    chunk_size: int, optional
+        Number of queries processed by a single task
+    """
+
+    # Neighbours are returned closest first, see MultiscaleRadiusNeighbourFinder
+    SORTED_NEIGHBOURS = True
+
+    def __init__(self, num_threads=None, chunk_size=4096):
+        self._tasks = TaskPool(num_threads)
+        self._chunk_size = chunk_size
+
+    @property
+    def num_threads(self):
+        return self._tasks.num_threads
+
+    def _map(self, func, tasks):
+        return self._tasks.map(func, tasks)
+
+    def _search(self, x, y, ptr_x, ptr_y, k, query, voxel_size_func):
+        x_np = x.detach().cpu().numpy()
+        y_np = y.detach().cpu().numpy()
+        num_elements = min(len(ptr_x), len(ptr_y)) - 1
+
+        def build(b):
+            pos = x_np[ptr_x[b] : ptr_x[b + 1]]
+            return _Grid(pos, voxel_size_func(pos))
+
+        grids = self._map(build, [(b,) for b in range(num_elements)])
+
+        out_idx = np.full((y_np.shape[0], k), -1, dtype=np.int64)
+        out_dist = np.full((y_np.shape[0], k), -1, dtype=x_np.dtype)
+        tasks = []
+        for b in range(num_elements):
+            for start in range(ptr_y[b], ptr_y[b + 1], self._chunk_size):
+                tasks.append((b, start, min(start + self._chunk_size, ptr_y[b + 1])))
+
+        def run(b, start, end):
+            if ptr_x[b + 1] > ptr_x[b]:
+                query(grids[b], y_np, start, end, out_idx, out_dist)
+                found = out_idx[start:end] >= 0
+                out_idx[start:end][found] += ptr_x[b]
+
+        self._map(run, tasks)
+        return torch.from_numpy(out_idx), torch.from_numpy(out_dist)
+
+    def radius(self, x, y, radius, max_num_neighbors, batch_x=None, batch_y=None, mode="partial_dense"):
+        """ Support points ``x`` within ``radius`` of each query point ``y``, closest first.
+
+        Parameters
+        ----------
+        mode: str, optional
+            Layout of the output
+
+            - ``partial_dense``: ``(idx, dist)`` as returned by ``torch_points_kernels.ball_query``, [N_y, K]
+              indices in x and squared distances, both -1 for missing neighbours
+            - ``dense``: x is [B, N, 3] and y is [B, M, 3], ``(idx, dist)`` are [B, M, K] indices within each
+              batch element, missing neighbours are filled with the first neighbour (0 if there is none)
+            - ``message_passing``: [2, E] (y index, x index) pairs as returned by ``torch_cluster.radius``
+        """
+        if mode == ConvolutionFormat.DENSE.value:
+            return self._radius_dense(x, y, radius, max_num_neighbors)
+        idx, dist = self._radius(x, y, radius, max_num_neighbors, batch_x, batch_y)
+        if mode == ConvolutionFormat.MESSAGE_PASSING.value:
+            return to_message_passing(idx)
+        return idx, dist
+
+    def knn(self, x, y, k, batch_x=None, batch_y=None, mode="message_passing"):
+        """ ``k`` closest support points ``x`` of each query point ``y``, closest first.
+        ``message_passing`` returns the layout of ``torch_cluster.knn``, ``partial_dense`` returns ``(idx, dist)``
+        as :meth:`radius`
+        """
+        idx, dist = self._knn(x, y, k, batch_x, batch_y)
+        if mode == ConvolutionFormat.MESSAGE_PASSING.value:
+            return to_message_passing(idx)
+        return idx, dist
+
+    def _radius(self, x, y, radius, max_num_neighbors, batch_x, batch_y):
+        r2 = radius ** 2
+
+        def query(grid, queries, start, end, out_idx, out_dist):
+            _radius_query(
+                queries,
+                start,
+                end,
+                grid.voxel_size,
+                r2,
+                grid.sorted_pos,
+                grid.order,
+                grid.table_keys,
+                grid.table_start,
+                grid.table_end,
+                out_idx,
+                out_dist,
+            )
+
+        ptr_x, ptr_y = _batch_ptr(batch_x, x.shape[0]), _batch_ptr(batch_y, y.shape[0])
+        return self._search(x, y, ptr_x, ptr_y, max_num_neighbors, query, lambda pos: float(radius))
+
+    def _radius_dense(self, x, y, radius, max_num_neighbors):
+        num_batches, num_x, num_y = x.shape[0], x.shape[1], y.shape[1]
+        batch_x = torch.arange(num_batches).repeat_interleave(num_x)
+        batch_y = torch.arange(num_batches).repeat_interleave(num_y)
+        idx, dist = self._radius(x.reshape(-1, 3), y.reshape(-1, 3), radius, max_num_neighbors, batch_x, batch_y)
+        idx = torch.where(idx >= 0, idx - batch_y.view(-1, 1) * num_x, idx)
+        idx, dist = to_dense(idx, dist)
+        return idx.view(num_batches, num_y, -1), dist.view(num_batches, num_y, -1)
+
+    def _knn(self, x, y, k, batch_x, batch_y):
+        def voxel_size(pos):
+            # Voxels holding about k points
+            if pos.shape[0] == 0:
+                return 1.0
+            extent = pos.max(0) - pos.min(0)
+            extent = np.maximum(extent, max(extent.max(), 1e-6) / 100.0)  # flat clouds
+            return float(max((np.prod(extent) * k / pos.shape[0]) ** (1 / 3.0), extent.max() / 2 ** 20))
+
+        def query(grid, queries, start, end, out_idx, out_dist):
+            _knn_query(
+                queries,
+                start,
+                end,
+                grid.voxel_size,
+                grid.low,
+                grid.high,
+                grid.sorted_pos,
+                grid.order,
+                grid.table_keys,
+                grid.table_start,
+                grid.table_end,
+                out_idx,
+                out_dist,
+            )
+
+        ptr_x, ptr_y = _batch_ptr(batch_x, x.shape[0]), _batch_ptr(batch_y, y.shape[0])
+        return self._search(x, y, ptr_x, ptr_y, k, query, voxel_size)
+
+    def __repr__(self):
+        return "{}(num_threads={}, chunk_size={})".format(self.__class__.__name__, self.num_threads, self._chunk_size)
+
+
+def to_message_passing(idx):
+    """ Converts [N_y, K] indices padded with -1 into the ``[2, E]`` (y index, x index) layout of
+    ``torch_cluster.radius`` and ``torch_cluster.knn``
+    """
+    row = torch.arange(idx.shape[0], dtype=torch.long).view(-1, 1).expand_as(idx)
+    mask = idx >= 0
+    return torch.stack([row[mask], idx[mask]], dim=0)
+
+
+def to_dense(idx, dist):
+    """ Dense layout of ``torch_points_kernels.ball_query``: missing neighbours are filled with the
+    first neighbour (0 if there is none) and a distance of -1
+    """
+    first = idx[..., :1].clamp(min=0).expand_as(idx)
+    return torch.where(idx >= 0, idx, first), dist
@@ -7,9 +7,10 @@ import torch
 import torch_geometric
 from torch_geometric.transforms import Compose, FixedPoints
 
-from src.core.data_transform import instantiate_transforms, MultiScaleTransform
-from src.core.data_transform import instantiate_filters
+from src.core.data_transform import instantiate_transforms, MultiScaleTransform, MultiScaleCache
+from src.core.data_transform import instantiate_filters, fuse_affine_transforms
 from src.datasets.batch import SimpleBatch
+from src.datasets.dataloader import PersistentDataLoader, BatchStager
 from src.datasets.multiscale_data import MultiScaleBatch
 from src.utils.enums import ConvolutionFormat
 from src.utils.config import ConvolutionFormatFactory
@@ -34,6 +35,7 @@ class BaseDataset:
         self._batch_size = None
         self.strategies = {}
         self._contains_dataset_name = False
+        self._multiscale_cache = bool(dataset_opt.get("multiscale_cache", False))
 
         self.train_sampler = None
         self.test_sampler = None
@@ -101,6 +103,9 @@ class BaseDataset:
         obj.train_transform = None
         obj.val_transform = None
         obj.inference_transform = None
+        obj.train_batch_transform = None
+        obj.test_batch_transform = None
+        obj.val_batch_transform = None
 
         for key_name in dataset_opt.keys():
             if "transform" in key_name:
@@ -112,6 +117,10 @@ class BaseDataset:
                     continue
                 setattr(obj, new_name, transform)
 
+        if dataset_opt.get("fuse_augmentations", False):
+            for name in ["train_transform", "val_transform", "test_transform"]:
+                setattr(obj, name, fuse_affine_transforms(getattr(obj, name)))
+
         inference_transform = BaseDataset.add_transform(obj.pre_transform)
         inference_transform = BaseDataset.add_transform(obj.test_transform, out=inference_transform)
         obj.inference_transform = Compose(inference_transform) if len(inference_transform) > 0 else None
@@ -146,6 +155,20 @@ class BaseDataset:
         else:
             return lambda datalist: torch_geometric.data.batch.Batch.from_data_list(datalist)
 
+    @staticmethod
+    def _apply_batch_transform(collate_function, batch_transform, is_multiscale):
+        """ Applies batch_transform (``train_batch_transforms`` for example) to the collated batches,
+        see ``src/core/data_transform/batch_transforms.py``
+        """
+        if batch_transform is None:
+            return collate_function
+        if is_multiscale:
+            raise ValueError(
+                "Batch transforms are not supported with precompute_multi_scale, "
+                "they would modify the batches after the computation of the neighbourhoods"
+            )
+        return lambda datalist: batch_transform(collate_function(datalist))
+
     @staticmethod
     def get_num_samples(batch, conv_type):
         is_dense = ConvolutionFormatFactory.check_is_dense_format(conv_type)
@@ -165,14 +188,40 @@ class BaseDataset:
             return batch[key][batch.batch == index]
 
     def create_dataloaders(
-        self, model: BaseModel, batch_size: int, shuffle: bool, num_workers: int, precompute_multi_scale: bool,
+        self,
+        model: BaseModel,
+        batch_size: int,
+        shuffle: bool,
+        num_workers: int,
+        precompute_multi_scale: bool,
+        persistent_workers: bool = False,
+        prefetch: int = 0,
+        pin_memory: bool = False,
+        device=None,
     ):
         """ Creates the data loaders. Must be called in order to complete the setup of the Dataset
+
+        Parameters
+        ----------
+        persistent_workers: bool, optional
+            Keeps the workers alive across epochs instead of starting them at each epoch
+        prefetch: int, optional
+            Number of batches staged ahead of the main loop by a background thread, 0 disables staging
+        pin_memory: bool, optional
+            Pins the staged batches before copying them to the device
+        device: optional
+            Device on which the batches are staged
         """
         conv_type = model.conv_type
         self._batch_size = batch_size
         batch_collate_function = BaseDataset._get_collate_function(conv_type, precompute_multi_scale)
-        dataloader = partial(torch.utils.data.DataLoader, collate_fn=batch_collate_function)
+        loader_class = PersistentDataLoader if persistent_workers and num_workers > 0 else torch.utils.data.DataLoader
+
+        def dataloader(dataset, batch_transform=None, **kwargs):
+            collate_function = BaseDataset._apply_batch_transform(
+                batch_collate_function, batch_transform, precompute_multi_scale
+            )
+            return loader_class(dataset, collate_fn=collate_function, **kwargs)
 
         if self.train_sampler:
             log.info(self.train_sampler)
@@ -183,12 +232,18 @@ class BaseDataset:
                 shuffle=shuffle and not self.train_sampler,
                 num_workers=num_workers,
                 sampler=self.train_sampler,
+                batch_transform=getattr(self, "train_batch_transform", None),
             )
 
         if self.test_dataset:
             self._test_loaders = [
                 dataloader(
-                    dataset, batch_size=batch_size, shuffle=False, num_workers=num_workers, sampler=self.test_sampler,
+                    dataset,
+                    batch_size=batch_size,
+                    shuffle=False,
+                    num_workers=num_workers,
+                    sampler=self.test_sampler,
+                    batch_transform=getattr(self, "test_batch_transform", None),
                 )
                 for dataset in self.test_dataset
             ]
@@ -200,11 +255,21 @@ class BaseDataset:
                 shuffle=False,
                 num_workers=num_workers,
                 sampler=self.val_sampler,
+                batch_transform=getattr(self, "val_batch_transform", None),
             )
 
         if precompute_multi_scale:
             self.set_strategies(model)
 
+        if prefetch > 0:
+            stager = partial(BatchStager, device=device, prefetch=prefetch, pin_memory=pin_memory)
+            if self.train_dataset:
+                self._train_loader = stager(self._train_loader)
+            if self.test_dataset:
+                self._test_loaders = [stager(loader) for loader in self._test_loaders]
+            if self.val_dataset:
+                self._val_loader = stager(self._val_loader)
+
     @property
     def has_val_loader(self):
         return hasattr(self, "_val_loader")
@@ -395,18 +460,33 @@ class BaseDataset:
                     attr.dataset, "transform", Compose([current_transform, transform]),
                 )
 
-    def _set_multiscale_transform(self, transform):
-        for _, attr in self.__dict__.items():
+    def _set_multiscale_transform(self, transform, eval_transform=None):
+        """ Adds the multiscale transform to all loaders, ``eval_transform`` is used
+        for the validation and test loaders if provided
+        """
+        if eval_transform is None:
+            eval_transform = transform
+
+        for key, attr in self.__dict__.items():
             if isinstance(attr, torch.utils.data.DataLoader):
-                self._set_composed_multiscale_transform(attr, transform)
+                self._set_composed_multiscale_transform(attr, transform if key == "_train_loader" else eval_transform)
 
         for loader in self._test_loaders:
-            self._set_composed_multiscale_transform(loader, transform)
+            self._set_composed_multiscale_transform(loader, eval_transform)
+
+    def _get_multiscale_cache(self, strategies):
+        """ Returns the on-disk cache used for precomputing the multiscale structures of the
+        validation and test sets, None if the cache is not activated (``multiscale_cache`` option)
+        """
+        if not self._multiscale_cache:
+            return None
+        return MultiScaleCache(os.path.join(self._data_path, "multiscale_cache"), strategies)
 
     def set_strategies(self, model):
         strategies = model.get_spatial_ops()
         transform = MultiScaleTransform(strategies)
-        self._set_multiscale_transform(transform)
+        eval_transform = MultiScaleTransform(strategies, cache=self._get_multiscale_cache(strategies))
+        self._set_multiscale_transform(transform, eval_transform)
 
     @staticmethod
     @abstractmethod
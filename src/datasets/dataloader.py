@@ -0,0 +1,182 @@
+import time
+import queue
+import threading
+import logging
+import torch
+from torch.utils.data import DataLoader
+
+log = logging.getLogger(__name__)
+
+
+class RepeatSampler:
+    """ Batch sampler that iterates over ``batch_sampler`` forever, the length is the one of a single pass.
+    A new pass calls ``iter(batch_sampler)`` again so that shuffling happens at each epoch
+    """
+
+    def __init__(self, batch_sampler):
+        self.batch_sampler = batch_sampler
+
+    def __iter__(self):
+        while True:
+            for batch in self.batch_sampler:
+                yield batch
+
+    def __len__(self):
+        return len(self.batch_sampler)
+
+
+class PersistentDataLoader(DataLoader):
+    """ DataLoader whose workers are started once and stay alive across epochs.
+    The batch sampler is repeated forever and each call to ``__iter__`` yields one epoch worth of batches
+    from a single underlying iterator. If an epoch is interrupted, the remaining batches are consumed at the
+    beginning of the next one so that epochs always start on a fresh pass over the sampler.
+
+    Workers hold their own copy of the dataset, changes made to the dataset (e.g. its transform) after
+    the first iteration are not seen by the workers.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # batch_sampler cannot be set through DataLoader.__setattr__ once the loader is initialized
+        object.__setattr__(self, "batch_sampler", RepeatSampler(self.batch_sampler))
+        self._persistent_iterator = None
+        self._remaining = 0
+
+    def __iter__(self):
+        if self._persistent_iterator is None:
+            self._persistent_iterator = super().__iter__()
+        for _ in range(self._remaining):
+            next(self._persistent_iterator)
+        self._remaining = len(self)
+        for _ in range(len(self)):
+            batch = next(self._persistent_iterator)
+            self._remaining -= 1
+            yield batch
+
+
+def apply_to_tensors(batch, func):
+    """ Applies ``func`` to all tensors of a batch, the batch can be a tensor, a ``Data`` object
+    (``MultiScaleData`` included) or a list, tuple or dict of those
+    """
+    if torch.is_tensor(batch):
+        return func(batch)
+    if hasattr(batch, "apply"):
+        return batch.apply(func)
+    if isinstance(batch, (list, tuple)):
+        return type(batch)(apply_to_tensors(b, func) for b in batch)
+    if isinstance(batch, dict):
+        return {key: apply_to_tensors(value, func) for key, value in batch.items()}
+    return batch
+
+
+class _ExceptionWrapper:
+    def __init__(self, exception):
+        self.exception = exception
+
+
+_END = object()
+
+
+class BatchStager:
+    """ Iterates over a data loader while a background thread stages the next ``prefetch`` batches.
+    Staging pins the batch (``pin_memory``) and copies it to ``device``, on a separate cuda stream when the
+    device is a gpu. ``model.set_input(data, device)`` then finds its tensors already on the device and the
+    copy overlaps with the computations of the previous iteration.
+
+    ``wait_time`` is the time spent by the main loop waiting for a batch during the current epoch,
+    ``last_wait_time`` is the wait for the last batch.
+    """
+
+    def __init__(self, loader, device=None, prefetch=2, pin_memory=False):
+        self.loader = loader
+        self.device = torch.device(device) if device is not None else None
+        self.prefetch = max(1, prefetch)
+        self.pin_memory = pin_memory and torch.cuda.is_available()
+        self.wait_time = 0.0
+        self.last_wait_time = 0.0
+
+    @property
+    def dataset(self):
+        return self.loader.dataset
+
+    def __len__(self):
+        return len(self.loader)
+
+    def __getattr__(self, name):
+        if name == "loader":
+            raise AttributeError(name)
+        return getattr(self.loader, name)
+
+    @property
+    def _use_stream(self):
+        return self.device is not None and self.device.type == "cuda"
+
+    def _stage(self, batch, stream):
+        if self.pin_memory:
+            batch = apply_to_tensors(batch, lambda x: x.pin_memory())
+        if self.device is None:
+            return batch, None
+        if stream is None:
+            return apply_to_tensors(batch, lambda x: x.to(self.device)), None
+        with torch.cuda.stream(stream):
+            batch = apply_to_tensors(batch, lambda x: x.to(self.device, non_blocking=True))
+        event = torch.cuda.Event()
+        event.record(stream)
+        return batch, event
+
+    @staticmethod
+    def _put(out, stop, item):
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self, out, stop):
+        try:
+            stream = torch.cuda.Stream(self.device) if self._use_stream else None
+            for batch in self.loader:
+                if not self._put(out, stop, self._stage(batch, stream)):
+                    return
+            self._put(out, stop, _END)
+        except Exception as e:
+            self._put(out, stop, _ExceptionWrapper(e))
+
+    def __iter__(self):
+        self.wait_time = 0.0
+        out = queue.Queue(self.prefetch)
+        stop = threading.Event()
+        thread = threading.Thread(target=self._run, args=(out, stop), name="batch_stager", daemon=True)
+        thread.start()
+        try:
+            while True:
+                start = time.time()
+                item = out.get()
+                self.last_wait_time = time.time() - start
+                self.wait_time += self.last_wait_time
+                if item is _END:
+                    break
+                if isinstance(item, _ExceptionWrapper):
+                    raise item.exception
+                batch, event = item
+                if event is not None:
+                    current_stream = torch.cuda.current_stream(self.device)
+                    current_stream.wait_event(event)
+                    # the memory of the batch was allocated on the staging stream
+                    batch = apply_to_tensors(batch, lambda x: _record_stream(x, current_stream))
+                yield batch
+        finally:
+            stop.set()
+            thread.join()
+
+    def __repr__(self):
+        return "{}(device={}, prefetch={}, pin_memory={})".format(
+            self.__class__.__name__, self.device, self.prefetch, self.pin_memory
+        )
+
+
+def _record_stream(tensor, stream):
+    tensor.record_stream(stream)
+    return tensor
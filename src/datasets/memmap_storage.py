@@ -0,0 +1,105 @@
+import os
+import logging
+import numpy as np
+import torch
+
+log = logging.getLogger(__name__)
+
+MEMMAP_FORMAT = "memmap_columns"
+
+
+def _columns_dir(path):
+    return "{}.columns".format(path)
+
+
+def _column_path(path, key):
+    return os.path.join(_columns_dir(path), "{}.npy".format(key))
+
+
+def is_memmap_storage(content):
+    return isinstance(content, dict) and content.get("format") == MEMMAP_FORMAT
+
+
+def save_collated(collated, path, memmap=False):
+    """ Saves the output of ``InMemoryDataset.collate`` to ``path``.
+
+    When ``memmap`` is True, each tensor attribute of the collated data is written as a flat
+    ``.npy`` column in ``{path}.columns`` and ``path`` only contains a small index made of the slices
+    (offsets table) and of the non tensor attributes. Such columns are loaded memory mapped by
+    :func:`load_collated` and shared through the page cache between all DataLoader workers.
+
+    Parameters
+    ----------
+    collated: Tuple[Data, Dict[str, torch.Tensor]]
+        data and slices as returned by ``InMemoryDataset.collate``
+    path: str
+        Path of the processed file
+    memmap: bool, optional
+        Use the memory mapped columnar storage
+    """
+    if not memmap:
+        torch.save(collated, path)
+        return
+
+    data, slices = collated
+    columns_dir = _columns_dir(path)
+    os.makedirs(columns_dir, exist_ok=True)
+    data = data.__class__.from_dict({key: item for key, item in data})
+    columns = []
+    for key in data.keys:
+        item = data[key]
+        if torch.is_tensor(item) and item.numel() > 0:
+            np.save(_column_path(path, key), item.numpy())
+            columns.append(key)
+            data[key] = None
+    if hasattr(collated[0], "__num_nodes__"):
+        data.__num_nodes__ = collated[0].__num_nodes__
+    torch.save({"format": MEMMAP_FORMAT, "data": data, "slices": slices, "columns": columns}, path)
+
+
+def load_collated(path, memmap=False):
+    """ Loads data and slices saved with :func:`save_collated`. Both storage formats are supported whatever
+    the value of ``memmap``. If ``memmap`` is True and the file has been saved in the legacy format,
+    it is converted in place to the memory mapped format first so that the dataset does not have to be processed again.
+
+    Returns
+    -------
+    data: Data
+        Collated data, tensors of memory mapped columns are backed by copy-on-write mappings,
+        ``InMemoryDataset.get`` therefore returns zero copy slices of the files
+    slices: Dict[str, torch.Tensor]
+    """
+    content = torch.load(path)
+    if not is_memmap_storage(content):
+        if not memmap:
+            return content
+        log.info("Converting {} to memory mapped columns".format(path))
+        save_collated(content, path, memmap=True)
+        del content
+        content = torch.load(path)
+
+    data = content["data"]
+    for key in content["columns"]:
+        # copy-on-write mapping, in place transforms don't modify the file on disk
+        data[key] = torch.from_numpy(np.load(_column_path(path, key), mmap_mode="c"))
+    return data, content["slices"]
+
+
+def concat_collated(collated_list):
+    """ Concatenates several outputs of ``InMemoryDataset.collate``, the result is the collate of the
+    concatenation of the data lists without going through the individual data objects.
+    """
+    datas = [data for data, _ in collated_list]
+    data = datas[0].__class__()
+    slices = {}
+    for key in datas[0].keys:
+        item = datas[0][key]
+        data[key] = torch.cat([d[key] for d in datas], dim=datas[0].__cat_dim__(key, item))
+        parts, offset = [collated_list[0][1][key][:1]], 0
+        for _, s in collated_list:
+            parts.append(s[key][1:] + offset)
+            offset += int(s[key][-1])
+        slices[key] = torch.cat(parts)
+    if all(hasattr(d, "__num_nodes__") for d in datas):
+        data.__num_nodes__ = [n for d in datas for n in d.__num_nodes__]
+    return data, slices
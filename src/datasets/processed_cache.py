@@ -0,0 +1,77 @@
+import os
+import os.path as osp
+import hashlib
+import logging
+import torch
+
+from src.core.data_transform.multiscale_cache import describe_spatial_op
+from src.utils.file_utils import atomic_write
+
+log = logging.getLogger(__name__)
+
+
+def config_signature(config):
+    """ Short hash of a configuration made of transforms, filters and plain parameters,
+    see :func:`src.core.data_transform.multiscale_cache.describe_spatial_op`
+    """
+    return hashlib.sha1(describe_spatial_op(config).encode()).hexdigest()[:12]
+
+
+class ProcessedCacheMixin:
+    """ Content addressed processed data for ``InMemoryDataset``. To be placed before ``InMemoryDataset`` in
+    the bases of a dataset.
+
+    Processed files are stored in ``{root}/processed/v{PROCESSED_VERSION}_{signature}`` where the signature is a
+    hash of the ``pre_transform``, ``pre_filter`` and ``pre_collate_transform`` and of the parameters returned
+    by :meth:`processed_params`. Changing any of them processes the dataset in a new folder instead of silently
+    reusing stale data, previous variants are kept and used again when their configuration comes back.
+    ``PROCESSED_VERSION`` should be increased when the processing code changes.
+
+    The results of the parsing of the raw files, which do not depend on the pre transforms, are shared by all the
+    variants in :attr:`raw_cache_dir`, see :meth:`raw_cache_path` and :func:`save_raw_cache`.
+    """
+
+    PROCESSED_VERSION = 1
+
+    def processed_params(self):
+        """ Parameters of the dataset that change the processed data
+        """
+        return {}
+
+    @property
+    def processed_signature(self):
+        # Computed once, transforms may hold some state once they have been used
+        if getattr(self, "_processed_signature", None) is None:
+            config = {
+                "pre_transform": self.pre_transform,
+                "pre_filter": self.pre_filter,
+                "pre_collate_transform": getattr(self, "pre_collate_transform", None),
+                "params": self.processed_params(),
+            }
+            self._processed_signature = config_signature(config)
+        return self._processed_signature
+
+    @property
+    def processed_dir(self):
+        return osp.join(self.root, "processed", "v{}_{}".format(self.PROCESSED_VERSION, self.processed_signature))
+
+    @processed_dir.setter
+    def processed_dir(self, value):
+        # Assigned by Dataset.__init__, the processed folder always depends on the signature
+        pass
+
+    @property
+    def raw_cache_dir(self):
+        return osp.join(self.root, "processed", "raw_cache")
+
+    def raw_cache_path(self, name, params=None):
+        """ Path of the raw cache entry ``name`` parsed with the parameters ``params``
+        """
+        return osp.join(self.raw_cache_dir, config_signature(params or {}), "{}.pt".format(name))
+
+
+def save_raw_cache(content, path):
+    """ Saves a raw cache entry, concurrent processes never read a partial entry
+    """
+    os.makedirs(osp.dirname(path), exist_ok=True)
+    atomic_write(path, lambda f: torch.save(content, f))
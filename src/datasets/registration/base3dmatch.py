@@ -12,7 +12,7 @@ from torch_geometric.data import Data
 from src.datasets.registration.detector import RandomDetector
 from src.datasets.registration.utils import rgbd2fragment_rough
 from src.datasets.registration.utils import rgbd2fragment_fine
-from src.datasets.registration.utils import compute_overlap_and_matches
+from src.datasets.registration.matching import FragmentMatcher
 from src.datasets.registration.utils import to_list
 from src.datasets.registration.utils import files_exist
 from src.datasets.registration.utils import makedirs
@@ -53,7 +53,8 @@ class Base3DMatch(Dataset):
                  num_random_pt=5000,
                  is_offline=False,
                  radius_patch=None,
-                 pre_transform_patch=None):
+                 pre_transform_patch=None,
+                 process_workers=1):
         r"""
         the Princeton 3DMatch dataset from the
         `"3DMatch: Learning Local Geometric Descriptors from RGB-D Reconstructions"
@@ -93,6 +94,9 @@ class Base3DMatch(Dataset):
                 :obj:`torch_geometric.data.Data` object and returns a boolean
                 value, indicating whether the data object should be included in the
                 final dataset. (default: :obj:`None`)
+
+            process_workers (int, optional): number of processes used to
+                compute the matches between fragments. (default: :obj:`1`)
         """
 
         self.verbose = verbose
@@ -115,6 +119,7 @@ class Base3DMatch(Dataset):
         self.num_random_pt = num_random_pt
         self.radius_patch = radius_patch
         self.pre_transform_patch = pre_transform_patch
+        self.process_workers = process_workers
         if mode not in self.dict_urls.keys():
             raise RuntimeError('this mode {} does '
                                'not exist'
@@ -236,14 +241,27 @@ class Base3DMatch(Dataset):
                     torch.save(data, osp.join(out_dir, path))
 
     def _compute_matches_between_fragments(self, mod):
-
+        """
+        compute the matches between all the pairs of fragments of each sequence.
+        The pairs already processed are stored in a checkpoint file,
+        an interrupted run restarts where it stopped.
+        """
         out_dir = osp.join(self.processed_dir,
                            mod, 'matches')
-        if files_exist([out_dir]):  # pragma: no cover
+        checkpoint_path = osp.join(self.processed_dir,
+                                   mod, 'matches_checkpoint.jsonl')
+        if files_exist([out_dir]) and not files_exist([checkpoint_path]):  # pragma: no cover
             return
+        open(checkpoint_path, 'a').close()
         makedirs(out_dir)
 
-        for scene_path in os.listdir(osp.join(self.raw_dir, mod)):
+        matcher = FragmentMatcher(out_dir, checkpoint_path,
+                                  max_dist_overlap=self.max_dist_overlap,
+                                  min_overlap_ratio=self.min_overlap_ratio,
+                                  max_overlap_ratio=self.max_overlap_ratio,
+                                  num_workers=self.process_workers,
+                                  verbose=self.verbose)
+        for scene_path in sorted(os.listdir(osp.join(self.raw_dir, mod))):
 
             list_seq = sorted([f for f in os.listdir(osp.join(self.raw_dir, mod,
                                                               scene_path)) if 'seq' in f])
@@ -256,23 +274,8 @@ class Base3DMatch(Dataset):
                                              for f in os.listdir(fragment_dir)
                                              if 'fragment' in f])
                 log.info("compute_overlap_and_matches")
-                ind = 0
-                for path1 in list_fragment_path:
-                    for path2 in list_fragment_path:
-                        if path1 < path2:
-                            out_path = osp.join(out_dir,
-                                                'matches{:06d}.npy'.format(ind))
-
-                            match = compute_overlap_and_matches(
-                                path1, path2, self.max_dist_overlap)
-                            if(self.verbose):
-                                log.info(match['path_source'],
-                                         match['path_target'],
-                                         'overlap={}'.format(match['overlap']))
-                            if(np.max(match['overlap']) > self.min_overlap_ratio and
-                               np.max(match['overlap']) < self.max_overlap_ratio):
-                                np.save(out_path, match)
-                                ind += 1
+                matcher(osp.join(scene_path, seq), list_fragment_path)
+        os.remove(checkpoint_path)
 
     def _save_patches(self, mod):
         """
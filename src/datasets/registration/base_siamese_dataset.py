@@ -36,4 +36,5 @@ class BaseSiameseDataset(BaseDataset):
     def set_strategies(self, model):
         strategies = model.get_spatial_ops()
         transform = PairTransform(MultiScaleTransform(strategies))
-        self._set_multiscale_transform(transform)
+        eval_transform = PairTransform(MultiScaleTransform(strategies, cache=self._get_multiscale_cache(strategies)))
+        self._set_multiscale_transform(transform, eval_transform)
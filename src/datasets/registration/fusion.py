@@ -312,6 +312,256 @@ class TSDFVolume:
         return pcd
 
 
+class SparseTSDFVolume:
+    """Volumetric TSDF Fusion of RGB-D Images on the CPU, stored in a sparse
+    set of voxel blocks.
+
+    Only the blocks of block_size^3 voxels that can be within the truncation
+    band of an observed depth are allocated, everything else implicitly has a
+    TSDF of 1 (the initial value of the dense volume, that free space
+    observations keep unchanged). Blocks are indexed by an integer key of their
+    coordinates.
+
+    Frames are integrated lazily, when the volume is queried, so that every
+    block integrates all the frames in order, even those observed before it was
+    allocated. For tsdf_thresh <= 1, get_point_cloud and get_mesh give the same
+    outputs as TSDFVolume in CPU mode. Weights are only tracked in allocated
+    blocks.
+    """
+    def __init__(self, vol_bnds, voxel_size, block_size=8, max_voxels_per_batch=2 ** 21):
+        """Constructor.
+        Args:
+        vol_bnds (ndarray): An ndarray of shape (3, 2). Specifies the
+        xyz bounds (min/max) in meters.
+        voxel_size (float): The volume discretization in meters.
+        block_size (int): Number of voxels along each side of a block.
+        max_voxels_per_batch (int): Number of voxels integrated at once.
+        """
+        vol_bnds = np.asarray(vol_bnds)
+        assert vol_bnds.shape == (3, 2), "[!] `vol_bnds` should be of shape (3, 2)."
+
+        # Define voxel volume parameters, identical to TSDFVolume
+        self._vol_bnds = vol_bnds
+        self._voxel_size = float(voxel_size)
+        self._trunc_margin = 5 * self._voxel_size  # truncation on SDF
+        self._vol_dim = np.ceil(
+            (self._vol_bnds[:, 1] - self._vol_bnds[:, 0]) /
+            self._voxel_size).copy(order='C').astype(int)
+        self._vol_bnds[:, 1] = self._vol_bnds[:, 0]+self._vol_dim*self._voxel_size
+        self._vol_origin = self._vol_bnds[:, 0].copy(order='C').astype(np.float32)
+
+        self._block_size = int(block_size)
+        self._grid_dim = np.ceil(self._vol_dim / self._block_size).astype(np.int64)
+        self._max_blocks_per_batch = max(1, max_voxels_per_batch // self._block_size ** 3)
+        local = np.meshgrid(*[range(self._block_size)] * 3, indexing='ij')
+        self._local_coords = np.stack([c.reshape(-1) for c in local], axis=1)
+
+        self._block_keys = np.zeros(0, dtype=np.int64)
+        self._block_coords = np.zeros((0, 3), dtype=np.int64)
+        self._tsdf_blocks = np.zeros((0, self._block_size ** 3), dtype=np.float32)
+        self._weight_blocks = np.zeros((0, self._block_size ** 3), dtype=np.float32)
+        # number of frames each block has integrated
+        self._num_integrated = np.zeros(0, dtype=np.int64)
+        self._frames = []
+
+    @property
+    def num_blocks(self):
+        return len(self._block_keys)
+
+    def _find_blocks(self, depth_im, cam_intr, cam_pose):
+        """Keys of the blocks that contain a voxel that can be within the
+        truncation band of depth_im.
+        A voxel updated with a TSDF < 1 projects on a pixel (u, v) (rounded
+        projection) and lies within trunc_margin of its depth along the
+        camera axis, its distance to the back projection of the pixel is
+        therefore bounded.
+        """
+        pix_y, pix_x = np.nonzero(depth_im > 0)
+        if len(pix_x) == 0:
+            return np.zeros(0, dtype=np.int64)
+        depth = depth_im[pix_y, pix_x]
+        fx, fy = cam_intr[0, 0], cam_intr[1, 1]
+        cx, cy = cam_intr[0, 2], cam_intr[1, 2]
+        cam_pts = np.stack([(pix_x - cx) * depth / fx, (pix_y - cy) * depth / fy, depth], axis=1)
+        world_pts = rigid_transform(cam_pts, cam_pose)
+
+        trunc = self._trunc_margin
+        max_z = depth + trunc
+        err_x = 0.5 * max_z / abs(fx) + np.abs(pix_x - cx) / abs(fx) * trunc
+        err_y = 0.5 * max_z / abs(fy) + np.abs(pix_y - cy) / abs(fy) * trunc
+        # one voxel of margin for the float32 rounding of the dense implementation
+        radius = np.sqrt(trunc ** 2 + err_x ** 2 + err_y ** 2) + self._voxel_size
+
+        center = (world_pts - self._vol_origin) / self._voxel_size
+        radius = radius[:, None] / self._voxel_size
+        block_min = np.floor(np.ceil(center - radius) / self._block_size).astype(np.int64)
+        block_max = np.floor(np.floor(center + radius) / self._block_size).astype(np.int64)
+        block_min = np.maximum(block_min, 0)
+        block_max = np.minimum(block_max, self._grid_dim - 1)
+        valid = np.all(block_min <= block_max, axis=1)
+        block_min, block_max = block_min[valid], block_max[valid]
+
+        keys = []
+        span = int((block_max - block_min).max()) + 1 if len(block_min) else 0
+        for dx in range(span):
+            for dy in range(span):
+                for dz in range(span):
+                    coords = block_min + np.array([dx, dy, dz])
+                    mask = np.all(coords <= block_max, axis=1)
+                    keys.append(self._coords_to_keys(coords[mask]))
+        if len(keys) == 0:
+            return np.zeros(0, dtype=np.int64)
+        return np.unique(np.concatenate(keys))
+
+    def _coords_to_keys(self, coords):
+        return (coords[:, 0] * self._grid_dim[1] + coords[:, 1]) * self._grid_dim[2] + coords[:, 2]
+
+    def _keys_to_coords(self, keys):
+        z = keys % self._grid_dim[2]
+        y = (keys // self._grid_dim[2]) % self._grid_dim[1]
+        x = keys // (self._grid_dim[2] * self._grid_dim[1])
+        return np.stack([x, y, z], axis=1)
+
+    def _allocate(self, keys):
+        new_keys = keys[np.logical_not(np.isin(keys, self._block_keys))]
+        if len(new_keys) == 0:
+            return
+        n_new = len(new_keys)
+        n_voxels = self._block_size ** 3
+        self._block_keys = np.concatenate([self._block_keys, new_keys])
+        self._block_coords = np.concatenate([self._block_coords, self._keys_to_coords(new_keys)])
+        self._tsdf_blocks = np.concatenate([self._tsdf_blocks, np.ones((n_new, n_voxels), dtype=np.float32)])
+        self._weight_blocks = np.concatenate([self._weight_blocks, np.zeros((n_new, n_voxels), dtype=np.float32)])
+        self._num_integrated = np.concatenate([self._num_integrated, np.zeros(n_new, dtype=np.int64)])
+
+    def integrate(self, depth_im, cam_intr, cam_pose, obs_weight=1.):
+        """Integrate an RGB-D frame into the TSDF volume.
+        Args:
+        depth_im (ndarray): A depth image of shape (H, W).
+        cam_intr (ndarray): The camera intrinsics matrix of shape (3, 3).
+        cam_pose (ndarray): The camera pose (i.e. extrinsics) of shape (4, 4).
+        obs_weight (float): The weight to assign for the current observation. A higher
+        value
+        """
+        self._frames.append((depth_im, cam_intr, cam_pose, obs_weight))
+        self._allocate(self._find_blocks(depth_im, cam_intr, cam_pose))
+
+    def _integrate_blocks(self, block_ind, depth_im, cam_intr, cam_pose, obs_weight):
+        """Same computation as the CPU mode of TSDFVolume.integrate restricted
+        to the voxels of the blocks block_ind.
+        """
+        im_h, im_w = depth_im.shape
+        vox_coords = (self._block_coords[block_ind][:, None, :] * self._block_size
+                      + self._local_coords[None, :, :]).reshape(-1, 3)
+        in_volume = np.all(vox_coords < self._vol_dim, axis=1)
+
+        cam_pts = TSDFVolume.vox2world(self._vol_origin, vox_coords, self._voxel_size)
+        cam_pts = rigid_transform(cam_pts, np.linalg.inv(cam_pose))
+        pix_z = cam_pts[:, 2]
+        pix = TSDFVolume.cam2pix(cam_pts, cam_intr)
+        pix_x, pix_y = pix[:, 0], pix[:, 1]
+
+        # Eliminate pixels outside view frustum
+        valid_pix = np.logical_and(
+            pix_x >= 0,
+            np.logical_and(pix_x < im_w,
+                           np.logical_and(pix_y >= 0,
+                                          np.logical_and(pix_y < im_h,
+                                                         pix_z > 0))))
+        depth_val = np.zeros(pix_x.shape)
+        depth_val[valid_pix] = depth_im[pix_y[valid_pix], pix_x[valid_pix]]
+
+        # Integrate TSDF
+        depth_diff = depth_val - pix_z
+        valid_pts = np.logical_and(np.logical_and(depth_val > 0, depth_diff >= -self._trunc_margin), in_volume)
+        dist = np.minimum(1, depth_diff / self._trunc_margin)
+        tsdf_vol = self._tsdf_blocks[block_ind].reshape(-1)
+        weight_vol = self._weight_blocks[block_ind].reshape(-1)
+        tsdf_vol_new, w_new = TSDFVolume.integrate_tsdf(
+            tsdf_vol[valid_pts], dist[valid_pts], weight_vol[valid_pts], obs_weight)
+        tsdf_vol[valid_pts] = tsdf_vol_new
+        weight_vol[valid_pts] = w_new
+        self._tsdf_blocks[block_ind] = tsdf_vol.reshape(len(block_ind), -1)
+        self._weight_blocks[block_ind] = weight_vol.reshape(len(block_ind), -1)
+
+    def _update(self):
+        """Integrates the frames that have not been integrated yet by each block
+        """
+        for i, frame in enumerate(self._frames):
+            todo = np.nonzero(self._num_integrated <= i)[0]
+            for start in range(0, len(todo), self._max_blocks_per_batch):
+                self._integrate_blocks(todo[start:start + self._max_blocks_per_batch], *frame)
+        self._num_integrated[:] = len(self._frames)
+
+    def _get_voxels(self):
+        """Linear index in the dense volume, TSDF and weight of the allocated voxels
+        that are inside the volume, sorted by linear index.
+        """
+        self._update()
+        vox_coords = (self._block_coords[:, None, :] * self._block_size
+                      + self._local_coords[None, :, :]).reshape(-1, 3)
+        in_volume = np.all(vox_coords < self._vol_dim, axis=1)
+        vox_coords = vox_coords[in_volume]
+        linear = (vox_coords[:, 0] * self._vol_dim[1] + vox_coords[:, 1]) * self._vol_dim[2] + vox_coords[:, 2]
+        order = np.argsort(linear)
+        tsdf = self._tsdf_blocks.reshape(-1)[in_volume][order]
+        weight = self._weight_blocks.reshape(-1)[in_volume][order]
+        return vox_coords[order], tsdf, weight
+
+    def get_volume(self):
+        """Dense TSDF and weight volumes, weights are zeros outside of the allocated blocks
+        """
+        vox_coords, tsdf, weight = self._get_voxels()
+        tsdf_vol = np.ones(self._vol_dim, dtype=np.float32)
+        weight_vol = np.zeros(self._vol_dim, dtype=np.float32)
+        tsdf_vol[vox_coords[:, 0], vox_coords[:, 1], vox_coords[:, 2]] = tsdf
+        weight_vol[vox_coords[:, 0], vox_coords[:, 1], vox_coords[:, 2]] = weight
+        return tsdf_vol, weight_vol
+
+    def get_mesh(self):
+        """Compute a mesh from the voxel volume using marching cubes.
+        Marching cubes runs on the bounding box of the allocated blocks with a
+        margin of two voxels of free space, so that vertices and normals are the
+        same as on the full volume.
+        """
+        vox_coords, tsdf, _ = self._get_voxels()
+        if len(vox_coords) == 0:
+            # same as marching cubes on a constant volume
+            raise ValueError("Surface level must be within volume data range.")
+        box_min = np.maximum(vox_coords.min(0) - 2, 0)
+        box_max = np.minimum(vox_coords.max(0) + 3, self._vol_dim)
+        tsdf_vol = np.ones(box_max - box_min, dtype=np.float32)
+        local = vox_coords - box_min
+        tsdf_vol[local[:, 0], local[:, 1], local[:, 2]] = tsdf
+
+        # Marching cubes
+        verts, faces, norms, vals = measure.marching_cubes_lewiner(tsdf_vol,
+                                                                   level=0)
+
+        # voxel grid coordinates to world coordinates
+        verts = (verts + box_min)*self._voxel_size+self._vol_origin
+        return verts, faces, norms
+
+    def get_point_cloud(self, tsdf_thresh, weight_thresh):
+        """
+        compute the surface pointcloud from the voxel volume
+        """
+        vox_coords, tsdf, weight = self._get_voxels()
+        mask = np.logical_and(np.abs(tsdf) < tsdf_thresh,
+                              weight > weight_thresh)
+        pcd = vox_coords[mask].astype(float) * self._voxel_size+self._vol_origin
+        return pcd
+
+
+def make_tsdf_volume(vol_bnds, voxel_size):
+    """TSDF volume on the GPU when pycuda is available, sparse volume on the CPU
+    otherwise.
+    """
+    if FUSION_GPU_MODE:
+        return TSDFVolume(vol_bnds, voxel_size=voxel_size)
+    return SparseTSDFVolume(vol_bnds, voxel_size=voxel_size)
+
+
 def rigid_transform(xyz, transform):
     """Applies a rigid transform to an (N, 3) pointcloud.
         """
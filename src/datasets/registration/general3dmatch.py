@@ -33,7 +33,8 @@ class Patch3DMatch(Base3DMatch):
                  debug=False,
                  num_random_pt=5000,
                  is_offline=False,
-                 pre_transform_patch=None):
+                 pre_transform_patch=None,
+                 process_workers=1):
         r"""
         Patch extracted from :the Princeton 3DMatch dataset\n
         `"3DMatch: Learning Local Geometric Descriptors from RGB-D Reconstructions"
@@ -88,6 +89,7 @@ class Patch3DMatch(Base3DMatch):
                 value, indicating whether the data object should be included in the
                 final dataset. (default: :obj:`None`)
             num_random_pt: number of point we select
+            process_workers: number of processes used to compute the matches between fragments
         """
 
         super(Patch3DMatch, self).__init__(root,
@@ -108,7 +110,8 @@ class Patch3DMatch(Base3DMatch):
                                            num_random_pt,
                                            is_offline,
                                            radius_patch,
-                                           pre_transform_patch)
+                                           pre_transform_patch,
+                                           process_workers=process_workers)
 
         self.radius_patch = radius_patch
         self.is_offline = is_offline
@@ -234,7 +237,8 @@ class Fragment3DMatch(Base3DMatch):
                  pre_transform_fragment=None,
                  pre_filter=None,
                  verbose=False,
-                 debug=False):
+                 debug=False,
+                 process_workers=1):
         super(Fragment3DMatch, self).__init__(root,
                                               num_frame_per_fragment,
                                               mode,
@@ -249,7 +253,8 @@ class Fragment3DMatch(Base3DMatch):
                                               pre_transform,
                                               pre_filter,
                                               verbose,
-                                              debug)
+                                              debug,
+                                              process_workers=process_workers)
 
     def get_fragment(self, idx):
 
@@ -285,6 +290,7 @@ class General3DMatchDataset(BaseSiameseDataset):
         test_transform = self.test_transform
         pre_filter = self.pre_filter
         test_pre_filter = self.test_pre_filter
+        process_workers = dataset_opt.get('process_workers', 1)
 
         if dataset_opt.is_patch:
             self.train_dataset = Patch3DMatch(
@@ -301,7 +307,8 @@ class General3DMatchDataset(BaseSiameseDataset):
                 transform=train_transform,
                 num_random_pt=dataset_opt.num_random_pt,
                 is_offline=dataset_opt.is_offline,
-                pre_filter=pre_filter)
+                pre_filter=pre_filter,
+                process_workers=process_workers)
 
             self.test_dataset = Patch3DMatch(
                 root=self._data_path,
@@ -317,7 +324,8 @@ class General3DMatchDataset(BaseSiameseDataset):
                 transform=test_transform,
                 num_random_pt=dataset_opt.num_random_pt,
                 is_offline=dataset_opt.is_offline,
-                pre_filter=test_pre_filter)
+                pre_filter=test_pre_filter,
+                process_workers=process_workers)
         else:
             self.train_dataset = Fragment3DMatch(
                 root=self._data_path,
@@ -330,7 +338,8 @@ class General3DMatchDataset(BaseSiameseDataset):
                 depth_thresh=dataset_opt.depth_thresh,
                 pre_transform=pre_transform,
                 transform=train_transform,
-                pre_filter=pre_filter)
+                pre_filter=pre_filter,
+                process_workers=process_workers)
 
             self.test_dataset = Fragment3DMatch(
                 root=self._data_path,
@@ -342,7 +351,8 @@ class General3DMatchDataset(BaseSiameseDataset):
                 limit_size=dataset_opt.limit_size,
                 depth_thresh=dataset_opt.depth_thresh,
                 pre_transform=pre_transform,
-                transform=test_transform)
+                transform=test_transform,
+                process_workers=process_workers)
 
     @staticmethod
     def get_tracker(model, dataset, wandb_log: bool,
@@ -0,0 +1,168 @@
+import json
+import logging
+import multiprocessing
+import os
+import os.path as osp
+import numpy as np
+import torch
+
+from src.datasets.registration.utils import compute_overlap_and_matches_from_pos
+
+log = logging.getLogger(__name__)
+
+# Positions of the fragments of the sequence being matched, shared with the pool workers
+_FRAGMENT_POS = None
+
+
+def compute_bounding_boxes(list_pos):
+    """
+    compute the axis aligned bounding box of each point cloud
+
+    Returns:
+        np.ndarray of shape [num_fragments, 2, 3] (min and max corners)
+    """
+    bboxes = np.zeros((len(list_pos), 2, 3))
+    for i, pos in enumerate(list_pos):
+        pos = np.asarray(pos)
+        if len(pos) == 0:  # empty box, it never intersects
+            bboxes[i, 0], bboxes[i, 1] = np.inf, -np.inf
+            continue
+        bboxes[i, 0] = pos.min(0)
+        bboxes[i, 1] = pos.max(0)
+    return bboxes
+
+
+def get_candidate_pairs(bboxes, margin):
+    """
+    list of pairs (i, j), i < j, of fragments whose bounding boxes enlarged by margin intersect.
+    The other pairs cannot have any point closer than margin, their overlap is 0.
+    """
+    mins = bboxes[:, 0] - margin
+    maxs = bboxes[:, 1] + margin
+    intersect = np.all((mins[:, None, :] <= maxs[None, :, :]) & (mins[None, :, :] <= maxs[:, None, :]), axis=-1)
+    row, col = np.nonzero(np.triu(intersect, k=1))
+    return list(zip(row.tolist(), col.tolist()))
+
+
+class MatchCheckpoint:
+    """
+    Append only log of the pairs of fragments that have already been processed.
+    Each line is a json dict {"key": sequence, "pair": [i, j], "index": index of the saved match or None}.
+    A partially written last line (interrupted run) is ignored.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.done = {}
+        self.next_index = 0
+        if osp.exists(path):
+            with open(path, "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.done.setdefault(entry["key"], set()).add(tuple(entry["pair"]))
+                    if entry["index"] is not None:
+                        self.next_index = max(self.next_index, entry["index"] + 1)
+
+    def is_done(self, key, pair):
+        return tuple(pair) in self.done.get(key, set())
+
+    def add(self, key, pair, index=None):
+        with open(self.path, "a") as f:
+            f.write(json.dumps({"key": key, "pair": list(pair), "index": index}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.done.setdefault(key, set()).add(tuple(pair))
+        if index is not None:
+            self.next_index = max(self.next_index, index + 1)
+
+
+def _init_worker(list_pos):
+    global _FRAGMENT_POS
+    _FRAGMENT_POS = list_pos
+
+
+def _match_pair(args):
+    i, j, max_dist_overlap = args
+    return i, j, compute_overlap_and_matches_from_pos(_FRAGMENT_POS[i], _FRAGMENT_POS[j], max_dist_overlap)
+
+
+class FragmentMatcher:
+    r"""
+    compute the matches between all the pairs of fragments of a sequence.
+    Each fragment is loaded once, pairs whose bounding boxes do not intersect are pruned
+    before any point query, the remaining pairs are spread over a process pool and every processed pair
+    is recorded in a checkpoint so that an interrupted run can be resumed.
+
+    Args:
+        out_dir(string): directory where the matches{:06d}.npy files are saved
+        checkpoint_path(string): path of the checkpoint file
+        max_dist_overlap(float): max distance between two points to be considered as a match
+        min_overlap_ratio(float): matches are saved if the overlap is above this ratio
+        max_overlap_ratio(float): matches are saved if the overlap is below this ratio
+        num_workers(int, optional): number of processes, 1 means no process pool
+        verbose(bool, optional)
+    """
+
+    def __init__(
+        self,
+        out_dir,
+        checkpoint_path,
+        max_dist_overlap,
+        min_overlap_ratio,
+        max_overlap_ratio,
+        num_workers=1,
+        verbose=False,
+    ):
+        self.out_dir = out_dir
+        self.checkpoint = MatchCheckpoint(checkpoint_path)
+        self.max_dist_overlap = max_dist_overlap
+        self.min_overlap_ratio = min_overlap_ratio
+        self.max_overlap_ratio = max_overlap_ratio
+        self.num_workers = num_workers
+        self.verbose = verbose
+
+    def _is_valid(self, match):
+        overlap = np.max(match["overlap"])
+        return overlap > self.min_overlap_ratio and overlap < self.max_overlap_ratio
+
+    def _save(self, key, list_fragment_path, i, j, match):
+        index = None
+        if self._is_valid(match):
+            index = self.checkpoint.next_index
+            match.update(path_source=list_fragment_path[i], path_target=list_fragment_path[j])
+            np.save(osp.join(self.out_dir, "matches{:06d}.npy".format(index)), match)
+            if self.verbose:
+                log.info("{} {} overlap={}".format(match["path_source"], match["path_target"], match["overlap"]))
+        self.checkpoint.add(key, (i, j), index)
+
+    def __call__(self, key, list_fragment_path):
+        """
+        match all the fragments of list_fragment_path, key identifies the sequence in the checkpoint
+        """
+        list_pos = [torch.load(path).pos for path in list_fragment_path]
+        num_pairs = len(list_pos) * (len(list_pos) - 1) // 2
+        if self.min_overlap_ratio >= 0:
+            candidates = get_candidate_pairs(compute_bounding_boxes(list_pos), self.max_dist_overlap)
+        else:
+            # pairs without any overlap are valid, nothing can be pruned
+            candidates = [(i, j) for i in range(len(list_pos)) for j in range(i + 1, len(list_pos))]
+        todo = [(i, j) for i, j in candidates if not self.checkpoint.is_done(key, (i, j))]
+        log.info(
+            "{}: {} pairs, {} after bounding box pruning, {} remaining".format(
+                key, num_pairs, len(candidates), len(todo)
+            )
+        )
+        args = [(i, j, self.max_dist_overlap) for i, j in todo]
+        if self.num_workers > 1 and len(args) > 1:
+            with multiprocessing.Pool(
+                processes=self.num_workers, initializer=_init_worker, initargs=(list_pos,)
+            ) as pool:
+                for i, j, match in pool.imap_unordered(_match_pair, args):
+                    self._save(key, list_fragment_path, i, j, match)
+        else:
+            _init_worker(list_pos)
+            for arg in args:
+                self._save(key, list_fragment_path, *_match_pair(arg))
@@ -143,23 +143,26 @@ def filter_pair(pair, dist):
 def compute_overlap_and_matches(path1, path2, max_distance_overlap, reciprocity=False, num_pos=1):
     data1 = torch.load(path1)
     data2 = torch.load(path2)
+    output = compute_overlap_and_matches_from_pos(
+        data1.pos, data2.pos, max_distance_overlap, reciprocity=reciprocity, num_pos=num_pos
+    )
+    output.update(path_source=path1, path_target=path2)
+    return output
+
 
+def compute_overlap_and_matches_from_pos(pos1, pos2, max_distance_overlap, reciprocity=False, num_pos=1):
+    """
+    compute the matches and the overlap between two point clouds that are already loaded
+    """
     # we can use ball query on cpu because the points are sorted
-    # print(len(data1.pos), len(data2.pos), max_distance_overlap)
-    pair, dist = ball_query(data2.pos, data1.pos, radius=max_distance_overlap, max_num=num_pos, mode=1)
+    pair, dist = ball_query(pos2, pos1, radius=max_distance_overlap, max_num=num_pos, mode=1)
     pair = filter_pair(pair, dist)
-    overlap = [pair.shape[0] / len(data1.pos)]
+    overlap = [pair.shape[0] / len(pos1)]
     if reciprocity:
-        pair2, dist2 = ball_query(data1.pos, data2.pos, radius=max_distance_overlap, max_num=num_pos, mode=1)
+        pair2, dist2 = ball_query(pos1, pos2, radius=max_distance_overlap, max_num=num_pos, mode=1)
         pair2 = filter_pair(pair2, dist2)
-        overlap.append(pair2.shape[0] / len(data2.pos))
-    # overlap = pair.shape[0] / \
-    #    (len(data1.pos) + len(data2.pos) - pair.shape[0])
-    # print(pair)
-
-    # print(path1, path2, "overlap=", overlap)
-    output = dict(pair=pair, path_source=path1, path_target=path2, overlap=overlap)
-    return output
+        overlap.append(pair2.shape[0] / len(pos2))
+    return dict(pair=pair, overlap=overlap)
 
 
 def get_3D_bound(list_path_img, path_intrinsic, list_path_trans, depth_thresh, limit_size=600, voxel_size=0.01):
@@ -214,7 +217,7 @@ def rgbd2fragment_fine(
     vol_bnds = get_3D_bound(list_path_img[begin:end], path_intrinsic, list_path_trans[begin:end], depth_thresh, voxel_size=voxel_size, limit_size=limit_size)
 
     print(vol_bnds)
-    tsdf_vol = fusion.TSDFVolume(vol_bnds, voxel_size=voxel_size)
+    tsdf_vol = fusion.make_tsdf_volume(vol_bnds, voxel_size=voxel_size)
     for i, path_img in tqdm(enumerate(list_path_img), total=len(list_path_img)):
 
         depth = imageio.imread(path_img).astype(float) / 1000.0
@@ -248,7 +251,7 @@ def rgbd2fragment_fine(
                         list_path_img[begin:], path_intrinsic, list_path_trans[begin:],
                         depth_thresh, voxel_size=voxel_size, limit_size=limit_size
                     )
-                tsdf_vol = fusion.TSDFVolume(vol_bnds, voxel_size=voxel_size)
+                tsdf_vol = fusion.make_tsdf_volume(vol_bnds, voxel_size=voxel_size)
 
 
 class PatchExtractor:
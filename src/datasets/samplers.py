@@ -1,31 +1,83 @@
 import torch
 import numpy as np
 from torch.utils.data import Sampler
+import torch.distributed as dist
+
 
 class BalancedRandomSampler(Sampler):
     r"""This sampler is responsible for creating balanced batch based on the class distribution.
     It is implementing a replacement=True strategy for indices selection
+
+    The indices of an epoch are drawn at once: a class is drawn uniformly for each sample, then an element of
+    that class. They can be split between several processes, each replica gets a different part of the same
+    epoch: the indices are drawn with a generator seeded by ``seed`` and the epoch, which is increased at each
+    iteration or set with :meth:`set_epoch`. When the sampler is iterated within a DataLoader worker
+    (by an iterable dataset for example), the indices of the replica are split between the workers.
+
+    Parameters
+    ----------
+    labels: np.ndarray
+        Label of each element of the dataset
+    num_replicas: int, optional
+        Number of processes, defaults to the world size when torch.distributed is initialised
+    rank: int, optional
+        Rank of the current process
+    seed: int, optional
+        Seed of the draws, defaults to 0 with several replicas, otherwise the global numpy generator is used
     """
-    def __init__(self, labels, replacement=True):
 
-        self.num_samples = len(labels)
+    def __init__(self, labels, replacement=True, num_replicas=None, rank=None, seed=None):
+        if isinstance(labels, (list, tuple)) and len(labels) > 0 and torch.is_tensor(labels[0]):
+            labels = torch.stack([label.view(-1)[0] for label in labels])
+        if torch.is_tensor(labels):
+            labels = labels.cpu().numpy()
+        labels = np.asarray(labels)
+        if num_replicas is None:
+            num_replicas = dist.get_world_size() if dist.is_available() and dist.is_initialized() else 1
+        if rank is None:
+            rank = dist.get_rank() if num_replicas > 1 else 0
+        assert 0 <= rank < num_replicas
+        if seed is None and num_replicas > 1:
+            seed = 0
+
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.seed = seed
+        self.epoch = 0
+        self.num_samples = int(np.ceil(len(labels) / float(num_replicas)))
 
-        self.idx_classes, self.counts = np.unique(labels, return_counts=True)
-        self.indices = {
-           idx: np.argwhere(labels == idx).flatten() for idx in self.idx_classes
-        }
+        self.idx_classes, inverse, self.counts = np.unique(labels, return_inverse=True, return_counts=True)
+        # Indices of the elements grouped by class
+        self._grouped = np.argsort(inverse, kind="stable")
+        self._offsets = np.concatenate([[0], np.cumsum(self.counts)[:-1]])
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def draw(self, num_samples, generator=np.random):
+        """ Draws num_samples balanced indices
+        """
+        classes = generator.randint(len(self.idx_classes), size=num_samples)
+        offsets = (generator.random_sample(num_samples) * self.counts[classes]).astype(np.int64)
+        return self._grouped[self._offsets[classes] + offsets]
 
     def __iter__(self):
-        indices = []
-        for _ in range(self.num_samples):
-            idx = np.random.choice(self.idx_classes)
-            indice = int(np.random.choice(self.indices[idx]))
-            indices.append(indice)
-        return iter(indices)
+        if self.seed is None:
+            indices = self.draw(self.num_samples)
+        else:
+            generator = np.random.RandomState((self.seed + self.epoch) % 2 ** 32)
+            indices = self.draw(self.num_samples * self.num_replicas, generator)[self.rank :: self.num_replicas]
+        self.epoch += 1
+
+        worker_info = torch.utils.data.get_worker_info()
+        if worker_info is not None:
+            indices = indices[worker_info.id :: worker_info.num_workers]
+        return iter(indices.tolist())
 
     def __len__(self):
         return self.num_samples
 
     def __repr__(self):
-        return "{}(num_samples={})".format(self.__class__.__name__, self.num_samples)
-
+        return "{}(num_samples={}, num_replicas={}, rank={})".format(
+            self.__class__.__name__, self.num_samples, self.num_replicas, self.rank
+        )
@@ -0,0 +1,91 @@
+import os
+import hashlib
+from abc import ABC, abstractmethod
+import logging
+import numpy as np
+import torch
+
+from src.utils.file_utils import atomic_write
+
+log = logging.getLogger(__name__)
+
+
+class BaseForwardDataset(ABC, torch.utils.data.Dataset):
+    """ Dataset over a folder of raw files used for forward inference. Each raw file is parsed once by
+    :meth:`parse_file` into an array that is saved in ``cache_dir``, the loading of the samples and the
+    reprojection of the predictions to the full resolution then both read the binary copy.
+    Cached arrays are named after a hash of the absolute path of their raw file so that a cache folder can be
+    shared between input folders, they store the size and modification time of the raw file and are parsed
+    again when it changes. When ``cache_dir`` is not writable the arrays are kept in memory instead.
+
+    Parameters
+    ----------
+    files: List[str]
+        Raw files
+    cache_dir: str, optional
+        Folder of the binary copies, no cache on disk when None
+    """
+
+    def __init__(self, files, cache_dir=None):
+        super().__init__()
+        self._files = files
+        self._cache_dir = cache_dir
+        self._memory_cache = {}
+
+    def __len__(self):
+        return len(self._files)
+
+    def get_filename(self, index):
+        return os.path.basename(self._files[index])
+
+    @abstractmethod
+    def parse_file(self, filename) -> np.ndarray:
+        """ Reads the content of a raw file
+        """
+
+    def cache_path(self, index):
+        source_hash = hashlib.sha1(os.path.abspath(self._files[index]).encode()).hexdigest()[:12]
+        name = os.path.splitext(self.get_filename(index))[0]
+        return os.path.join(self._cache_dir, "{}_{}.npz".format(name, source_hash))
+
+    @staticmethod
+    def _source_stats(filename):
+        stats = os.stat(filename)
+        return np.array([stats.st_size, stats.st_mtime_ns], dtype=np.int64)
+
+    @staticmethod
+    def _load_cache(path, source_stats):
+        """ Cached array if it was parsed from a raw file with the same size and modification time
+        """
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as cached:
+            if not np.array_equal(cached["source_stats"], source_stats):
+                return None
+            return cached["raw"]
+
+    def read_raw(self, index) -> np.ndarray:
+        """ Content of a raw file, parsed at the first access only
+        """
+        index = int(index)
+        if index in self._memory_cache:
+            return self._memory_cache[index].copy()
+
+        filename = self._files[index]
+        if self._cache_dir is None:
+            return self.parse_file(filename)
+
+        path = self.cache_path(index)
+        source_stats = self._source_stats(filename)
+        raw = self._load_cache(path, source_stats)
+        if raw is not None:
+            return raw
+
+        raw = self.parse_file(filename)
+        try:
+            os.makedirs(self._cache_dir, exist_ok=True)
+            atomic_write(path, lambda f: np.savez(f, raw=raw, source_stats=source_stats))
+        except OSError as e:
+            log.warning("Cannot write the raw cache {}: {}, keeping it in memory".format(path, e))
+            self._memory_cache[index] = raw.copy()
+        return raw
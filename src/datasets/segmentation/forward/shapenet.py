@@ -13,35 +13,36 @@ from src.utils import is_list
 from src.datasets.base_dataset import BaseDataset
 from src.metrics.shapenet_part_tracker import ShapenetPartTracker
 from src.datasets.segmentation.shapenet import ShapeNet
+from .base import BaseForwardDataset
 
 log = logging.getLogger(__name__)
 
 
-class _ForwardShapenet(torch.utils.data.Dataset):
+class _ForwardShapenet(BaseForwardDataset):
     """ Dataset to run forward inference on Shapenet kind of data data. Runs on a whole folder.
     Arguments:
         path: folder that contains a set of files of a given category
         category: index of the category to use for forward inference. This value depends on how many categories the model has been trained one.
         transforms: transforms to be applied to the data
         include_normals: wether to include normals for the forward inference
+        cache_dir: folder where the parsed files are stored, see BaseForwardDataset
     """
 
-    def __init__(self, path, category: int, transforms=None, include_normals=True):
-        super().__init__()
+    def __init__(self, path, category: int, transforms=None, include_normals=True, cache_dir=None):
+        super().__init__(sorted(glob.glob(os.path.join(path, "*.txt"))), cache_dir=cache_dir)
         self._category = category
         self._path = path
-        self._files = sorted(glob.glob(os.path.join(self._path, "*.txt")))
         self._transforms = transforms
         self._include_normals = include_normals
         assert os.path.exists(self._path)
         if self.__len__() == 0:
             raise ValueError("Empty folder %s" % path)
 
-    def __len__(self):
-        return len(self._files)
+    def parse_file(self, filename):
+        return read_txt_array(filename).numpy()
 
-    def _read_file(self, filename):
-        raw = read_txt_array(filename)
+    def _read_file(self, index):
+        raw = torch.from_numpy(self.read_raw(index))
         pos = raw[:, :3]
         x = raw[:, 3:6]
         if raw.shape[1] == 7:
@@ -53,7 +54,7 @@ class _ForwardShapenet(torch.utils.data.Dataset):
     def get_raw(self, index):
         """ returns the untransformed data associated with an element
         """
-        return self._read_file(self._files[index])
+        return self._read_file(index)
 
     @property
     def num_features(self):
@@ -62,11 +63,8 @@ class _ForwardShapenet(torch.utils.data.Dataset):
             return feats.shape[-1]
         return 0
 
-    def get_filename(self, index):
-        return os.path.basename(self._files[index])
-
     def __getitem__(self, index):
-        data = self._read_file(self._files[index])
+        data = self._read_file(index)
         category = torch.ones(data.pos.shape[0], dtype=torch.long) * self._category
         setattr(data, "category", category)
         setattr(data, "sampleid", torch.tensor([index]))
@@ -116,8 +114,9 @@ class ForwardShapenetDataset(BaseDataset):
         for t in [self.pre_transform, self.test_transform]:
             if t:
                 transforms = T.Compose([transforms, t])
+        cache_dir = dataset_opt.get("raw_cache_dir", os.path.join(self._data_path, "raw_cache"))
         self.test_dataset = _ForwardShapenet(
-            self._data_path, self._cat_idx, transforms=transforms, include_normals=include_normals
+            self._data_path, self._cat_idx, transforms=transforms, include_normals=include_normals, cache_dir=cache_dir
         )
 
     @staticmethod
@@ -132,14 +131,16 @@ class ForwardShapenetDataset(BaseDataset):
         """
         return ShapenetPartTracker(dataset, wandb_log=wandb_log, use_tensorboard=tensorboard_log)
 
-    def predict_original_samples(self, batch, conv_type, output):
+    def predict_original_samples(self, batch, conv_type, output, with_probabilities=False):
         """ Takes the output generated by the NN and upsamples it to the original data
         Arguments:
             batch -- processed batch
             conv_type -- Type of convolutio (DENSE, PARTIAL_DENSE, etc...)
             output -- output predicted by the model
+            with_probabilities -- also returns the class probabilities of each point of the original data
         """
         full_res_results = {}
+        probabilities = {}
         num_sample = BaseDataset.get_num_samples(batch, conv_type)
         if conv_type == "DENSE":
             output = output.reshape(num_sample, -1, output.shape[-1])  # [B,N,L]
@@ -152,9 +153,12 @@ class ForwardShapenetDataset(BaseDataset):
             origindid = BaseDataset.get_sample(batch, SaveOriginalPosId.KEY, b, conv_type)
             full_prediction = knn_interpolate(predicted, sample_raw_pos[origindid], sample_raw_pos, k=3)
             labels = full_prediction.max(1)[1].unsqueeze(-1)
-            full_res_results[self.test_dataset[0].get_filename(sampleid)] = np.hstack(
-                (sample_raw_pos.cpu().numpy(), labels.cpu().numpy(),)
-            )
+            filename = self.test_dataset[0].get_filename(sampleid)
+            full_res_results[filename] = np.hstack((sample_raw_pos.cpu().numpy(), labels.cpu().numpy(),))
+            if with_probabilities:
+                probabilities[filename] = torch.softmax(full_prediction.float(), -1).cpu()
+        if with_probabilities:
+            return full_res_results, probabilities
         return full_res_results
 
     @property
@@ -1,5 +1,6 @@
 import os
 import os.path as osp
+import itertools
 from itertools import repeat, product
 import numpy as np
 import pandas as pd
@@ -13,7 +14,8 @@ from torch_geometric.data import DataLoader
 from torch_geometric.datasets import S3DIS as S3DIS1x1
 import torch_geometric.transforms as T
 import logging
-from sklearn.neighbors import NearestNeighbors
+import multiprocessing
+from scipy.spatial import cKDTree
 from tqdm import tqdm as tq
 import csv
 import pandas as pd
@@ -21,7 +23,10 @@ from src.metrics.segmentation_tracker import SegmentationTracker
 from src.datasets.samplers import BalancedRandomSampler
 import src.core.data_transform.transforms as cT
 from src.datasets.base_dataset import BaseDataset
-import pickle
+from src.datasets.memmap_storage import save_collated, load_collated, concat_collated
+from src.datasets.spatial_index import SpatialIndexStore
+from src.datasets.processed_cache import ProcessedCacheMixin, save_raw_cache
+from src.utils.file_utils import atomic_write
 
 log = logging.getLogger(__name__)
 
@@ -84,22 +89,27 @@ def read_s3dis_format(train_file, room_name, label_out=True, verbose=False, debu
             return xyz, rgb
         n_ver = len(room_ver)
         del room_ver
-        nn = NearestNeighbors(1, algorithm="kd_tree").fit(xyz)
-        room_labels = np.zeros((n_ver,), dtype="int64")
-        room_object_indices = np.zeros((n_ver,), dtype="int64")
+
+        # The points of all the objects are labelled with a single query
         objects = glob.glob(osp.join(train_file, "Annotations/*.txt"))
-        i_object = 1
-        for single_object in objects:
+        object_labels = np.zeros((len(objects) + 1,), dtype="int64")
+        object_xyz, object_indices = [], []
+        for i_object, single_object in enumerate(objects, 1):
             object_name = os.path.splitext(os.path.basename(single_object))[0]
             if verbose:
                 log.debug("adding object " + str(i_object) + " : " + object_name)
             object_class = object_name.split("_")[0]
-            object_label = object_name_to_label(object_class)
-            obj_ver = pd.read_csv(single_object, sep=" ", header=None).values
-            _, obj_ind = nn.kneighbors(obj_ver[:, 0:3])
-            room_labels[obj_ind] = object_label
-            room_object_indices[obj_ind] = i_object
-            i_object = i_object + 1
+            object_labels[i_object] = object_name_to_label(object_class)
+            obj_ver = pd.read_csv(single_object, sep=" ", header=None, usecols=[0, 1, 2]).values
+            object_xyz.append(obj_ver)
+            object_indices.append(np.full((len(obj_ver),), i_object, dtype="int64"))
+
+        room_object_indices = np.zeros((n_ver,), dtype="int64")
+        if len(objects) > 0:
+            _, obj_ind = cKDTree(xyz).query(np.concatenate(object_xyz))
+            # A point matched by several objects belongs to the last one
+            np.maximum.at(room_object_indices, obj_ind, np.concatenate(object_indices))
+        room_labels = object_labels[room_object_indices]
 
         return (
             torch.from_numpy(xyz),
@@ -109,6 +119,59 @@ def read_s3dis_format(train_file, room_name, label_out=True, verbose=False, debu
         )
 
 
+def room_names(area_path):
+    return sorted(
+        [room_name for room_name in os.listdir(area_path) if os.path.isdir(osp.join(area_path, room_name))]
+    )
+
+
+ROOM_KEYS = ["xyz", "rgb", "room_labels", "room_object_indices"]
+
+
+def _cache_s3dis_room(room_path, cache_path, verbose):
+    room = read_s3dis_format(room_path, osp.basename(room_path), label_out=True, verbose=verbose)
+    os.makedirs(osp.dirname(cache_path), exist_ok=True)
+    atomic_write(cache_path, lambda f: np.savez(f, **{key: value.numpy() for key, value in zip(ROOM_KEYS, room)}))
+
+
+def load_s3dis_room(cache_path):
+    """ Reads a room saved by :func:`read_s3dis_rooms`, returns (xyz, rgb, room_labels, room_object_indices)
+    """
+    with np.load(cache_path) as room:
+        return tuple(torch.from_numpy(room[key]) for key in ROOM_KEYS)
+
+
+def read_s3dis_rooms(raw_dir, areas, cache_dir, process_workers=1, verbose=False):
+    """ Reads all the rooms of several areas. Each room is parsed once and saved as a binary file in
+    ``{cache_dir}/{area}/{room_name}.npz``, the rooms that are not in the cache yet are parsed by
+    ``process_workers`` processes.
+
+    Returns
+    -------
+    rooms: Iterator[Tuple]
+        (area, room_name, xyz, rgb, room_labels, room_object_indices) of each room, area after area
+    """
+    rooms = [(area, room_name) for area in areas for room_name in room_names(osp.join(raw_dir, area))]
+    jobs = [
+        (osp.join(raw_dir, area, room_name), osp.join(cache_dir, area, "{}.npz".format(room_name)), verbose)
+        for area, room_name in rooms
+    ]
+    jobs = [job for job in jobs if not osp.exists(job[1])]
+    if len(jobs) > 0:
+        log.info("Parsing {} rooms with {} processes".format(len(jobs), process_workers))
+        if process_workers > 1:
+            with multiprocessing.Pool(processes=process_workers) as pool:
+                # Larger rooms first for a better balance between the processes
+                jobs = sorted(jobs, key=lambda job: -osp.getsize(osp.join(job[0], osp.basename(job[0]) + ".txt")))
+                pool.starmap(_cache_s3dis_room, jobs, chunksize=1)
+        else:
+            for job in tq(jobs):
+                _cache_s3dis_room(*job)
+
+    for area, room_name in rooms:
+        yield (area, room_name) + load_s3dis_room(osp.join(cache_dir, area, "{}.npz".format(room_name)))
+
+
 def add_weights(dataset, train, class_weight_method):
     L = len(INV_OBJECT_LABEL.keys())
     if train:
@@ -188,7 +251,7 @@ class S3DIS1x1Dataset(BaseDataset):
 ################################### Used for s3dis radius sphere ###################################
 
 
-class S3DISOriginal(InMemoryDataset):
+class S3DISOriginal(ProcessedCacheMixin, InMemoryDataset):
 
     url = "https://docs.google.com/forms/d/e/1FAIpQLScDimvNMCGhy_rmBA2gHfDu3naktRm6A8BPwAWWDv-Uhm6Shw/viewform?c=0&w=1"
     zip_name = "Stanford3dDataset_v1.2_Aligned_Version.zip"
@@ -207,9 +270,13 @@ class S3DISOriginal(InMemoryDataset):
         keep_instance=False,
         verbose=False,
         debug=False,
+        use_memmap=False,
+        process_workers=1,
     ):
         assert test_area >= 1 and test_area <= 6
         self.transform = transform
+        self.use_memmap = use_memmap
+        self.process_workers = process_workers
         self.pre_collate_transform = pre_collate_transform
         self.test_area = test_area
         self.keep_instance = keep_instance
@@ -217,8 +284,8 @@ class S3DISOriginal(InMemoryDataset):
         self.debug = debug
         super(S3DISOriginal, self).__init__(root, transform, pre_transform, pre_filter)
         path = self.processed_paths[0] if train else self.processed_paths[1]
-        self.data, self.slices = torch.load(path)
-        self.kd_trees = self.load_kd_trees("train" if train else "test")
+        self.data, self.slices = load_collated(path, memmap=self.use_memmap)
+        self.spatial_index = self.load_spatial_index("train" if train else "test")
 
     def __getitem__(self, idx):
         if isinstance(idx, int):
@@ -227,7 +294,8 @@ class S3DISOriginal(InMemoryDataset):
                 data = self.get(super_class.indices()[idx])
             else:
                 data = self.get(idx)
-            data.kd_tree = self.kd_trees[str(np.asarray(data.id))]
+            # Views of the memory mapped index of the room, removed by the sphere samplers
+            data.kd_tree = self.spatial_index[int(data.id)]
             data = data if self.transform is None else self.transform(data)
             return data
         else:
@@ -261,73 +329,73 @@ class S3DISOriginal(InMemoryDataset):
                     )
                 )
 
-    def extract_kd_trees(self, data_list):
-        kd_trees = {}
+    def remove_kd_trees(self, data_list):
+        """ Trees computed by a pre transform are replaced by the spatial index
+        """
         for data in data_list:
             if hasattr(data, "kd_tree"):
-                kd_trees[str(np.asarray(data.id))] = getattr(data, "kd_tree")
                 delattr(data, "kd_tree")
-        return kd_trees
 
-    def save_kd_trees(self, split_name, kd_trees):
-        name = "{}_kd_trees.pt".format(split_name)
-        pickle_out = open(os.path.join(self.processed_dir, name), "wb")
-        pickle.dump(kd_trees, pickle_out)
-        pickle_out.close()
+    def spatial_index_path(self, split_name):
+        return os.path.join(self.processed_dir, "{}_spatial_index_{}".format(split_name, self.test_area))
+
+    def save_spatial_index(self, split_name, data_list):
+        clouds = ((int(data.id), np.asarray(data.pos)) for data in data_list)
+        SpatialIndexStore.save(self.spatial_index_path(split_name), clouds)
+
+    def load_spatial_index(self, split_name):
+        path = self.spatial_index_path(split_name)
+        if not SpatialIndexStore.exists(path):
+            log.info("Building the spatial index of the {} rooms".format(split_name))
+            self.save_spatial_index(split_name, (self.get(i) for i in range(len(self))))
+        return SpatialIndexStore(path)
 
-    def load_kd_trees(self, split_name):
-        name = "{}_kd_trees.pt".format(split_name)
-        pickle_out = open(os.path.join(self.processed_dir, name), "rb")
-        kd_trees = pickle.load(pickle_out)
-        pickle_out.close()
-        return kd_trees
+    def processed_params(self):
+        return {"keep_instance": self.keep_instance}
+
+    def read_raw_rooms(self, areas):
+        """ Rooms of the areas as returned by :func:`read_s3dis_rooms`, the parsing is shared by all the
+        processed variants of the dataset
+        """
+        cache_dir = osp.join(self.raw_cache_dir, "rooms")
+        return read_s3dis_rooms(self.raw_dir, areas, cache_dir, self.process_workers, self.verbose)
+
+    def debug_raw_area(self, area):
+        area_path = osp.join(self.raw_dir, area)
+        for room_name in room_names(area_path):
+            read_s3dis_format(osp.join(area_path, room_name), room_name, verbose=self.verbose, debug=True)
 
     def process(self):
 
         train_areas = [f for f in self.folders if str(self.test_area) not in f]
         test_areas = [f for f in self.folders if str(self.test_area) in f]
 
-        train_files = [
-            (f, room_name, osp.join(self.raw_dir, f, room_name))
-            for f in train_areas
-            for room_name in os.listdir(osp.join(self.raw_dir, f))
-            if os.path.isdir(osp.join(self.raw_dir, f, room_name))
-        ]
-
-        test_files = [
-            (f, room_name, osp.join(self.raw_dir, f, room_name))
-            for f in test_areas
-            for room_name in os.listdir(osp.join(self.raw_dir, f))
-            if os.path.isdir(osp.join(self.raw_dir, f, room_name))
-        ]
-
         train_data_list, test_data_list = [], []
+        if self.debug:
+            for area in tq(train_areas + test_areas):
+                self.debug_raw_area(area)
+            rooms = []
+        else:
+            rooms = self.read_raw_rooms(train_areas + test_areas)
 
         data_count = 0
-        for (area, room_name, file_path) in tq(train_files + test_files):
+        for area, room_name, xyz, rgb, room_labels, room_object_indices in rooms:
 
-            if self.debug:
-                read_s3dis_format(file_path, room_name, label_out=True, verbose=self.verbose, debug=self.debug)
-            else:
-                xyz, rgb, room_labels, room_object_indices = read_s3dis_format(
-                    file_path, room_name, label_out=True, verbose=self.verbose, debug=self.debug
-                )
+            data = Data(pos=xyz, x=rgb.float() / 255.0, y=room_labels, id=torch.ones(1).int() * data_count)
 
-                data = Data(pos=xyz, x=rgb.float() / 255.0, y=room_labels, id=torch.ones(1).int() * data_count)
+            if self.keep_instance:
+                data.room_object_indices = room_object_indices
 
-                if self.keep_instance:
-                    data.room_object_indices = room_object_indices
+            if self.pre_filter is not None and not self.pre_filter(data):
+                continue
 
-                if self.pre_filter is not None and not self.pre_filter(data):
-                    continue
-
-                if self.pre_transform is not None:
-                    data = self.pre_transform(data)
+            if self.pre_transform is not None:
+                data = self.pre_transform(data)
 
-                if (area, room_name, file_path) in train_files:
-                    train_data_list.append(data)
-                else:
-                    test_data_list.append(data)
+            if area in train_areas:
+                train_data_list.append(data)
+            else:
+                test_data_list.append(data)
 
             data_count += 1
 
@@ -335,14 +403,14 @@ class S3DISOriginal(InMemoryDataset):
             train_data_list = self.pre_collate_transform.fit_transform(train_data_list)
             test_data_list = self.pre_collate_transform.transform(test_data_list)
 
-        train_kd_trees = self.extract_kd_trees(train_data_list)
-        self.save_kd_trees("train", train_kd_trees)
+        self.remove_kd_trees(train_data_list)
+        self.save_spatial_index("train", train_data_list)
 
-        test_kd_trees = self.extract_kd_trees(test_data_list)
-        self.save_kd_trees("test", test_kd_trees)
+        self.remove_kd_trees(test_data_list)
+        self.save_spatial_index("test", test_data_list)
 
-        torch.save(self.collate(train_data_list), self.processed_paths[0])
-        torch.save(self.collate(test_data_list), self.processed_paths[1])
+        save_collated(self.collate(train_data_list), self.processed_paths[0], memmap=self.use_memmap)
+        save_collated(self.collate(test_data_list), self.processed_paths[1], memmap=self.use_memmap)
 
 
 class S3DISDataset(BaseDataset):
@@ -357,6 +425,8 @@ class S3DISDataset(BaseDataset):
             train=True,
             pre_transform=pre_transform,
             transform=self.train_transform,
+            use_memmap=dataset_opt.get("memmap", False),
+            process_workers=dataset_opt.get("process_workers", 1),
         )
         self.test_dataset = S3DISOriginal(
             self._data_path,
@@ -364,6 +434,8 @@ class S3DISDataset(BaseDataset):
             train=False,
             pre_transform=pre_transform,
             transform=self.test_transform,
+            use_memmap=dataset_opt.get("memmap", False),
+            process_workers=dataset_opt.get("process_workers", 1),
         )
 
         self.train_dataset = add_weights(self.train_dataset, True, dataset_opt.class_weight_method)
@@ -384,7 +456,15 @@ class S3DISDataset(BaseDataset):
 ################################### Used for fused s3dis radius sphere ###################################
 
 
-class S3DISOriginalFused(InMemoryDataset):
+class S3DISOriginalFused(ProcessedCacheMixin, InMemoryDataset):
+    """ S3DIS areas fused into a single cloud each and split into spheres by the ``pre_collate_transform``.
+
+    Each area is processed on its own and stored in ``{processed_dir}/areas/{area}.pt`` whatever the test area,
+    the train and test files of a fold are then assembled from the processed areas. Running all the folds of a
+    cross-validation processes each area only once.
+    """
+
+    PROCESSED_VERSION = 2
 
     url = "https://docs.google.com/forms/d/e/1FAIpQLScDimvNMCGhy_rmBA2gHfDu3naktRm6A8BPwAWWDv-Uhm6Shw/viewform?c=0&w=1"
     zip_name = "Stanford3dDataset_v1.2_Version.zip"
@@ -403,9 +483,13 @@ class S3DISOriginalFused(InMemoryDataset):
         keep_instance=False,
         verbose=False,
         debug=False,
+        use_memmap=False,
+        process_workers=1,
     ):
         assert test_area >= 1 and test_area <= 6
         self.transform = transform
+        self.use_memmap = use_memmap
+        self.process_workers = process_workers
         self.pre_collate_transform = pre_collate_transform
         self.test_area = test_area
         self.keep_instance = keep_instance
@@ -413,7 +497,7 @@ class S3DISOriginalFused(InMemoryDataset):
         self.debug = debug
         super(S3DISOriginalFused, self).__init__(root, transform, pre_transform, pre_filter)
         path = self.processed_paths[0] if train else self.processed_paths[1]
-        self.data, self.slices = torch.load(path)
+        self.data, self.slices = load_collated(path, memmap=self.use_memmap)
 
         if train:
             self._center_labels = self.load_center_labels("train")
@@ -429,10 +513,18 @@ class S3DISOriginalFused(InMemoryDataset):
         return self.folders
 
     @property
-    def pre_processed_path(self):
-        test_area = self.test_area
-        pre_processed_file_names = "pre_{}.pt".format(test_area)
-        return os.path.join(self.processed_dir, pre_processed_file_names)
+    def train_areas(self):
+        return [f for f in self.folders if f != "Area_{}".format(self.test_area)]
+
+    @property
+    def test_areas(self):
+        return ["Area_{}".format(self.test_area)]
+
+    def area_path(self, area):
+        return os.path.join(self.processed_dir, "areas", "{}.pt".format(area))
+
+    def center_labels_path(self, area):
+        return os.path.join(self.processed_dir, "areas", "{}_center_labels.pt".format(area))
 
     @property
     def processed_file_names(self):
@@ -466,89 +558,74 @@ class S3DISOriginalFused(InMemoryDataset):
                 delattr(data, "center_label")
         return extract_center_labels
 
-    def save_center_labels(self, split_name, center_labels):
-        name = "{}_center_labels.pt".format(split_name)
-        pickle_out = open(os.path.join(self.processed_dir, name), "wb")
-        pickle.dump(center_labels, pickle_out)
-        pickle_out.close()
-
     def load_center_labels(self, split_name):
-        name = "{}_center_labels.pt".format(split_name)
-        pickle_out = open(os.path.join(self.processed_dir, name), "rb")
-        center_labels = pickle.load(pickle_out)
-        pickle_out.close()
+        areas = self.train_areas if split_name == "train" else self.test_areas
+        center_labels = []
+        for area in areas:
+            center_labels += torch.load(self.center_labels_path(area))
         return center_labels
 
-    def process(self):
+    def processed_params(self):
+        return {"keep_instance": self.keep_instance}
 
-        if not os.path.exists(self.pre_processed_path):
+    def read_raw_rooms(self, areas):
+        """ Rooms of the areas as returned by :func:`read_s3dis_rooms`, the parsing is shared by all the
+        processed variants of the dataset
+        """
+        cache_dir = osp.join(self.raw_cache_dir, "rooms")
+        return read_s3dis_rooms(self.raw_dir, areas, cache_dir, self.process_workers, self.verbose)
 
-            train_areas = [f for f in self.folders if str(self.test_area) not in f]
-            test_areas = [f for f in self.folders if str(self.test_area) in f]
+    def debug_raw_area(self, area):
+        area_path = osp.join(self.raw_dir, area)
+        for room_name in room_names(area_path):
+            read_s3dis_format(osp.join(area_path, room_name), room_name, verbose=self.verbose, debug=True)
 
-            train_files = [
-                (f, room_name, osp.join(self.raw_dir, f, room_name))
-                for f in train_areas
-                for room_name in os.listdir(osp.join(self.raw_dir, f))
-                if os.path.isdir(osp.join(self.raw_dir, f, room_name))
-            ]
+    def process_areas(self, areas):
+        """ Applies the pre transforms to the rooms of each area and the ``pre_collate_transform`` to the area
+        """
+        rooms = self.read_raw_rooms(areas)
+        for area, area_rooms in itertools.groupby(rooms, key=lambda room: room[0]):
+            log.info("Processing {}".format(area))
+            data_list = []
+            for _, room_name, xyz, rgb, room_labels, room_object_indices in area_rooms:
 
-            test_files = [
-                (f, room_name, osp.join(self.raw_dir, f, room_name))
-                for f in test_areas
-                for room_name in os.listdir(osp.join(self.raw_dir, f))
-                if os.path.isdir(osp.join(self.raw_dir, f, room_name))
-            ]
+                rgb_norm = rgb.float() / 255.0
+                data = Data(pos=xyz, y=room_labels, rgb=rgb_norm)
 
-            data_list = [[] for _ in range(6)]
-            for (area, room_name, file_path) in tq(train_files + test_files):
+                if self.keep_instance:
+                    data.room_object_indices = room_object_indices
 
-                area_num = int(area[-1]) - 1
-                if self.debug:
-                    read_s3dis_format(file_path, room_name, label_out=True, verbose=self.verbose, debug=self.debug)
+                if self.pre_filter is not None and not self.pre_filter(data):
                     continue
-                else:
-                    xyz, rgb, room_labels, room_object_indices = read_s3dis_format(
-                        file_path, room_name, label_out=True, verbose=self.verbose, debug=self.debug
-                    )
 
-                    rgb_norm = rgb.float() / 255.0
-                    data = Data(pos=xyz, y=room_labels, rgb=rgb_norm)
-
-                    if self.keep_instance:
-                        data.room_object_indices = room_object_indices
+                if self.pre_transform is not None:
+                    data = self.pre_transform(data)
 
-                    if self.pre_filter is not None and not self.pre_filter(data):
-                        continue
+                data_list.append(data)
 
-                    if self.pre_transform is not None:
-                        data = self.pre_transform(data)
+            if self.pre_collate_transform:
+                log.info("pre_collate_transform ...")
+                data_list = self.pre_collate_transform(data_list)
 
-                    data_list[area_num].append(data)
+            # The area file is written last, an area is processed when it exists
+            save_raw_cache(self.extract_center_labels(data_list), self.center_labels_path(area))
+            save_raw_cache(self.collate(data_list), self.area_path(area))
 
-            torch.save(data_list, self.pre_processed_path)
-        else:
-            data_list = torch.load(self.pre_processed_path)
+    def process(self):
 
         if self.debug:
+            for area in tq(self.folders):
+                self.debug_raw_area(area)
             return
 
-        train_data_list = [data_list[i] for i in range(6) if i != self.test_area - 1]
-        test_data_list = data_list[self.test_area - 1]
-
-        if self.pre_collate_transform:
-            log.info("pre_collate_transform ...")
-            train_data_list = self.pre_collate_transform(train_data_list)
-            test_data_list = self.pre_collate_transform(test_data_list)
-
-        train_center_labels = self.extract_center_labels(train_data_list)
-        self.save_center_labels("train", train_center_labels)
-
-        test_center_labels = self.extract_center_labels(test_data_list)
-        self.save_center_labels("test", test_center_labels)
+        missing_areas = [area for area in self.folders if not os.path.exists(self.area_path(area))]
+        if len(missing_areas) > 0:
+            self.process_areas(missing_areas)
 
-        torch.save(self.collate(train_data_list), self.processed_paths[0])
-        torch.save(self.collate(test_data_list), self.processed_paths[1])
+        for areas, path in [(self.train_areas, self.processed_paths[0]), (self.test_areas, self.processed_paths[1])]:
+            log.info("Assembling {} from {}".format(os.path.basename(path), areas))
+            collated = concat_collated([torch.load(self.area_path(area)) for area in areas])
+            save_collated(collated, path, memmap=self.use_memmap)
 
 
 class S3DISFusedDataset(BaseDataset):
@@ -561,6 +638,8 @@ class S3DISFusedDataset(BaseDataset):
             train=True,
             pre_collate_transform=self.pre_collate_transform,
             transform=self.train_transform,
+            use_memmap=dataset_opt.get("memmap", False),
+            process_workers=dataset_opt.get("process_workers", 1),
         )
         self.test_dataset = S3DISOriginalFused(
             self._data_path,
@@ -568,6 +647,8 @@ class S3DISFusedDataset(BaseDataset):
             train=False,
             pre_collate_transform=self.pre_collate_transform,
             transform=self.test_transform,
+            use_memmap=dataset_opt.get("memmap", False),
+            process_workers=dataset_opt.get("process_workers", 1),
         )
 
         if dataset_opt.class_weight_method:
@@ -23,6 +23,8 @@ from urllib.request import urlopen
 
 from src.metrics.segmentation_tracker import SegmentationTracker
 from src.datasets.base_dataset import BaseDataset
+from src.datasets.memmap_storage import save_collated, load_collated
+from src.datasets.processed_cache import ProcessedCacheMixin, save_raw_cache
 from . import IGNORE_LABEL
 
 log = logging.getLogger(__name__)
@@ -216,19 +218,37 @@ def read_aggregation(filename):
     return object_id_to_segs, label_to_segs
 
 
-def read_segmentation(filename):
+def read_segment_indices(filename):
+    """ Segment id of each vertex
+    """
     assert os.path.isfile(filename)
-    seg_to_verts = {}
     with open(filename) as f:
         data = json.load(f)
-        num_verts = len(data["segIndices"])
-        for i in range(num_verts):
-            seg_id = data["segIndices"][i]
-            if seg_id in seg_to_verts:
-                seg_to_verts[seg_id].append(i)
-            else:
-                seg_to_verts[seg_id] = [i]
-    return seg_to_verts, num_verts
+    return np.asarray(data["segIndices"], dtype=np.int64)
+
+
+def read_segmentation(filename):
+    seg_indices = read_segment_indices(filename)
+    order = np.argsort(seg_indices, kind="stable")
+    seg_ids, starts = np.unique(seg_indices[order], return_index=True)
+    seg_to_verts = {seg_id: verts.tolist() for seg_id, verts in zip(seg_ids.tolist(), np.split(order, starts[1:]))}
+    return seg_to_verts, len(seg_indices)
+
+
+def segment_values(seg_indices, segs, values, dtype=np.uint32):
+    """ Value of each vertex given the values of some segments, 0 for the vertices of the other segments.
+    A segment listed several times takes its last value.
+    """
+    out = np.zeros(len(seg_indices), dtype=dtype)
+    if len(segs) == 0:
+        return out
+    segs = np.asarray(segs, dtype=np.int64)[::-1]
+    values = np.asarray(values)[::-1]
+    unique_segs, last = np.unique(segs, return_index=True)
+    pos = np.minimum(np.searchsorted(unique_segs, seg_indices), len(unique_segs) - 1)
+    found = unique_segs[pos] == seg_indices
+    out[found] = values[last][pos[found]]
+    return out
 
 
 def export(mesh_file, agg_file, seg_file, meta_file, label_map_file, output_file=None):
@@ -252,46 +272,43 @@ def export(mesh_file, agg_file, seg_file, meta_file, label_map_file, output_file
     pts = np.dot(pts, axis_align_matrix.transpose())  # Nx4
     mesh_vertices[:, 0:3] = pts[:, 0:3]
 
-    # Load semantic and instance labels
+    # Load semantic and instance labels, 0: unannotated
     object_id_to_segs, label_to_segs = read_aggregation(agg_file)
-    seg_to_verts, num_verts = read_segmentation(seg_file)
-    label_ids = np.zeros(shape=(num_verts), dtype=np.uint32)  # 0: unannotated
-    object_id_to_label_id = {}
-    for label, segs in label_to_segs.items():
+    seg_indices = read_segment_indices(seg_file)
+    segs, seg_labels = [], []
+    for label, label_segs in label_to_segs.items():
         label_id = label_map[label]
-        for seg in segs:
-            verts = seg_to_verts[seg]
-            label_ids[verts] = label_id
-    instance_ids = np.zeros(shape=(num_verts), dtype=np.uint32)  # 0: unannotated
+        segs += label_segs
+        seg_labels += [label_id] * len(label_segs)
+    label_ids = segment_values(seg_indices, segs, seg_labels)
+
+    segs, seg_objects = [], []
+    for object_id, object_segs in object_id_to_segs.items():
+        segs += object_segs
+        seg_objects += [object_id] * len(object_segs)
+    instance_ids = segment_values(seg_indices, segs, seg_objects)
+
+    # Label of the first vertex of the first segment of each object
+    seg_ids, first_verts = np.unique(seg_indices, return_index=True)
+    object_id_to_label_id = {}
+    for object_id, object_segs in object_id_to_segs.items():
+        if len(object_segs) > 0:
+            object_id_to_label_id[object_id] = label_ids[first_verts[np.searchsorted(seg_ids, object_segs[0])]]
+
+    # Axis aligned box of each instance parameterized by (cx,cy,cz) the center point of the box,
+    # (dx,dy,dz) the length of the box along each axis and the label id
     num_instances = len(np.unique(list(object_id_to_segs.keys())))
-    for object_id, segs in object_id_to_segs.items():
-        for seg in segs:
-            verts = seg_to_verts[seg]
-            instance_ids[verts] = object_id
-            if object_id not in object_id_to_label_id:
-                object_id_to_label_id[object_id] = label_ids[verts][0]
     instance_bboxes = np.zeros((num_instances, 7))
-    for obj_id in object_id_to_segs:
-        label_id = object_id_to_label_id[obj_id]
-        obj_pc = mesh_vertices[instance_ids == obj_id, 0:3]
-        if len(obj_pc) == 0:
-            continue
-        # Compute axis aligned box
-        # An axis aligned bounding box is parameterized by
-        # (cx,cy,cz) and (dx,dy,dz) and label id
-        # where (cx,cy,cz) is the center point of the box,
-        # dx is the x-axis length of the box.
-        xmin = np.min(obj_pc[:, 0])
-        ymin = np.min(obj_pc[:, 1])
-        zmin = np.min(obj_pc[:, 2])
-        xmax = np.max(obj_pc[:, 0])
-        ymax = np.max(obj_pc[:, 1])
-        zmax = np.max(obj_pc[:, 2])
-        bbox = np.array(
-            [(xmin + xmax) / 2, (ymin + ymax) / 2, (zmin + zmax) / 2, xmax - xmin, ymax - ymin, zmax - zmin, label_id]
-        )
+    annotated = np.flatnonzero(instance_ids)
+    if len(annotated) > 0:
+        annotated = annotated[np.argsort(instance_ids[annotated], kind="stable")]
+        obj_ids, starts = np.unique(instance_ids[annotated], return_index=True)
+        obj_pc = mesh_vertices[annotated, 0:3]
+        mins = np.minimum.reduceat(obj_pc, starts)
+        maxs = np.maximum.reduceat(obj_pc, starts)
+        labels = np.asarray([object_id_to_label_id[obj_id] for obj_id in obj_ids.tolist()])
         # NOTE: this assumes obj_id is in 1,2,3,.,,,.NUM_INSTANCES
-        instance_bboxes[obj_id - 1, :] = bbox
+        instance_bboxes[obj_ids.astype(np.int64) - 1] = np.hstack(((mins + maxs) / 2, maxs - mins, labels[:, None]))
 
     return (
         mesh_vertices.astype(np.float32),
@@ -309,7 +326,7 @@ def export(mesh_file, agg_file, seg_file, meta_file, label_map_file, output_file
 ########################################################################################
 
 
-class Scannet(InMemoryDataset):
+class Scannet(ProcessedCacheMixin, InMemoryDataset):
 
     CLASS_LABELS = (
         "wall",
@@ -400,6 +417,7 @@ class Scannet(InMemoryDataset):
         use_multiprocessing=False,
         process_workers=4,
         types=[".txt", "_vh_clean_2.ply", "_vh_clean_2.0.010000.segs.json", ".aggregation.json"],
+        use_memmap=False,
     ):
 
         if donotcare_class_ids:
@@ -414,6 +432,7 @@ class Scannet(InMemoryDataset):
         self.use_multiprocessing = use_multiprocessing
         self.process_workers = process_workers
         self.types = types
+        self.use_memmap = use_memmap
 
         super(Scannet, self).__init__(root, transform, pre_transform, pre_filter)
         if split == "train":
@@ -425,12 +444,21 @@ class Scannet(InMemoryDataset):
         else:
             raise ValueError((f"Split {split} found, but expected either " "train, val, trainval or test"))
 
-        self.data, self.slices = torch.load(path)
+        self.data, self.slices = load_collated(path, memmap=self.use_memmap)
 
     @property
     def raw_file_names(self):
         return ["metadata", "scans", "scannetv2-labels.combined.tsv"]
 
+    def processed_params(self):
+        return {
+            "version": self.version,
+            "use_instance_labels": self.use_instance_labels,
+            "use_instance_bboxes": self.use_instance_bboxes,
+            "donotcare_class_ids": self.donotcare_class_ids,
+            "max_num_point": self.max_num_point,
+        }
+
     @property
     def processed_file_names(self):
         return ["{}.pt".format(s,) for s in Scannet.SPLITS]
@@ -490,6 +518,18 @@ class Scannet(InMemoryDataset):
         for url in self.URLS_METADATA:
             _ = download_url(url, metadata_path)
 
+    @staticmethod
+    def remap_labels(semantic_labels):
+        """ Maps the nyu40 ids of VALID_CLASS_IDS to [0, len(VALID_CLASS_IDS)) and the other ids of the colour map
+        to IGNORE_LABEL, in place
+        """
+        num_ids = max(Scannet.SCANNET_COLOR_MAP.keys()) + 1
+        mapping = np.full(num_ids, IGNORE_LABEL, dtype=semantic_labels.dtype)
+        mapping[Scannet.VALID_CLASS_IDS] = np.arange(len(Scannet.VALID_CLASS_IDS))
+        in_map = (semantic_labels >= 0) & (semantic_labels < num_ids)
+        semantic_labels[in_map] = mapping[semantic_labels[in_map]]
+        return semantic_labels
+
     @staticmethod
     def read_one_scan(
         scannet_dir,
@@ -500,16 +540,21 @@ class Scannet(InMemoryDataset):
         obj_class_ids,
         use_instance_labels=True,
         use_instance_bboxes=True,
+        raw_cache_path=None,
     ):
-        mesh_file = osp.join(scannet_dir, scan_name, scan_name + "_vh_clean_2.ply")
-        agg_file = osp.join(scannet_dir, scan_name, scan_name + ".aggregation.json")
-        seg_file = osp.join(scannet_dir, scan_name, scan_name + "_vh_clean_2.0.010000.segs.json")
-        meta_file = osp.join(
-            scannet_dir, scan_name, scan_name + ".txt"
-        )  # includes axisAlignment info for the train set scans.
-        mesh_vertices, semantic_labels, instance_labels, instance_bboxes, instance2semantic = export(
-            mesh_file, agg_file, seg_file, meta_file, label_map_file, None
-        )
+        if raw_cache_path and osp.exists(raw_cache_path):
+            exported = torch.load(raw_cache_path)
+        else:
+            mesh_file = osp.join(scannet_dir, scan_name, scan_name + "_vh_clean_2.ply")
+            agg_file = osp.join(scannet_dir, scan_name, scan_name + ".aggregation.json")
+            seg_file = osp.join(scannet_dir, scan_name, scan_name + "_vh_clean_2.0.010000.segs.json")
+            meta_file = osp.join(
+                scannet_dir, scan_name, scan_name + ".txt"
+            )  # includes axisAlignment info for the train set scans.
+            exported = export(mesh_file, agg_file, seg_file, meta_file, label_map_file, None)
+            if raw_cache_path:
+                save_raw_cache(exported, raw_cache_path)
+        mesh_vertices, semantic_labels, instance_labels, instance_bboxes, instance2semantic = exported
 
         # Discard unwanted classes
         mask = np.logical_not(np.in1d(semantic_labels, donotcare_class_ids))
@@ -530,15 +575,7 @@ class Scannet(InMemoryDataset):
                 instance_labels = instance_labels[choices]
 
         # Remap labels to [0-(len(valid_labels))]
-        count = 0
-        for i in range(max(Scannet.SCANNET_COLOR_MAP.keys()) + 1):
-            if i in Scannet.VALID_CLASS_IDS:
-                label = count
-                count += 1
-            else:
-                label = IGNORE_LABEL
-            mask = semantic_labels == i
-            semantic_labels[mask] = label
+        semantic_labels = Scannet.remap_labels(semantic_labels)
 
         # Build data container
         data = {}
@@ -573,6 +610,7 @@ class Scannet(InMemoryDataset):
         obj_class_ids,
         use_instance_labels=True,
         use_instance_bboxes=True,
+        raw_cache_path=None,
     ):
         data = Scannet.read_one_scan(
             scannet_dir,
@@ -583,6 +621,7 @@ class Scannet(InMemoryDataset):
             obj_class_ids,
             use_instance_labels=use_instance_labels,
             use_instance_bboxes=use_instance_bboxes,
+            raw_cache_path=raw_cache_path,
         )
         if pre_transform:
             data = pre_transform(data)
@@ -608,6 +647,7 @@ class Scannet(InMemoryDataset):
                         self.VALID_CLASS_IDS,
                         self.use_instance_labels,
                         self.use_instance_bboxes,
+                        self.raw_cache_path(scan_name, {"version": self.version}),
                     )
                     for id, scan_name in enumerate(scan_names)
                 ]
@@ -620,7 +660,7 @@ class Scannet(InMemoryDataset):
                         data = Scannet.process_func(*arg)
                         datas.append(data)
                 log.info("SAVING TO {}".format(self.processed_paths[i]))
-                torch.save(self.collate(datas), self.processed_paths[i])
+                save_collated(self.collate(datas), self.processed_paths[i], memmap=self.use_memmap)
 
     def __repr__(self):
         return "{}({})".format(self.__class__.__name__, len(self))
@@ -645,6 +685,7 @@ class ScannetDataset(BaseDataset):
             use_instance_bboxes=use_instance_bboxes,
             donotcare_class_ids=donotcare_class_ids,
             max_num_point=max_num_point,
+            use_memmap=dataset_opt.get("memmap", False),
         )
 
         self.val_dataset = Scannet(
@@ -657,6 +698,7 @@ class ScannetDataset(BaseDataset):
             use_instance_bboxes=use_instance_bboxes,
             donotcare_class_ids=donotcare_class_ids,
             max_num_point=max_num_point,
+            use_memmap=dataset_opt.get("memmap", False),
         )
 
     @staticmethod
@@ -12,6 +12,7 @@ import torch_geometric.transforms as T
 from src.metrics.shapenet_part_tracker import ShapenetPartTracker
 
 from src.datasets.base_dataset import BaseDataset
+from src.datasets.memmap_storage import save_collated, load_collated
 
 
 class ShapeNet(InMemoryDataset):
@@ -103,6 +104,7 @@ class ShapeNet(InMemoryDataset):
         transform=None,
         pre_transform=None,
         pre_filter=None,
+        use_memmap=False,
     ):
         if categories is None:
             categories = list(self.category_ids.keys())
@@ -110,6 +112,7 @@ class ShapeNet(InMemoryDataset):
             categories = [categories]
         assert all(category in self.category_ids for category in categories)
         self.categories = categories
+        self.use_memmap = use_memmap
         super(ShapeNet, self).__init__(root, transform, pre_transform, pre_filter)
 
         if split == "train":
@@ -123,7 +126,7 @@ class ShapeNet(InMemoryDataset):
         else:
             raise ValueError((f"Split {split} found, but expected either " "train, val, trainval or test"))
 
-        self.data, self.slices = torch.load(path)
+        self.data, self.slices = load_collated(path, memmap=self.use_memmap)
         self.data.x = self.data.x if include_normals else None
 
         self.y_mask = torch.zeros((len(self.seg_classes.keys()), 50), dtype=torch.bool)
@@ -182,8 +185,8 @@ class ShapeNet(InMemoryDataset):
             data_list = self.process_filenames(filenames)
             if split == "train" or split == "val":
                 trainval += data_list
-            torch.save(self.collate(data_list), self.processed_paths[i])
-        torch.save(self.collate(trainval), self.processed_paths[3])
+            save_collated(self.collate(data_list), self.processed_paths[i], memmap=self.use_memmap)
+        save_collated(self.collate(trainval), self.processed_paths[3], memmap=self.use_memmap)
 
     def __repr__(self):
         return "{}({}, categories={})".format(self.__class__.__name__, len(self), self.categories)
@@ -207,6 +210,7 @@ class ShapeNetDataset(BaseDataset):
             split="trainval",
             pre_transform=pre_transform,
             transform=train_transform,
+            use_memmap=dataset_opt.get("memmap", False),
         )
 
         self.test_dataset = ShapeNet(
@@ -216,6 +220,7 @@ class ShapeNetDataset(BaseDataset):
             split="test",
             transform=self.test_transform,
             pre_transform=pre_transform,
+            use_memmap=dataset_opt.get("memmap", False),
         )
         self._categories = self.train_dataset.categories
 
@@ -0,0 +1,201 @@
+import os
+import logging
+import numpy as np
+
+from src.core.spatial_ops.voxel_search import _build_grid, _knn_query, _radius_all
+
+log = logging.getLogger(__name__)
+
+# Columns concatenated over all the clouds of a store, see SpatialIndexStore
+_POINT_COLUMNS = ["sorted_pos", "order"]
+_TABLE_COLUMNS = ["table_keys", "table_start", "table_end"]
+
+
+def default_voxel_size(pos, points_per_voxel=128):
+    """ Voxels holding about points_per_voxel points if the points were spread uniformly in the bounding box
+    """
+    if pos.shape[0] == 0:
+        return 1.0
+    extent = pos.max(0) - pos.min(0)
+    extent = np.maximum(extent, max(extent.max(), 1e-6) / 100.0)  # flat clouds
+    return float(max((np.prod(extent) * points_per_voxel / pos.shape[0]) ** (1 / 3.0), extent.max() / 2 ** 20))
+
+
+class VoxelGridIndex:
+    """ Voxel hash grid index of a single cloud, exposing the queries of ``sklearn.neighbors.KDTree``
+    used by :class:`RandomSphere` and :class:`GridSphereSampling`. Its arrays can be views of memory mapped files.
+    """
+
+    def __init__(self, voxel_size, sorted_pos, order, table_keys, table_start, table_end, low, high):
+        self.voxel_size = voxel_size
+        self.sorted_pos = sorted_pos
+        self.order = order
+        self.table_keys = table_keys
+        self.table_start = table_start
+        self.table_end = table_end
+        self.low = low
+        self.high = high
+
+    @classmethod
+    def build(cls, pos, voxel_size=None):
+        pos = np.ascontiguousarray(pos)
+        voxel_size = voxel_size or default_voxel_size(pos)
+        return cls(voxel_size, *_build_grid(pos, voxel_size))
+
+    @property
+    def num_points(self):
+        return self.sorted_pos.shape[0]
+
+    def query(self, X, k=1, return_distance=True):
+        """ k closest points of each point of X, closest first. Returns (dist, ind) like ``KDTree.query``
+        """
+        X = np.ascontiguousarray(X, dtype=self.sorted_pos.dtype)
+        ind = np.full((X.shape[0], k), -1, dtype=np.int64)
+        dist = np.full((X.shape[0], k), -1, dtype=X.dtype)
+        if self.num_points > 0:
+            _knn_query(
+                X,
+                0,
+                X.shape[0],
+                self.voxel_size,
+                self.low,
+                self.high,
+                self.sorted_pos,
+                self.order,
+                self.table_keys,
+                self.table_start,
+                self.table_end,
+                ind,
+                dist,
+            )
+        if return_distance:
+            return np.sqrt(dist), ind
+        return ind
+
+    def query_radius(self, X, r):
+        """ Points within r of each point of X, in no particular order. Returns an array of index arrays
+        like ``KDTree.query_radius``
+        """
+        X = np.ascontiguousarray(X, dtype=self.sorted_pos.dtype)
+        ptr = np.zeros(X.shape[0] + 1, dtype=np.int64)
+        args = (
+            X,
+            self.voxel_size,
+            float(r),
+            self.sorted_pos,
+            self.order,
+            self.table_keys,
+            self.table_start,
+            self.table_end,
+            self.low,
+            self.high,
+        )
+        if self.num_points > 0:
+            _radius_all(*args, ptr, np.empty(0, dtype=np.int64))
+            ptr = np.cumsum(ptr)
+            out = np.empty(ptr[-1], dtype=np.int64)
+            _radius_all(*args, ptr, out)
+        else:
+            out = np.empty(0, dtype=np.int64)
+        ind = np.empty(X.shape[0], dtype=object)
+        for i in range(X.shape[0]):
+            ind[i] = out[ptr[i] : ptr[i + 1]]
+        return ind
+
+
+class SpatialIndexStore:
+    """ Spatial indices (:class:`VoxelGridIndex`) of a set of clouds identified by an integer id, stored in the
+    directory ``path`` as ``.npy`` columns concatenated over all the clouds and a table of the offsets of each
+    cloud. The columns are memory mapped lazily by each process: DataLoader workers share them through the
+    page cache and only the path is pickled when the dataset is sent to the workers.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._columns = None
+        self._clouds = None
+
+    @staticmethod
+    def exists(path):
+        return os.path.exists(os.path.join(path, "clouds.npy"))
+
+    @staticmethod
+    def save(path, clouds, points_per_voxel=128):
+        """ Builds and saves the indices of clouds
+
+        Parameters
+        ----------
+        path: str
+            Directory of the store
+        clouds: Iterable[Tuple[int, np.ndarray]]
+            Id and [N, 3] positions of each cloud
+        """
+        os.makedirs(path, exist_ok=True)
+        columns = {name: [] for name in _POINT_COLUMNS + _TABLE_COLUMNS}
+        table, voxel_sizes = [], []
+        point_offset, table_offset = 0, 0
+        for cloud_id, pos in clouds:
+            pos = np.ascontiguousarray(pos)
+            voxel_size = default_voxel_size(pos, points_per_voxel)
+            index = VoxelGridIndex.build(pos, voxel_size)
+            for name in _POINT_COLUMNS + _TABLE_COLUMNS:
+                columns[name].append(getattr(index, name))
+            num_points, table_size = pos.shape[0], index.table_keys.shape[0]
+            table.append(
+                [cloud_id, point_offset, num_points, table_offset, table_size]
+                + index.low.tolist()
+                + index.high.tolist()
+            )
+            voxel_sizes.append(voxel_size)
+            point_offset += num_points
+            table_offset += table_size
+
+        for name in _POINT_COLUMNS + _TABLE_COLUMNS:
+            np.save(os.path.join(path, "{}.npy".format(name)), np.concatenate(columns[name]))
+        np.save(os.path.join(path, "voxel_size.npy"), np.asarray(voxel_sizes, dtype=np.float64))
+        # Written last, marks the store as complete
+        np.save(os.path.join(path, "clouds.npy"), np.asarray(table, dtype=np.int64).reshape(-1, 11))
+
+    def _load(self):
+        if self._columns is None:
+            self._columns = {
+                name: np.load(os.path.join(self.path, "{}.npy".format(name)), mmap_mode="r")
+                for name in _POINT_COLUMNS + _TABLE_COLUMNS
+            }
+            table = np.load(os.path.join(self.path, "clouds.npy"))
+            voxel_size = np.load(os.path.join(self.path, "voxel_size.npy"))
+            self._clouds = {int(row[0]): (row, float(size)) for row, size in zip(table, voxel_size)}
+        return self._columns
+
+    def __contains__(self, cloud_id):
+        self._load()
+        return int(cloud_id) in self._clouds
+
+    def __len__(self):
+        self._load()
+        return len(self._clouds)
+
+    def __getitem__(self, cloud_id):
+        """ Index of the cloud cloud_id, made of views of the memory mapped columns
+        """
+        columns = self._load()
+        row, voxel_size = self._clouds[int(cloud_id)]
+        point_offset, num_points, table_offset, table_size = row[1:5]
+        points = slice(point_offset, point_offset + num_points)
+        tables = slice(table_offset, table_offset + table_size)
+        return VoxelGridIndex(
+            voxel_size,
+            columns["sorted_pos"][points],
+            columns["order"][points],
+            columns["table_keys"][tables],
+            columns["table_start"][tables],
+            columns["table_end"][tables],
+            row[5:8].copy(),
+            row[8:11].copy(),
+        )
+
+    def __getstate__(self):
+        return {"path": self.path, "_columns": None, "_clouds": None}
+
+    def __repr__(self):
+        return "{}(path={})".format(self.__class__.__name__, self.path)
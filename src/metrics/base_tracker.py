@@ -8,6 +8,7 @@ import logging
 
 from src.metrics.confusion_matrix import ConfusionMatrix
 from src.models.base_model import BaseModel
+from src.utils.timer import PROFILER
 
 log = logging.getLogger(__name__)
 
@@ -32,6 +33,7 @@ class BaseTracker:
     def reset(self, stage="train"):
         self._stage = stage
         self._loss_meters = {}
+        self._timing_meters = {}
 
     def get_metrics(self, verbose=False) -> Dict[str, float]:
         metrics = {}
@@ -45,6 +47,27 @@ class BaseTracker:
         losses = self._convert(model.get_current_losses())
         self._append_losses(losses)
 
+    def track_timing(self, **timings):
+        """ Tracks the time in seconds spent in the different steps of an iteration (waiting for data for example).
+        Timings are published along with the metrics but are not used for selecting the best models
+        """
+        for key, value in timings.items():
+            if key not in self._timing_meters:
+                self._timing_meters[key] = tnt.meter.AverageValueMeter()
+            self._timing_meters[key].add(value)
+
+    def get_timings(self) -> Dict[str, float]:
+        return {"%s_%s" % (self._stage, key): meter_value(meter) for key, meter in self._timing_meters.items()}
+
+    def get_profiling(self) -> Dict[str, float]:
+        """ Statistics of the profiled scopes since the last call, empty if profiling is disabled
+        """
+        if not PROFILER.enabled:
+            return {}
+        scalars = {"%s_%s" % (self._stage, key): value for key, value in PROFILER.get_scalars().items()}
+        PROFILER.reset_stats()
+        return scalars
+
     def _append_losses(self, losses):
         for key, loss in losses.items():
             if loss is None:
@@ -79,12 +102,13 @@ class BaseTracker:
             step: current epoch
         """
         metrics = self.get_metrics()
+        logged_metrics = {**metrics, **self.get_timings(), **self.get_profiling()}
 
         if self._wandb:
-            wandb.log(metrics, step=step)
+            wandb.log(logged_metrics, step=step)
 
         if self._use_tensorboard:
-            self.publish_to_tensorboard(metrics, step)
+            self.publish_to_tensorboard(logged_metrics, step)
 
         return {
             "stage": self._stage,
@@ -0,0 +1,222 @@
+import os
+import copy
+import atexit
+import shutil
+import hashlib
+import logging
+import threading
+import queue
+import collections
+import torch
+
+from src.utils.file_utils import atomic_write
+
+log = logging.getLogger(__name__)
+
+
+def snapshot(obj):
+    """ Returns a copy of a (nested) state dict in which all tensors are detached and copied on cpu.
+    The copy can be written to disk in the background while the training keeps updating the original tensors in place
+    """
+    if torch.is_tensor(obj):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, dict):
+        out = collections.OrderedDict() if isinstance(obj, collections.OrderedDict) else {}
+        for key, value in obj.items():
+            out[key] = snapshot(value)
+        if hasattr(obj, "_metadata"):
+            out._metadata = copy.deepcopy(obj._metadata)
+        return out
+    if isinstance(obj, list):
+        return [snapshot(value) for value in obj]
+    if isinstance(obj, tuple):
+        return tuple(snapshot(value) for value in obj)
+    return copy.deepcopy(obj)
+
+
+def _update_hash(hasher, obj):
+    if torch.is_tensor(obj):
+        obj = obj.detach().cpu().contiguous()
+        hasher.update("tensor{}{}".format(obj.dtype, tuple(obj.shape)).encode())
+        hasher.update(obj.numpy().tobytes())
+    elif isinstance(obj, dict):
+        hasher.update("dict{}".format(len(obj)).encode())
+        for key in sorted(obj.keys(), key=str):
+            hasher.update(repr(key).encode())
+            _update_hash(hasher, obj[key])
+    elif isinstance(obj, (list, tuple)):
+        hasher.update("list{}".format(len(obj)).encode())
+        for value in obj:
+            _update_hash(hasher, value)
+    else:
+        hasher.update(repr(obj).encode())
+
+
+def hash_object(obj) -> str:
+    """ Content hash of a (nested) state dict, two state dicts holding the same values share the same hash
+    """
+    hasher = hashlib.sha1()
+    _update_hash(hasher, obj)
+    return hasher.hexdigest()
+
+
+def atomic_save(obj, path):
+    """ Saves obj with torch.save, a crash never leaves a partially written file at path
+    """
+    atomic_write(path, lambda f: torch.save(obj, f))
+
+
+class BlobStore:
+    """ Content addressed store, each object is saved in ``root/<hash>.pt``
+    """
+
+    def __init__(self, root):
+        self._root = root
+
+    @property
+    def root(self):
+        return self._root
+
+    def path(self, key):
+        return os.path.join(self._root, "{}.pt".format(key))
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def keys(self):
+        if not os.path.exists(self._root):
+            return []
+        return [f[:-3] for f in os.listdir(self._root) if f.endswith(".pt")]
+
+    def write(self, key, obj):
+        os.makedirs(self._root, exist_ok=True)
+        atomic_save(obj, self.path(key))
+
+    def read(self, key):
+        return torch.load(self.path(key), map_location="cpu")
+
+    def import_blob(self, key, other):
+        """ Adds the blob ``key`` of another store, hard linked when possible. Blobs are content addressed,
+        an existing blob already holds the same content
+        """
+        os.makedirs(self._root, exist_ok=True)
+        if self.exists(key):
+            return
+        try:
+            os.link(other.path(key), self.path(key))
+        except FileExistsError:
+            pass
+        except OSError:
+            with open(other.path(key), "rb") as source:
+                atomic_write(self.path(key), lambda f: shutil.copyfileobj(source, f))
+
+    def remove_unreferenced(self, referenced):
+        for key in self.keys():
+            if key not in referenced:
+                os.remove(self.path(key))
+
+    def __eq__(self, other):
+        return isinstance(other, BlobStore) and os.path.realpath(self._root) == os.path.realpath(other._root)
+
+    def __repr__(self):
+        return "{}(root={})".format(self.__class__.__name__, self._root)
+
+
+class Blob:
+    """ Reference to a state dict of a checkpoint. A blob either holds a snapshot that has not been written yet
+    or the key of the blob within a store, the state dict is then only read from disk when it is needed.
+    """
+
+    def __init__(self, value=None, key=None, store=None):
+        self.value = value
+        self.key = key
+        self.store = store
+
+    def get(self):
+        value = self.value
+        if value is None:
+            value = self.store.read(self.key)
+        return value
+
+    def write(self, store: BlobStore):
+        """ Makes sure that the blob is in store and releases the in memory snapshot
+        """
+        value = self.value
+        if value is not None:
+            key = hash_object(value)
+            if not store.exists(key):
+                store.write(key, value)
+        else:
+            key = self.key
+            if not store.exists(key):
+                store.import_blob(key, self.store)
+        self.key, self.store = key, store
+        self.value = None
+        return key
+
+
+class AsyncWriter:
+    """ Runs the submitted jobs one after the other on a background thread.
+    An exception raised by a job is re-raised by the next call to ``submit`` or ``flush``
+
+    Parameters
+    ----------
+    name: str, optional
+        Name of the thread
+    max_pending: int, optional
+        Maximum number of jobs waiting for the thread, ``submit`` blocks until a job is done when it is reached.
+        Unbounded if 0
+    """
+
+    def __init__(self, name="async_writer", max_pending=0):
+        self._queue = queue.Queue(max_pending)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if self._error is None:
+                    job()
+            except Exception as e:
+                log.error("{} failed: {}".format(self._thread.name, e))
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def submit(self, job):
+        self._raise_error()
+        self._queue.put(job)
+
+    def flush(self):
+        """ Waits until all the submitted jobs are done
+        """
+        self._queue.join()
+        self._raise_error()
+
+
+_WRITER = None
+_WRITER_LOCK = threading.Lock()
+
+
+def get_writer() -> AsyncWriter:
+    global _WRITER
+    with _WRITER_LOCK:
+        if _WRITER is None:
+            _WRITER = AsyncWriter(name="checkpoint_writer")
+            atexit.register(_WRITER.flush)
+    return _WRITER
+
+
+def flush_writer():
+    """ Waits for all the pending checkpoint writes
+    """
+    if _WRITER is not None:
+        _WRITER.flush()
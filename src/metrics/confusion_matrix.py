@@ -1,15 +1,19 @@
 import numpy as np
-import sklearn.metrics as sk
+import torch
 import os
 
 
 class ConfusionMatrix:
     """Streaming interface to allow for any source of predictions. 
-    Initialize it, count predictions one by one, then print confusion matrix and intersection-union score"""
+    Initialize it, count predictions one by one, then print confusion matrix and intersection-union score.
+    Counts are accumulated on the device of the predictions, the matrix is only moved to the host
+    when one of the metrics is requested"""
 
     def __init__(self, number_of_labels=2):
         self.number_of_labels = number_of_labels
-        self.confusion_matrix = None
+        self._counts = None
+        self._num_invalid_predictions = None
+        self._confusion_matrix = None
 
     @staticmethod
     def create_from_matrix(confusion_matrix):
@@ -18,13 +22,52 @@ class ConfusionMatrix:
         matrix.confusion_matrix = confusion_matrix
         return matrix
 
+    @property
+    def confusion_matrix(self):
+        """ Numpy version of the matrix, None if no prediction has been counted yet
+        """
+        if self._confusion_matrix is None and self._counts is not None:
+            if self._num_invalid_predictions is not None:
+                num_invalid = int(self._num_invalid_predictions)
+                assert num_invalid == 0, "{} predicted labels are not in [0, number_of_labels)".format(num_invalid)
+            self._confusion_matrix = self._counts.cpu().numpy()
+        return self._confusion_matrix
+
+    @confusion_matrix.setter
+    def confusion_matrix(self, confusion_matrix):
+        self._counts = torch.as_tensor(confusion_matrix, dtype=torch.long)
+        self._num_invalid_predictions = None
+        self._confusion_matrix = None
+
     def count_predicted_batch(self, ground_truth_vec, predicted):
-        assert np.max(predicted) < self.number_of_labels
-        batch_confusion = sk.confusion_matrix(ground_truth_vec, predicted, labels=range(self.number_of_labels))
-        if self.confusion_matrix is None:
-            self.confusion_matrix = batch_confusion
+        """ Adds a batch of predictions to the matrix, ground truth labels outside of [0, number_of_labels) are ignored.
+        Nothing is read back from the device, predicted labels outside of [0, number_of_labels) are counted apart
+        and raise an AssertionError when the matrix is moved to the host
+
+        Arguments:
+            ground_truth_vec -- [N] labels (torch.Tensor or np.ndarray)
+            predicted -- [N] predicted labels, on the same device as ground_truth_vec
+        """
+        ground_truth_vec = torch.as_tensor(ground_truth_vec).long().view(-1)
+        predicted = torch.as_tensor(predicted, device=ground_truth_vec.device).long().view(-1)
+
+        # Ignored ground truth labels go to an extra cell and invalid predictions to another one
+        num_cells = self.number_of_labels ** 2
+        cells = ground_truth_vec * self.number_of_labels + predicted
+        cells = cells.masked_fill((ground_truth_vec < 0) | (ground_truth_vec >= self.number_of_labels), num_cells)
+        cells = cells.masked_fill((predicted < 0) | (predicted >= self.number_of_labels), num_cells + 1)
+        batch_counts = torch.bincount(cells, minlength=num_cells + 2)
+        batch_confusion = batch_counts[:num_cells].view(self.number_of_labels, self.number_of_labels)
+        batch_invalid = batch_counts[num_cells + 1]
+        if self._counts is None:
+            self._counts = batch_confusion
         else:
-            self.confusion_matrix += batch_confusion
+            self._counts = self._counts.to(batch_confusion.device) + batch_confusion
+        if self._num_invalid_predictions is None:
+            self._num_invalid_predictions = batch_invalid
+        else:
+            self._num_invalid_predictions = self._num_invalid_predictions.to(batch_invalid.device) + batch_invalid
+        self._confusion_matrix = None
 
     def get_count(self, ground_truth, predicted):
         """labels are integers from 0 to number_of_labels-1"""
@@ -35,15 +78,21 @@ class ConfusionMatrix:
             to know how many samples of class ground_truth were reported as class predicted"""
         return self.confusion_matrix
 
+    def _get_matrix_or_zeros(self):
+        if self.confusion_matrix is None:
+            return np.zeros((self.number_of_labels, self.number_of_labels), dtype=np.int64)
+        return self.confusion_matrix
+
     def get_intersection_union_per_class(self):
         """ Computes the intersection over union of each class in the 
         confusion matrix
         Return:
             (iou, missing_class_mask) - iou for class as well as a mask highlighting existing classes
         """
-        TP_plus_FN = np.sum(self.confusion_matrix, axis=0)
-        TP_plus_FP = np.sum(self.confusion_matrix, axis=1)
-        TP = np.diagonal(self.confusion_matrix)
+        confusion_matrix = self._get_matrix_or_zeros()
+        TP_plus_FN = np.sum(confusion_matrix, axis=0)
+        TP_plus_FP = np.sum(confusion_matrix, axis=1)
+        TP = np.diagonal(confusion_matrix)
         union = TP_plus_FN + TP_plus_FP - TP
         iou = 1e-8 + TP / (union + 1e-8)
         existing_class_mask = union != 0
@@ -51,17 +100,11 @@ class ConfusionMatrix:
 
     def get_overall_accuracy(self):
         """returns 64-bit float"""
-        confusion_matrix = self.confusion_matrix
-        matrix_diagonal = 0
-        all_values = 0
-        for row in range(self.number_of_labels):
-            for column in range(self.number_of_labels):
-                all_values += confusion_matrix[row][column]
-                if row == column:
-                    matrix_diagonal += confusion_matrix[row][column]
+        confusion_matrix = self._get_matrix_or_zeros()
+        all_values = confusion_matrix.sum()
         if all_values == 0:
             all_values = 1
-        return float(matrix_diagonal) / all_values
+        return float(np.trace(confusion_matrix)) / all_values
 
     def get_average_intersection_union(self, missing_as_one=False):
         """ Get the mIoU metric by ignoring missing labels. 
@@ -76,16 +119,12 @@ class ConfusionMatrix:
         return np.sum(values[existing_classes_mask]) / np.sum(existing_classes_mask)
 
     def get_mean_class_accuracy(self):  # added
-        re = 0
-        label_presents = 0
-        for i in range(self.number_of_labels):
-            total_gt = np.sum(self.confusion_matrix[i, :])
-            if total_gt:
-                label_presents += 1
-                re = re + self.confusion_matrix[i][i] / max(1, total_gt)
-        if label_presents == 0:
+        confusion_matrix = self._get_matrix_or_zeros()
+        total_gt = np.sum(confusion_matrix, axis=1)
+        label_presents = total_gt > 0
+        if not np.any(label_presents):
             return 0
-        return re / label_presents
+        return np.mean(np.diagonal(confusion_matrix)[label_presents] / total_gt[label_presents])
 
     def count_gt(self, ground_truth):
         return self.confusion_matrix[ground_truth, :].sum()
@@ -3,13 +3,13 @@ import torch
 import logging
 import copy
 import glob
-import shutil
 from omegaconf import OmegaConf, DictConfig
 from src.models.base_model import BaseModel
 from src.utils.colors import COLORS, colored_print
 from src.core.schedulers.lr_schedulers import instantiate_scheduler
 from src.core.schedulers.bn_schedulers import instantiate_bn_scheduler
 from src.models.model_factory import instantiate_model
+from src.metrics.checkpoint_store import BlobStore, Blob, snapshot, atomic_save, get_writer, flush_writer
 
 log = logging.getLogger(__name__)
 
@@ -26,11 +26,16 @@ class Checkpoint:
 
     def __init__(self, checkpoint_file: str, save_every_iter: bool = True):
         """ Checkpoint manager. Saves to working directory with check_name
+        The checkpoint file is a small index (config, stats, schedulers) that references the state dicts of the models
+        and of the optimizer. Those are saved as content addressed blobs in [checkpoint_file].blobs, a blob is
+        only written when its content changed. Writes happen on a background thread.
+
         Arguments
             checkpoint_file {str} -- Path to the checkpoint
             save_every_iter {bool} -- [description] (default: {True})
         """
         self._check_path = checkpoint_file
+        self._store = BlobStore(Checkpoint._blobs_dir(checkpoint_file))
         self._filled = False
         self.run_config = None
         self.models = {}
@@ -38,28 +43,65 @@ class Checkpoint:
         self.optimizer = None
         self.schedulers = {}
 
+    @staticmethod
+    def _blobs_dir(checkpoint_file):
+        return "{}.blobs".format(checkpoint_file)
+
+    @staticmethod
+    def _as_blob(value, store=None):
+        """ Models and optimizer state dicts are either blob keys (blob store format) or state dicts (legacy format)
+        """
+        if isinstance(value, Blob):
+            return value
+        if isinstance(value, str):
+            return Blob(key=value, store=store)
+        return Blob(value=value)
+
     def save_objects(self, models_to_save, stage, current_stat, optimizer, schedulers, **kwargs):
         """ Saves checkpoint with updated mdoels for the given stage
+        The state dicts are copied on cpu before returning, they are then written in the background
         """
-        self.models = models_to_save
+        snapshots = {}  # the same state dict is often saved under several names, only copy it once
+        models = {}
+        for name, state in models_to_save.items():
+            if not isinstance(state, (Blob, str)):
+                if id(state) not in snapshots:
+                    snapshots[id(state)] = Blob(value=snapshot(state))
+                state = snapshots[id(state)]
+            models[name] = self._as_blob(state, self._store)
+        self.models = models
         self.stats[stage].append(current_stat)
-        self.optimizer = [optimizer.__class__.__name__, optimizer.state_dict()]
+        self.optimizer = [optimizer.__class__.__name__, Blob(value=snapshot(optimizer.state_dict()))]
         self.schedulers = {
-            scheduler_name: [scheduler.scheduler_opt, scheduler.state_dict()]
+            scheduler_name: [scheduler.scheduler_opt, snapshot(scheduler.state_dict())]
             for scheduler_name, scheduler in schedulers.items()
         }
 
         to_save = kwargs
         for key, value in self.__dict__.items():
             if not key.startswith("_"):
-                to_save[key] = value
-        torch.save(to_save, self._check_path)
+                to_save[key] = value if key in ["models", "optimizer"] else copy.deepcopy(value)
+        to_save["models"] = dict(self.models)
+        to_save["optimizer"] = list(self.optimizer)
+        get_writer().submit(lambda: self._write(to_save))
+
+    def _write(self, to_save):
+        """ Writes the blobs that are not in the store yet and then the index, so that the index on disk
+        always references complete blobs. Blobs that are not referenced anymore are removed.
+        """
+        to_save["models"] = {name: blob.write(self._store) for name, blob in to_save["models"].items()}
+        to_save["optimizer"][1] = to_save["optimizer"][1].write(self._store)
+        atomic_save(to_save, self._check_path)
+        self._store.remove_unreferenced(set(to_save["models"].values()) | {to_save["optimizer"][1]})
 
     @staticmethod
     def load(checkpoint_dir: str, checkpoint_name: str, run_config: DictConfig, strict=False):
         """ Creates a new checkpoint object in the current working directory by loading the
         checkpoint located at [checkpointdir]/[checkpoint_name].pt
+        Only the index is read, state dicts are read from the blobs of the original checkpoint when they are requested
+        and the blobs that are still used are imported in the new checkpoint on its first save
         """
+        flush_writer()
         checkpoint_file = os.path.join(checkpoint_dir, checkpoint_name) + ".pt"
         if not os.path.exists(checkpoint_file):
             ckp = Checkpoint(checkpoint_file)
@@ -75,14 +117,15 @@ class Checkpoint:
             return ckp
         else:
             chkp_name = os.path.basename(checkpoint_file)
-            shutil.copyfile(
-                checkpoint_file, chkp_name
-            )  # Copy checkpoint to new run directory to make sure we don't override
             ckp = Checkpoint(chkp_name)
             log.info("Loading checkpoint from {}".format(checkpoint_file))
             objects = torch.load(checkpoint_file, map_location="cpu")
             for key, value in objects.items():
                 setattr(ckp, key, value)
+            source = BlobStore(Checkpoint._blobs_dir(checkpoint_file))
+            ckp.models = {name: Checkpoint._as_blob(value, source) for name, value in ckp.models.items()}
+            if ckp.optimizer is not None:
+                ckp.optimizer = [ckp.optimizer[0], Checkpoint._as_blob(ckp.optimizer[1], source)]
             ckp._filled = True
         return ckp
 
@@ -96,7 +139,7 @@ class Checkpoint:
                 optimizer_config = self.optimizer
                 optimizer_cls = getattr(torch.optim, optimizer_config[0])
                 optimizer = optimizer_cls(model.parameters())
-                optimizer.load_state_dict(optimizer_config[1])
+                optimizer.load_state_dict(optimizer_config[1].get())
                 return optimizer
             except:
                 raise KeyError("The checkpoint doesn t contain an optimizer")
@@ -131,16 +174,15 @@ class Checkpoint:
                 log.info("Available weights : {}".format(keys))
                 try:
                     key_name = "best_{}".format(weight_name)
-                    model = models[key_name]
-                    log.info("Model loaded from {}:{}".format(self._check_path, key_name))
-                    return model
+                    blob = models[key_name]
                 except:
                     key_name = Checkpoint._LATEST
-                    model = models[Checkpoint._LATEST]
-                    log.info("Model loaded from {}:{}".format(self._check_path, key_name))
-                    return model
+                    blob = models[Checkpoint._LATEST]
             except:
                 raise Exception("This weight name isn't within the checkpoint ")
+            model = blob.get()
+            log.info("Model loaded from {}:{}".format(self._check_path, key_name))
+            return model
 
 
 class ModelCheckpoint(object):
@@ -0,0 +1,116 @@
+import os
+import logging
+import numpy as np
+import torch
+
+from src.metrics.checkpoint_store import AsyncWriter
+from src.utils.file_utils import atomic_write
+
+log = logging.getLogger(__name__)
+
+
+def _smallest_int_type(labels):
+    for dtype in [np.uint8, np.int16, np.int32]:
+        info = np.iinfo(dtype)
+        if labels.size == 0 or (labels.min() >= info.min and labels.max() <= info.max):
+            return dtype
+    return np.int64
+
+
+class PredictionWriter:
+    """ Writes the predictions of a forward run on a background thread, each sample is written as soon as its
+    predictions are complete. A file is written to a temporary path and then renamed, a file present in the output
+    folder is always complete which allows to resume an interrupted run.
+
+    Parameters
+    ----------
+    output_path: str
+        Output folder
+    output_format: str, optional
+        ``npy`` writes ``{name}_pred.npy`` with the positions and the label of each point (N x 4).
+        ``compact`` writes ``{name}_pred.npz`` with the labels only, stored with the smallest integer type
+    save_probabilities: bool, optional
+        Also writes the probability of each class as float16 (``compact`` format only)
+    max_pending: int, optional
+        Maximum number of samples waiting to be written, :meth:`write` blocks when it is reached so that the
+        predictions do not pile up in memory when the inference is faster than the disk
+    """
+
+    FORMATS = {"npy": ".npy", "compact": ".npz"}
+
+    def __init__(self, output_path, output_format="npy", save_probabilities=False, max_pending=4):
+        if output_format not in self.FORMATS:
+            raise ValueError("Unknown output format {}, choose one of {}".format(output_format, list(self.FORMATS)))
+        if save_probabilities and output_format != "compact":
+            raise ValueError("Probabilities can only be saved with the compact output format")
+        self.output_path = output_path
+        self.output_format = output_format
+        self.save_probabilities = save_probabilities
+        self._writer = AsyncWriter(name="prediction_writer", max_pending=max_pending)
+        os.makedirs(output_path, exist_ok=True)
+
+    def path(self, name):
+        return os.path.join(self.output_path, os.path.splitext(name)[0] + "_pred" + self.FORMATS[self.output_format])
+
+    def is_done(self, name):
+        """ True if the predictions of the sample have already been written
+        """
+        return os.path.exists(self.path(name))
+
+    def write(self, name, prediction, probabilities=None):
+        """ Queues the predictions of a sample
+
+        Parameters
+        ----------
+        name: str
+            Name of the sample (file name of the input)
+        prediction: np.ndarray
+            Positions and label of each point (N x 4)
+        probabilities: torch.Tensor or np.ndarray, optional
+            Probability of each class for each point (N x C)
+        """
+        if torch.is_tensor(probabilities):
+            probabilities = probabilities.detach().cpu().numpy()
+        if probabilities is not None:
+            probabilities = probabilities.astype(np.float16)
+        self._writer.submit(lambda: self._save(self.path(name), prediction, probabilities))
+
+    def _save(self, path, prediction, probabilities):
+        if self.output_format == "npy":
+            atomic_write(path, lambda f: np.save(f, prediction))
+            return
+        labels = prediction[:, -1]
+        arrays = {"labels": labels.astype(_smallest_int_type(labels))}
+        if self.save_probabilities and probabilities is not None:
+            arrays["probabilities"] = probabilities
+        atomic_write(path, lambda f: np.savez(f, **arrays))
+
+    def close(self):
+        """ Waits until all the predictions are written
+        """
+        self._writer.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        return False
+
+
+class RemainingSamples(torch.utils.data.Subset):
+    """ Samples of a forward dataset whose predictions have not been written yet, attributes of the wrapped
+    dataset (``get_raw``, ``get_filename`` ...) are still accessible. Items are loaded with their original
+    index so that the ``sampleid`` stored in the data refers to the wrapped dataset
+    """
+
+    def __init__(self, dataset, writer: PredictionWriter):
+        indices = [i for i in range(len(dataset)) if not writer.is_done(dataset.get_filename(i))]
+        super().__init__(dataset, indices)
+        if len(indices) < len(dataset):
+            log.info("Resuming forward run, %i samples out of %i left", len(indices), len(dataset))
+
+    def __getattr__(self, name):
+        if name == "dataset":
+            raise AttributeError(name)
+        return getattr(self.dataset, name)
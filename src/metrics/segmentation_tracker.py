@@ -1,5 +1,6 @@
 from typing import Dict
 import torchnet as tnt
+import torch
 import numpy as np
 
 from src.models.base_model import BaseModel
@@ -23,47 +24,56 @@ class SegmentationTracker(BaseTracker):
         """
         super(SegmentationTracker, self).__init__(stage, wandb_log, use_tensorboard)
         self._num_classes = dataset.num_classes
-        self._ignore_label = -100
+        self._ignore_label = ignore_label
         self.reset(stage)
 
     def reset(self, stage="train"):
         super().reset(stage=stage)
         self._confusion_matrix = ConfusionMatrix(self._num_classes)
+        self._metrics = None
 
     @property
     def confusion_matrix(self):
         return self._confusion_matrix.confusion_matrix
 
     def track(self, model: BaseModel):
-        """ Add current model predictions (usually the result of a batch) to the tracking
+        """ Add current model predictions (usually the result of a batch) to the tracking.
+        The predictions are accumulated on the device of the model, metrics are computed only when requested.
         """
         super().track(model)
 
-        outputs = self._convert(model.get_output())
-        targets = self._convert(model.get_labels())
+        outputs = model.get_output()
+        targets = model.get_labels()
+        if not torch.is_tensor(outputs):
+            outputs = torch.from_numpy(np.asarray(outputs))
+        targets = torch.as_tensor(targets, device=outputs.device)
+        assert outputs.shape[0] == len(targets)
 
         # Mask ignored label
         mask = targets != self._ignore_label
-        outputs = outputs[mask]
-        targets = targets[mask]
-
-        if len(targets) == 0:
-            return
-
-        assert outputs.shape[0] == len(targets)
-        self._confusion_matrix.count_predicted_batch(targets, np.argmax(outputs, 1))
+        self._confusion_matrix.count_predicted_batch(targets[mask], outputs.detach().argmax(1)[mask])
+        self._metrics = None
 
-        self._acc = 100 * self._confusion_matrix.get_overall_accuracy()
-        self._macc = 100 * self._confusion_matrix.get_mean_class_accuracy()
-        self._miou = 100 * self._confusion_matrix.get_average_intersection_union()
+    def _compute_metrics(self):
+        self._metrics = {
+            "acc": 100 * self._confusion_matrix.get_overall_accuracy(),
+            "macc": 100 * self._confusion_matrix.get_mean_class_accuracy(),
+            "miou": 100 * self._confusion_matrix.get_average_intersection_union(),
+        }
 
     def get_metrics(self, verbose=False) -> Dict[str, float]:
         """ Returns a dictionnary of all metrics and losses being tracked
         """
         metrics = super().get_metrics(verbose)
 
-        metrics["{}_acc".format(self._stage)] = self._acc
-        metrics["{}_macc".format(self._stage)] = self._macc
-        metrics["{}_miou".format(self._stage)] = self._miou
+        if self._metrics is None:
+            self._compute_metrics()
+        for name, value in self._metrics.items():
+            metrics["{}_{}".format(self._stage, name)] = value
+        if verbose:
+            ious, existing_classes = self._confusion_matrix.get_intersection_union_per_class()
+            metrics["{}_iou_per_class".format(self._stage)] = {
+                i: 100 * iou for i, iou in enumerate(ious) if existing_classes[i]
+            }
 
         return metrics
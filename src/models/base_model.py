@@ -13,6 +13,7 @@ from src.core.regularizer import *
 from src.core.losses import instantiate_loss_or_miner
 from src.utils.config import is_dict
 from src.utils.colors import colored_print, COLORS
+from src.utils.timer import profile_scope
 
 log = logging.getLogger(__name__)
 
@@ -143,15 +144,18 @@ class BaseModel(torch.nn.Module):
         """Calculate losses, gradients, and update network weights; called in every training iteration"""
         self._iterations += batch_size
 
-        self.forward()  # first call forward to calculate intermediate results
+        with profile_scope("forward"):
+            self.forward()  # first call forward to calculate intermediate results
         make_optimizer_step = self.manage_optimizer_zero_grad()  # Accumulate gradient if option is up
-        self.backward()  # calculate gradients
+        with profile_scope("backward"):
+            self.backward()  # calculate gradients
 
         if self._grad_clip > 0:
             torch.nn.utils.clip_grad_value_(self.parameters(), self._grad_clip)
 
         if make_optimizer_step:
-            self._optimizer.step()  # update parameters
+            with profile_scope("optimizer_step"):
+                self._optimizer.step()  # update parameters
 
         if self._lr_scheduler:
             self._lr_scheduler.step(epoch)
@@ -34,6 +34,7 @@ class SimpleBlock(BaseModule):
         bn=FastBatchNorm1d,
         deformable=False,
         add_one=False,
+        memory_budget=None,
         **kwargs,
     ):
         super(SimpleBlock, self).__init__()
@@ -42,11 +43,21 @@ class SimpleBlock(BaseModule):
         if deformable:
             density_parameter = self.DEFORMABLE_DENSITY
             self.kp_conv = KPConvDeformableLayer(
-                num_inputs, num_outputs, point_influence=prev_grid_size * sigma, add_one=add_one
+                num_inputs,
+                num_outputs,
+                point_influence=prev_grid_size * sigma,
+                add_one=add_one,
+                memory_budget=memory_budget,
             )
         else:
             density_parameter = self.RIGID_DENSITY
-            self.kp_conv = KPConvLayer(num_inputs, num_outputs, point_influence=prev_grid_size * sigma, add_one=add_one)
+            self.kp_conv = KPConvLayer(
+                num_inputs,
+                num_outputs,
+                point_influence=prev_grid_size * sigma,
+                add_one=add_one,
+                memory_budget=memory_budget,
+            )
         search_radius = density_parameter * sigma * prev_grid_size
         self.neighbour_finder = RadiusNeighbourFinder(search_radius, max_num_neighbors, conv_type=self.CONV_TYPE)
 
@@ -112,6 +123,8 @@ class ResnetBBlock(BaseModule):
         grid_size : size of the grid,
         prev_grid_size : size of the grid at previous step.
                         In case of a strided block, this is different than grid_size
+        memory_budget : memory budget in bytes of the KPConv intermediate tensors, query points are processed by chunks
+                        when it is set
     """
 
     CONV_TYPE = ConvolutionFormat.PARTIAL_DENSE.value
@@ -129,6 +142,7 @@ class ResnetBBlock(BaseModule):
         bn=FastBatchNorm1d,
         deformable=False,
         add_one=False,
+        memory_budget=None,
         **kwargs,
     ):
         super(ResnetBBlock, self).__init__()
@@ -158,6 +172,7 @@ class ResnetBBlock(BaseModule):
             bn=bn,
             deformable=deformable,
             add_one=add_one,
+            memory_budget=memory_budget,
         )
 
         if self.has_bottleneck:
@@ -234,6 +249,7 @@ class KPDualBlock(BaseModule):
         max_num_neighbors: Max number of neighboors for the radius search,
         deformable: Is deformable,
         add_one: Add one as a feature,
+        memory_budget: Memory budget in bytes of the KPConv intermediate tensors, query points are processed by chunks,
     """
 
     def __init__(
@@ -3,6 +3,7 @@
 # Adaption from https://github.com/humanpose1/KPConvTorch/
 
 import torch
+from torch.utils.checkpoint import checkpoint
 
 
 def gather(x, idx, method=2):
@@ -14,7 +15,9 @@ def gather(x, idx, method=2):
     :param method: Choice of the method
     :return: x[idx] with shape [n_1, ..., n_m, D_1, ... D_d]
     """
-    idx[idx == -1] = x.shape[0] - 1  # Shadow point
+    shadow = idx == -1
+    if shadow.any():  # no in place update otherwise, idx can be an input saved for the backward pass
+        idx[shadow] = x.shape[0] - 1  # Shadow point
     if method == 0:
         return x[idx]
     elif method == 1:
@@ -50,6 +53,78 @@ def radius_gaussian(sq_r, sig, eps=1e-9):
     return torch.exp(-sq_r / (2 * sig ** 2 + eps))
 
 
+def get_chunk_size(n_points, n_neighbors, n_kpoints, dim, in_fdim, out_fdim, memory_budget, element_size=4):
+    """
+    Number of query points that can be processed at once so that the intermediate tensors of a KPConv
+    ([n_points, n_neighbors, n_kpoints, dim] differences, distances and influence weights, gathered features
+    and kernel outputs) fit within memory_budget
+    :param memory_budget: memory budget in bytes, None means no limit
+    :param element_size: size in bytes of one element
+    :return: chunk size in [1, n_points]
+    """
+    if memory_budget is None:
+        return n_points
+    per_point = n_neighbors * n_kpoints * (dim + 3) + n_neighbors * (dim + in_fdim) + n_kpoints * (in_fdim + out_fdim)
+    return int(max(1, min(n_points, memory_budget // (per_point * element_size))))
+
+
+def apply_by_chunks(function, chunk_size, chunked_inputs, shared_inputs):
+    """
+    Applies function to slices of chunk_size query points and concatenates the outputs.
+    When gradients are required each chunk is checkpointed: its intermediate tensors are freed
+    once the forward pass of the chunk is done and recomputed during the backward pass.
+    :param function: function(*chunked_inputs, *shared_inputs) -> Tensor or tuple of Tensors of size [n_points, ...]
+    :param chunked_inputs: list of [n_points, ...] tensors (or None) that are sliced along the first dimension
+    :param shared_inputs: list of inputs that are passed unchanged to every chunk
+    """
+    n_points = chunked_inputs[0].shape[0]
+    if chunk_size >= n_points:
+        return function(*chunked_inputs, *shared_inputs)
+
+    tensors = [t for t in list(chunked_inputs) + list(shared_inputs) if torch.is_tensor(t)]
+    use_checkpoint = torch.is_grad_enabled() and any([t.requires_grad for t in tensors])
+    # Outputs are preallocated, keeping small per chunk outputs alive between the large
+    # temporary allocations of the next chunks fragments the cpu heap
+    outputs = None
+    for start in range(0, n_points, chunk_size):
+        inputs = [t[start : start + chunk_size] if t is not None else None for t in chunked_inputs]
+        inputs += list(shared_inputs)
+        if use_checkpoint:
+            chunk_outputs = checkpoint(function, *inputs, preserve_rng_state=False)
+        else:
+            chunk_outputs = function(*inputs)
+        is_tuple = isinstance(chunk_outputs, tuple)
+        if not is_tuple:
+            chunk_outputs = (chunk_outputs,)
+        if outputs is None:
+            outputs = [o.new_empty((n_points,) + tuple(o.shape[1:])) for o in chunk_outputs]
+        for output, chunk_output in zip(outputs, chunk_outputs):
+            output[start : start + chunk_size] = chunk_output
+        del chunk_outputs
+    return tuple(outputs) if is_tuple else outputs[0]
+
+
+def add_shadow(support_points, features):
+    """
+    Adds a fake point in the last row of the support points for shadow neighbors, it is far from everything
+    and its features are zeros
+    """
+    shadow_point = torch.ones_like(support_points[:1, :]) * 1e6
+    support_points = torch.cat([support_points, shadow_point], dim=0)
+    features = torch.cat([features, torch.zeros_like(features[:1, :])], dim=0)
+    return support_points, features
+
+
+def resolve_shadow_neighbors(neighbors_indices, shadow_ind):
+    """
+    Replaces the -1 entries of neighbors_indices by the index of the shadow point
+    """
+    shadow = neighbors_indices == -1
+    if shadow.any():
+        neighbors_indices = neighbors_indices.masked_fill(shadow, shadow_ind)
+    return neighbors_indices
+
+
 def KPConv_ops(
     query_points,
     support_points,
@@ -60,6 +135,7 @@ def KPConv_ops(
     KP_extent,
     KP_influence,
     aggregation_mode,
+    memory_budget=None,
 ):
     """
     This function creates a graph of operations to define Kernel Point Convolution in tensorflow. See KPConv function
@@ -73,18 +149,68 @@ def KPConv_ops(
     :param KP_extent: float32 - influence radius of each kernel point
     :param KP_influence: string in ('constant', 'linear', 'gaussian') - influence function of the kernel points
     :param aggregation_mode: string in ('closest', 'sum') - whether to sum influences, or only keep the closest
+    :param memory_budget: int - if not None, query points are processed by chunks whose intermediate tensors
+    fit within memory_budget bytes
     :return:                    [n_points, out_fdim]
     """
-
+    support_points, features = add_shadow(support_points, features)
+    # Shadow neighbors are resolved once, chunks must not be modified in place during the forward pass
+    neighbors_indices = resolve_shadow_neighbors(neighbors_indices, support_points.shape[0] - 1)
+    chunk_size = get_chunk_size(
+        query_points.shape[0],
+        neighbors_indices.shape[1],
+        K_points.shape[0],
+        query_points.shape[1],
+        features.shape[1],
+        K_values.shape[2],
+        memory_budget,
+        element_size=features.element_size(),
+    )
+
+    # The backward of the expand + gather method allocates a [n0_points, n_neighbors, in_fdim] tensor whatever
+    # the number of query points, chunks use plain indexing whose backward only scatters into [n0_points, in_fdim]
+    gather_method = 2 if chunk_size >= query_points.shape[0] else 0
+
+    def conv(query_points, neighbors_indices, support_points, features, K_points, K_values):
+        return _KPConv_ops(
+            query_points,
+            support_points,
+            neighbors_indices,
+            features,
+            K_points,
+            K_values,
+            KP_extent,
+            KP_influence,
+            aggregation_mode,
+            gather_method=gather_method,
+        )
+
+    return apply_by_chunks(
+        conv, chunk_size, [query_points, neighbors_indices], [support_points, features, K_points, K_values]
+    )
+
+
+def _KPConv_ops(
+    query_points,
+    support_points,
+    neighbors_indices,
+    features,
+    K_points,
+    K_values,
+    KP_extent,
+    KP_influence,
+    aggregation_mode,
+    gather_method=2,
+):
+    """
+    Kernel Point Convolution of query_points, support_points and features already contain the shadow point
+    (see add_shadow)
+    """
     # Get variables
     int(K_points.shape[0])
 
-    # Add a fake point in the last row for shadow neighbors
-    shadow_point = torch.ones_like(support_points[:1, :]) * 1e6
-    support_points = torch.cat([support_points, shadow_point], dim=0)
-
     # Get neighbor points [n_points, n_neighbors, dim]
-    neighbors = gather(support_points, neighbors_indices)
+    neighbors = gather(support_points, neighbors_indices, method=gather_method)
 
     # Center every neighborhood
     neighbors = neighbors - query_points.unsqueeze(1)
@@ -123,10 +249,8 @@ def KPConv_ops(
     elif aggregation_mode != "sum":
         raise ValueError("Unknown convolution mode. Should be 'closest' or 'sum'")
 
-    features = torch.cat([features, torch.zeros_like(features[:1, :])], dim=0)
-
     # Get the features of each neighborhood [n_points, n_neighbors, in_fdim]
-    neighborhood_features = gather(features, neighbors_indices)
+    neighborhood_features = gather(features, neighbors_indices, method=gather_method)
 
     # Apply distance weights [n_points, n_kpoints, in_fdim]
     weighted_features = torch.matmul(all_weights, neighborhood_features)
@@ -153,6 +277,7 @@ def KPConv_deform_ops(
     KP_extent,
     KP_influence,
     aggregation_mode,
+    memory_budget=None,
 ):
     """
     This function creates a graph of operations to define Deformable Kernel Point Convolution in tensorflow. See
@@ -168,17 +293,73 @@ def KPConv_deform_ops(
     :param KP_extent:           float32
     :param KP_influence:        string
     :param aggregation_mode:    string in ('closest', 'sum') - whether to sum influences, or only keep the closest
+    :param memory_budget:       int - if not None, query points are processed by chunks whose intermediate tensors
+    fit within memory_budget bytes. The square distances are then only returned for the closest neighbor
+    of each kernel point [n_points, 1, n_kpoints], which is all the fitting loss needs
 
     :return features, square_distances, deformed_K_points
     """
-
+    support_points, features = add_shadow(support_points, features)
+    # Shadow neighbors are resolved once, chunks must not be modified in place during the forward pass
+    neighbors_indices = resolve_shadow_neighbors(neighbors_indices, support_points.shape[0] - 1)
+    chunk_size = get_chunk_size(
+        query_points.shape[0],
+        neighbors_indices.shape[1],
+        K_points.shape[0],
+        query_points.shape[1],
+        features.shape[1],
+        K_values.shape[2],
+        memory_budget,
+        element_size=features.element_size(),
+    )
+    reduce_sq_distances = chunk_size < query_points.shape[0]
+
+    def conv(query_points, neighbors_indices, offsets, modulations, support_points, features, K_points, K_values):
+        output_features, sq_distances, deformed_K_points = _KPConv_deform_ops(
+            query_points,
+            support_points,
+            neighbors_indices,
+            features,
+            K_points,
+            offsets,
+            modulations,
+            K_values,
+            KP_extent,
+            KP_influence,
+            aggregation_mode,
+        )
+        if reduce_sq_distances:
+            sq_distances = sq_distances.min(dim=1, keepdim=True)[0]
+        return output_features, sq_distances, deformed_K_points
+
+    return apply_by_chunks(
+        conv,
+        chunk_size,
+        [query_points, neighbors_indices, offsets, modulations],
+        [support_points, features, K_points, K_values],
+    )
+
+
+def _KPConv_deform_ops(
+    query_points,
+    support_points,
+    neighbors_indices,
+    features,
+    K_points,
+    offsets,
+    modulations,
+    K_values,
+    KP_extent,
+    KP_influence,
+    aggregation_mode,
+):
+    """
+    Deformable Kernel Point Convolution of query_points, support_points and features already contain the shadow point
+    (see add_shadow)
+    """
     # Get variables
     n_kp = int(K_points.shape[0])
-    shadow_ind = support_points.shape[0]
-
-    # Add a fake point in the last row for shadow neighbors
-    shadow_point = torch.ones_like(support_points[:1, :]) * 1e6
-    support_points = torch.cat([support_points, shadow_point], axis=0)
+    shadow_ind = support_points.shape[0] - 1
 
     # Get neighbor points [n_points, n_neighbors, dim]
     neighbors = support_points[neighbors_indices]
@@ -245,8 +426,6 @@ def KPConv_deform_ops(
     elif aggregation_mode != "sum":
         raise ValueError("Unknown convolution mode. Should be 'closest' or 'sum'")
 
-    features = torch.cat([features, torch.zeros_like(features[:1, :])], axis=0)
-
     # Get the features of each neighborhood [n_points, new_max_neighb, in_fdim]
     neighborhood_features = features[new_neighbors_indices]
 
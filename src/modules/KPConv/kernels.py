@@ -30,6 +30,8 @@ class KPConvLayer(torch.nn.Module):
     KP_influence="linear"
     aggregation_mode="sum"
     dimension=3
+    memory_budget=None : if set, query points are processed by chunks whose intermediate tensors fit
+                         within memory_budget bytes
     """
 
     _INFLUENCE_TO_RADIUS = 1.5
@@ -45,6 +47,7 @@ class KPConvLayer(torch.nn.Module):
         aggregation_mode="sum",
         dimension=3,
         add_one=False,
+        memory_budget=None,
     ):
         super(KPConvLayer, self).__init__()
         self.kernel_radius = self._INFLUENCE_TO_RADIUS * point_influence
@@ -56,6 +59,7 @@ class KPConvLayer(torch.nn.Module):
         self.KP_influence = KP_influence
         self.n_kernel_points = n_kernel_points
         self.aggregation_mode = aggregation_mode
+        self.memory_budget = memory_budget
 
         # Initial kernel extent for this layer
         K_points_numpy = load_kernels(
@@ -89,6 +93,7 @@ class KPConvLayer(torch.nn.Module):
             self.point_influence,
             self.KP_influence,
             self.aggregation_mode,
+            memory_budget=self.memory_budget,
         )
         return new_feat
 
@@ -117,6 +122,8 @@ class KPConvDeformableLayer(torch.nn.Module, BaseInternalLossModule):
     aggregation_mode="sum"
     dimension=3
     modulated = False :   If deformable conv should be modulated
+    memory_budget=None : if set, query points are processed by chunks whose intermediate tensors fit
+                         within memory_budget bytes
     """
 
     PERMISSIVE_LOSS_KEY = "permissive_loss"
@@ -138,6 +145,7 @@ class KPConvDeformableLayer(torch.nn.Module, BaseInternalLossModule):
         modulated=False,
         loss_mode="fitting",
         add_one=False,
+        memory_budget=None,
     ):
         super(KPConvDeformableLayer, self).__init__()
         self.kernel_radius = self._INFLUENCE_TO_RADIUS * point_influence
@@ -150,6 +158,7 @@ class KPConvDeformableLayer(torch.nn.Module, BaseInternalLossModule):
         self.n_kernel_points = n_kernel_points
         self.aggregation_mode = aggregation_mode
         self.modulated = modulated
+        self.memory_budget = memory_budget
         self.internal_losses = {self.PERMISSIVE_LOSS_KEY: 0.0, self.FITTING_LOSS_KEY: 0.0, self.REPULSION_LOSS_KEY: 0.0}
         self.loss_mode = loss_mode
 
@@ -197,6 +206,7 @@ class KPConvDeformableLayer(torch.nn.Module, BaseInternalLossModule):
                 self.point_influence,
                 self.KP_influence,
                 self.aggregation_mode,
+                memory_budget=self.memory_budget,
             )
             + self.offset_bias
         )
@@ -228,6 +238,7 @@ class KPConvDeformableLayer(torch.nn.Module, BaseInternalLossModule):
             self.point_influence,
             self.KP_influence,
             self.aggregation_mode,
+            memory_budget=self.memory_budget,
         )
 
         if self.loss_mode == "fitting":
@@ -116,13 +116,14 @@ class RSConvSharedMSGDown(BaseDenseConvolutionDown):
         bn=True,
         use_xyz=True,
         activation=nn.ReLU(),
+        nested=False,
         **kwargs
     ):
         assert len(radii) == len(nsample)
         if len(radii) != len(down_conv_nn):
             log.warn("The down_conv_nn has a different size as radii. Make sure of have sharedMLP")
         super(RSConvSharedMSGDown, self).__init__(
-            DenseFPSSampler(num_to_sample=npoint), DenseRadiusNeighbourFinder(radii, nsample), **kwargs
+            DenseFPSSampler(num_to_sample=npoint), DenseRadiusNeighbourFinder(radii, nsample, nested=nested), **kwargs
         )
 
         self.use_xyz = use_xyz
@@ -271,13 +272,14 @@ class RSConvOriginalMSGDown(BaseDenseConvolutionDown):
         bias=True,
         use_xyz=True,
         activation=nn.ReLU(),
+        nested=False,
         **kwargs
     ):
         assert len(radii) == len(nsample)
         if len(radii) != len(down_conv_nn):
             log.warning("The down_conv_nn has a different size as radii. Make sure of have sharedMLP")
         super(RSConvOriginalMSGDown, self).__init__(
-            DenseFPSSampler(num_to_sample=npoint), DenseRadiusNeighbourFinder(radii, nsample), **kwargs
+            DenseFPSSampler(num_to_sample=npoint), DenseRadiusNeighbourFinder(radii, nsample, nested=nested), **kwargs
         )
 
         self.use_xyz = use_xyz
@@ -410,13 +412,14 @@ class RSConvMSGDown(BaseDenseConvolutionDown):
         bias=True,
         use_xyz=True,
         activation=nn.ReLU(),
+        nested=False,
         **kwargs
     ):
         assert len(radii) == len(nsample)
         if len(radii) != len(down_conv_nn):
             log.warning("The down_conv_nn has a different size as radii. Make sure to have sharedMLP")
         super(RSConvMSGDown, self).__init__(
-            DenseFPSSampler(num_to_sample=npoint), DenseRadiusNeighbourFinder(radii, nsample), **kwargs
+            DenseFPSSampler(num_to_sample=npoint), DenseRadiusNeighbourFinder(radii, nsample, nested=nested), **kwargs
         )
 
         self.use_xyz = use_xyz
@@ -19,11 +19,12 @@ class PointNetMSGDown(BaseDenseConvolutionDown):
         bn=True,
         activation="LeakyReLU",
         use_xyz=True,
+        nested=False,
         **kwargs
     ):
         assert len(radii) == len(nsample) == len(down_conv_nn)
         super(PointNetMSGDown, self).__init__(
-            DenseFPSSampler(num_to_sample=npoint), DenseRadiusNeighbourFinder(radii, nsample), **kwargs
+            DenseFPSSampler(num_to_sample=npoint), DenseRadiusNeighbourFinder(radii, nsample, nested=nested), **kwargs
         )
         self.use_xyz = use_xyz
         self.npoint = npoint
@@ -12,7 +12,9 @@ class SAModule(BaseMSConvolutionDown):
     ):
         super(SAModule, self).__init__(
             FPSSampler(ratio=ratio),
-            MultiscaleRadiusNeighbourFinder(radius, max_num_neighbors=radius_num_point),
+            MultiscaleRadiusNeighbourFinder(
+                radius, max_num_neighbors=radius_num_point, nested=kwargs.get("nested", False)
+            ),
             *args,
             **kwargs
         )
@@ -1,6 +1,7 @@
 from .colors import *
 from .config import *
 from .enums import *
+from .file_utils import *
 from .running_stats import *
 from .timer import *
 from .transform_utils import *
@@ -0,0 +1,18 @@
+import os
+
+
+def atomic_write(path, write_fn):
+    """ Writes a file with ``write_fn(f)`` to a temporary file that is synced to disk and then renamed to path.
+    Other processes and threads reading path, or a crash, never see a partially written file.
+    """
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    try:
+        with open(tmp_path, "wb") as f:
+            write_fn(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
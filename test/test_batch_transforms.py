@@ -0,0 +1,93 @@
+import unittest
+import os
+import sys
+import torch
+from torch_geometric.data import Data, Batch
+import torch_geometric.transforms as T
+
+DIR_PATH = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(DIR_PATH, ".."))
+
+from src.core.data_transform import (
+    BatchRandomRotate,
+    BatchRandomScaleAnisotropic,
+    BatchRandomSymmetry,
+    BatchRandomNoise,
+    BatchRandomDropout,
+)
+from src.datasets.batch import SimpleBatch
+from src.datasets.base_dataset import BaseDataset
+
+
+class TestBatchTransforms(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        self.data_list = [Data(pos=torch.randn(50, 3), y=torch.arange(50) + 100 * i) for i in range(4)]
+
+    def dense(self):
+        return SimpleBatch.from_data_list([d.clone() for d in self.data_list])
+
+    def message_passing(self):
+        return Batch.from_data_list([d.clone() for d in self.data_list])
+
+    def test_formats_agree(self):
+        transforms = [
+            BatchRandomRotate(180, axis=2),
+            BatchRandomScaleAnisotropic([0.8, 1.2]),
+            BatchRandomSymmetry([True, False, True]),
+            BatchRandomNoise(0.01),
+        ]
+        for transform in transforms:
+            torch.manual_seed(1)
+            dense = transform(self.dense())
+            torch.manual_seed(1)
+            message_passing = transform(self.message_passing())
+            torch.testing.assert_allclose(dense.pos.view(-1, 3), message_passing.pos)
+
+    def test_rotate(self):
+        batch = BatchRandomRotate(180, axis=1)(self.message_passing())
+        pos = torch.cat([d.pos for d in self.data_list])
+        torch.testing.assert_allclose(batch.pos[:, 1], pos[:, 1])
+        self.assertFalse(torch.allclose(batch.pos, pos))
+
+        # Rigid transformation of each sample
+        for i in range(4):
+            rotated, original = batch.pos[batch.batch == i], pos[batch.batch == i]
+            torch.testing.assert_allclose(
+                (rotated.unsqueeze(0) - rotated.unsqueeze(1)).norm(dim=2),
+                (original.unsqueeze(0) - original.unsqueeze(1)).norm(dim=2),
+            )
+
+    def test_dropout(self):
+        batch = BatchRandomDropout(0.2, 1)(self.message_passing())
+        self.assertTrue(torch.equal(batch.batch.bincount(), torch.full((4,), 40, dtype=torch.long)))
+        pos = torch.cat([d.pos for d in self.data_list])
+        y = torch.cat([d.y for d in self.data_list])
+        for i in range(4):
+            idx = batch.y[batch.batch == i] - 100 * i
+            self.assertEqual(len(idx.unique()), 40)
+            self.assertTrue(torch.equal(batch.pos[batch.batch == i], self.data_list[i].pos[idx]))
+
+        batch = BatchRandomDropout(0.2, 0)(self.message_passing())
+        self.assertTrue(torch.equal(batch.pos, pos))
+        self.assertTrue(torch.equal(batch.y, y))
+
+        batch = BatchRandomDropout(0.2, 1)(self.dense())
+        self.assertEqual(batch.pos.shape, (4, 50, 3))
+        for i in range(4):
+            idx = batch.y[i] - 100 * i
+            self.assertEqual(len(idx.unique()), 40)
+            self.assertTrue(torch.equal(batch.pos[i], self.data_list[i].pos[idx]))
+
+    def test_collate(self):
+        collate = BaseDataset._apply_batch_transform(
+            Batch.from_data_list, T.Compose([BatchRandomDropout(0.5, 1), BatchRandomNoise(0.01)]), False
+        )
+        batch = collate(self.data_list)
+        self.assertEqual(batch.pos.shape, (100, 3))
+        with self.assertRaises(ValueError):
+            BaseDataset._apply_batch_transform(Batch.from_data_list, BatchRandomNoise(), True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+import os
+import sys
+import tempfile
+import threading
+import time
+import torch
+
+DIR_PATH = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(DIR_PATH, ".."))
+
+from src.metrics.checkpoint_store import BlobStore, Blob, AsyncWriter, snapshot, hash_object
+
+
+class TestCheckpointStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.model = torch.nn.Sequential(torch.nn.Linear(3, 4), torch.nn.BatchNorm1d(4))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_snapshot(self):
+        state_dict = self.model.state_dict()
+        copy = snapshot(state_dict)
+        self.assertEqual(hash_object(copy), hash_object(state_dict))
+        self.assertEqual(copy._metadata, state_dict._metadata)
+        with torch.no_grad():
+            self.model[0].weight.add_(1)
+        self.assertNotEqual(hash_object(copy), hash_object(self.model.state_dict()))
+
+    def test_blob_written_once(self):
+        store = BlobStore(os.path.join(self.tmp.name, "blobs"))
+        key = Blob(value=snapshot(self.model.state_dict())).write(store)
+        mtime = os.path.getmtime(store.path(key))
+        blob = Blob(value=snapshot(self.model.state_dict()))
+        self.assertEqual(blob.write(store), key)
+        self.assertEqual(os.path.getmtime(store.path(key)), mtime)
+        self.assertIsNone(blob.value)
+        for k, v in blob.get().items():
+            self.assertTrue(torch.equal(v, self.model.state_dict()[k]))
+
+    def test_import_and_cleanup(self):
+        source = BlobStore(os.path.join(self.tmp.name, "source"))
+        key = Blob(value=snapshot(self.model.state_dict())).write(source)
+        store = BlobStore(os.path.join(self.tmp.name, "blobs"))
+        Blob(key=key, store=source).write(store)
+        self.assertEqual(store.keys(), [key])
+        store.remove_unreferenced(set())
+        self.assertEqual(store.keys(), [])
+
+    def test_writer_error(self):
+        writer = AsyncWriter()
+        done = []
+
+        def fail():
+            raise RuntimeError("disk full")
+
+        writer.submit(lambda: done.append(1))
+        writer.submit(fail)
+        with self.assertRaises(RuntimeError):
+            writer.flush()
+        writer.submit(lambda: done.append(2))
+        writer.flush()
+        self.assertEqual(done, [1, 2])
+
+    def test_writer_max_pending(self):
+        writer = AsyncWriter(max_pending=1)
+        release = threading.Event()
+        writer.submit(release.wait)
+        while not writer._queue.empty():  # the thread takes the first job
+            time.sleep(0.01)
+        writer.submit(lambda: None)
+
+        blocked = threading.Thread(target=writer.submit, args=(lambda: None,))
+        blocked.start()
+        blocked.join(0.1)
+        self.assertTrue(blocked.is_alive())
+        release.set()
+        blocked.join(5)
+        self.assertFalse(blocked.is_alive())
+        writer.flush()
+
+
+if __name__ == "__main__":
+    unittest.main()
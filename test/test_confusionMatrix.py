@@ -7,6 +7,7 @@ import tempfile
 import h5py
 import numpy.testing as npt
 import numpy.matlib
+import torch
 
 DIR_PATH = os.path.dirname(os.path.realpath(__file__))
 sys.path.insert(0, os.path.join(DIR_PATH, ".."))
@@ -41,6 +42,24 @@ class TestConfusionMatrix(unittest.TestCase):
         self.assertAlmostEqual(iou[0], 4 / (4.0 + 1.0 + 2.0))
         self.assertAlmostEqual(iou[1], 10 / (10.0 + 1.0 + 2.0))
 
+    def test_countPredictedBatch(self):
+        confusion = ConfusionMatrix(3)
+        confusion.count_predicted_batch(np.asarray([0, 0, 1, 2, -1]), np.asarray([0, 1, 1, 0, 2]))
+        confusion.count_predicted_batch(torch.tensor([2, 2]), torch.tensor([2, 2]))
+        npt.assert_array_equal(confusion.get_confusion_matrix(), np.asarray([[1, 1, 0], [0, 1, 0], [1, 0, 2]]))
+        self.assertAlmostEqual(confusion.get_overall_accuracy(), 4 / 6.0)
+        self.assertAlmostEqual(confusion.get_mean_class_accuracy(), (0.5 + 1 + 2 / 3.0) / 3)
+
+        confusion.count_predicted_batch(torch.tensor([0, -1]), torch.tensor([3, -1]))
+        with self.assertRaises(AssertionError):
+            confusion.get_confusion_matrix()
+
+    def test_emptyMatrix(self):
+        confusion = ConfusionMatrix(3)
+        self.assertEqual(confusion.get_overall_accuracy(), 0)
+        self.assertEqual(confusion.get_mean_class_accuracy(), 0)
+        self.assertEqual(confusion.get_average_intersection_union(), 0)
+
     def test_test_getMeanIoUMissing(self):
         matrix = np.asarray([[1, 1, 0], [0, 1, 0], [0, 0, 0]])
         confusion = ConfusionMatrix.create_from_matrix(matrix)
@@ -0,0 +1,73 @@
+import unittest
+import os
+import sys
+import torch
+from torch.utils.data import Dataset
+
+DIR_PATH = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(DIR_PATH, ".."))
+
+from src.datasets.dataloader import PersistentDataLoader, BatchStager
+
+
+class RangeDataset(Dataset):
+    def __init__(self, size, fail_at=None):
+        self.size = size
+        self.fail_at = fail_at
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, idx):
+        if idx == self.fail_at:
+            raise ValueError("corrupted sample")
+        return {"pos": torch.tensor([float(idx)]), "y": torch.tensor(idx)}
+
+
+def epoch_indices(loader):
+    return sorted(torch.cat([batch["y"] for batch in loader]).tolist())
+
+
+class TestPersistentDataLoader(unittest.TestCase):
+    def test_epochs(self):
+        loader = PersistentDataLoader(RangeDataset(10), batch_size=3, shuffle=True, num_workers=2)
+        self.assertEqual(len(loader), 4)
+        self.assertEqual(epoch_indices(loader), list(range(10)))
+        iterator = loader._persistent_iterator
+        self.assertEqual(epoch_indices(loader), list(range(10)))
+        self.assertIs(loader._persistent_iterator, iterator)
+
+    def test_interrupted_epoch(self):
+        loader = PersistentDataLoader(RangeDataset(10), batch_size=3, num_workers=2)
+        for _ in loader:
+            break
+        self.assertEqual(epoch_indices(loader), list(range(10)))
+
+
+class TestBatchStager(unittest.TestCase):
+    def test_staging(self):
+        loader = torch.utils.data.DataLoader(RangeDataset(10), batch_size=4, num_workers=1)
+        stager = BatchStager(loader, device="cpu", prefetch=2)
+        self.assertEqual(len(stager), 3)
+        self.assertIs(stager.dataset, loader.dataset)
+        self.assertEqual(stager.batch_size, 4)
+        for _ in range(2):
+            self.assertEqual(epoch_indices(stager), list(range(10)))
+        self.assertGreaterEqual(stager.wait_time, stager.last_wait_time)
+
+    def test_interrupted_epoch(self):
+        loader = PersistentDataLoader(RangeDataset(10), batch_size=3, num_workers=2)
+        stager = BatchStager(loader, prefetch=3)
+        for _ in stager:
+            break
+        self.assertEqual(epoch_indices(stager), list(range(10)))
+
+    def test_error(self):
+        loader = torch.utils.data.DataLoader(RangeDataset(10, fail_at=5), batch_size=2)
+        with self.assertRaises(ValueError):
+            for _ in BatchStager(loader):
+                pass
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,10 +1,13 @@
 import torch
 import numpy as np
 from torch_geometric.nn import fps
+import torch_points_kernels as tp
 import unittest
 import logging
 
 from test import run_if_cuda
+from src.core.spatial_ops import FPSSampler, DenseFPSSampler
+from src.core.spatial_ops.fps import FurthestPointSampling, coverage_radius
 
 log = logging.getLogger(__name__)
 
@@ -28,5 +31,54 @@ class TestPytorchClusterFPS(unittest.TestCase):
         ), "Your Pytorch Cluster FPS doesn't seem to return the correct value. It shouldn't be used to perform sampling"
 
 
+def reference_fps(pos, num_to_sample):
+    idx = [0]
+    dist = ((pos - pos[0]) ** 2).sum(-1)
+    for _ in range(num_to_sample - 1):
+        idx.append(int(dist.argmax()))
+        dist = torch.min(dist, ((pos - pos[idx[-1]]) ** 2).sum(-1))
+    return torch.tensor(idx)
+
+
+class TestFurthestPointSampling(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        self.pos = torch.rand(2000, 3) + 1
+        self.batch = torch.cat([torch.zeros(800), torch.ones(1200)]).long()
+
+    def test_exact(self):
+        idx = FurthestPointSampling(num_threads=2).sample(self.pos, 0.25, self.batch)
+        self.assertEqual(idx.shape[0], 500)
+        self.assertTrue(torch.equal(idx[:200], reference_fps(self.pos[:800], 200)))
+        self.assertTrue(torch.equal(idx[200:], reference_fps(self.pos[800:], 300) + 800))
+        self.assertTrue(torch.equal(idx, fps(self.pos, self.batch, 0.25, random_start=False)))
+
+        idx = DenseFPSSampler(num_to_sample=64)(self.pos.view(2, 1000, 3))
+        self.assertEqual(idx.shape, (2, 64))
+        self.assertTrue(torch.equal(idx[1], reference_fps(self.pos[1000:], 64)))
+
+    @run_if_cuda
+    def test_exact_cuda(self):
+        pos = self.pos.view(4, 500, 3)
+        idx = FurthestPointSampling().sample_dense(pos, 100)
+        self.assertTrue(torch.equal(idx, tp.furthest_point_sample(pos.cuda(), 100).long().cpu()))
+
+    def test_random_start(self):
+        idx = FPSSampler(ratio=0.1)(self.pos, batch=self.batch)
+        self.assertEqual(idx.shape[0], 200)
+        self.assertTrue(bool((self.batch[idx[:80]] == 0).all() and (self.batch[idx[80:]] == 1).all()))
+        self.assertEqual(len(idx.unique()), 200)
+
+    def test_approximate(self):
+        pos = torch.rand(20000, 3)
+        exact = FurthestPointSampling().sample_dense(pos.unsqueeze(0), 100)
+        approximate = FurthestPointSampling(approximate=True).sample_dense(pos.unsqueeze(0), 100)
+        self.assertEqual(len(approximate.unique()), 100)
+        exact_radius = coverage_radius(pos.unsqueeze(0), exact)
+        self.assertLess(float(coverage_radius(pos.unsqueeze(0), approximate)), 1.5 * float(exact_radius))
+        sq_dist = ((pos - pos[exact[0]].unsqueeze(1)) ** 2).sum(-1)
+        self.assertAlmostEqual(float(exact_radius), float(sq_dist.min(0)[0].max().sqrt()), places=5)
+
+
 if __name__ == "__main__":
     unittest.main()
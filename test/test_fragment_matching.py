@@ -0,0 +1,67 @@
+import unittest
+import os
+import sys
+import tempfile
+import numpy as np
+import numpy.testing as npt
+import torch
+from torch_geometric.data import Data
+
+DIR_PATH = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(DIR_PATH, ".."))
+
+from src.datasets.registration.matching import (
+    FragmentMatcher,
+    MatchCheckpoint,
+    compute_bounding_boxes,
+    get_candidate_pairs,
+)
+from src.datasets.registration.utils import compute_overlap_and_matches
+
+
+class TestFragmentMatching(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        torch.manual_seed(0)
+        grid = torch.stack(torch.meshgrid(torch.arange(10.0), torch.arange(10.0), torch.arange(2.0)), -1)
+        grid = grid.view(-1, 3) * 0.1
+        list_pos = [grid, grid + torch.tensor([0.5, 0, 0]), grid + torch.tensor([10.0, 0, 0])]
+        self.paths = []
+        for i, pos in enumerate(list_pos):
+            path = os.path.join(self.tmp.name, "fragment_{:06d}.pt".format(i))
+            torch.save(Data(pos=pos), path)
+            self.paths.append(path)
+        self.out_dir = os.path.join(self.tmp.name, "matches")
+        os.makedirs(self.out_dir)
+        self.checkpoint_path = os.path.join(self.tmp.name, "checkpoint.jsonl")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_candidate_pairs(self):
+        bboxes = compute_bounding_boxes([torch.load(p).pos for p in self.paths])
+        self.assertEqual(get_candidate_pairs(bboxes, 0.01), [(0, 1)])
+
+    def test_matches(self):
+        matcher = FragmentMatcher(self.out_dir, self.checkpoint_path, 0.01, 0.3, 1.0)
+        matcher("scene/seq", self.paths)
+        self.assertEqual(os.listdir(self.out_dir), ["matches000000.npy"])
+        match = np.load(os.path.join(self.out_dir, "matches000000.npy"), allow_pickle=True).item()
+        expected = compute_overlap_and_matches(self.paths[0], self.paths[1], 0.01)
+        self.assertEqual(match["path_source"], expected["path_source"])
+        self.assertEqual(match["path_target"], expected["path_target"])
+        npt.assert_almost_equal(match["overlap"], expected["overlap"])
+        npt.assert_array_equal(match["pair"], expected["pair"])
+
+    def test_resume(self):
+        checkpoint = MatchCheckpoint(self.checkpoint_path)
+        checkpoint.add("scene/seq", (0, 1), 0)
+        matcher = FragmentMatcher(self.out_dir, self.checkpoint_path, 0.01, 0.3, 1.0)
+        self.assertEqual(matcher.checkpoint.next_index, 1)
+        matcher("scene/seq", self.paths)
+        # The pair has been computed by the previous run
+        self.assertEqual(len(os.listdir(self.out_dir)), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -9,6 +9,7 @@ ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
 sys.path.insert(0, ROOT)
 
 from src.modules.KPConv.losses import repulsion_loss, fitting_loss, permissive_loss
+from src.modules.KPConv.convolution_ops import KPConv_ops, KPConv_deform_ops, get_chunk_size
 
 
 class TestKPConvLosses(unittest.TestCase):
@@ -39,5 +40,75 @@ class TestKPConvLosses(unittest.TestCase):
         npt.assert_almost_equal(loss, 4 * np.sum(arr_), decimal=3)
 
 
+class TestKPConvChunked(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        self.n_support, self.n_query, self.n_neighbors, self.n_kp = 200, 150, 12, 15
+        self.support = torch.rand(self.n_support, 3)
+        self.query = self.support[: self.n_query]
+        self.neighbors = torch.randint(-1, self.n_support + 1, (self.n_query, self.n_neighbors))
+        self.K_points = torch.rand(self.n_kp, 3) * 0.2 - 0.1
+        self.features = torch.rand(self.n_support, 8)
+        self.K_values = torch.rand(self.n_kp, 8, 16)
+        self.offsets = torch.rand(self.n_query, self.n_kp, 3) * 0.05
+        self.modulations = torch.rand(self.n_query, self.n_kp)
+        self.memory_budget = 20000
+        self.assertLess(get_chunk_size(self.n_query, self.n_neighbors, self.n_kp, 3, 8, 16, self.memory_budget), 10)
+
+    def _leaves(self, *tensors):
+        return [t.clone().requires_grad_() for t in tensors]
+
+    def test_rigid(self):
+        for influence in ["constant", "linear", "gaussian"]:
+            results = []
+            for memory_budget in [None, self.memory_budget]:
+                features, K_values = self._leaves(self.features, self.K_values)
+                output = KPConv_ops(
+                    self.query,
+                    self.support,
+                    self.neighbors.clone(),
+                    features,
+                    self.K_points,
+                    K_values,
+                    0.1,
+                    influence,
+                    "sum",
+                    memory_budget=memory_budget,
+                )
+                output.sum().backward()
+                results.append([output.detach(), features.grad, K_values.grad])
+            for ref, chunked in zip(*results):
+                torch.testing.assert_allclose(chunked, ref, rtol=1e-5, atol=1e-5)
+
+    def test_deformable(self):
+        results = []
+        for memory_budget in [None, self.memory_budget]:
+            features, K_values, offsets, modulations = self._leaves(
+                self.features, self.K_values, self.offsets, self.modulations
+            )
+            output, sq_distances, deformed_K_points = KPConv_deform_ops(
+                self.query,
+                self.support,
+                self.neighbors.clone(),
+                features,
+                self.K_points,
+                offsets,
+                modulations,
+                K_values,
+                0.1,
+                "linear",
+                "sum",
+                memory_budget=memory_budget,
+            )
+            fitting = fitting_loss(sq_distances, 0.15)
+            (output.sum() + fitting + deformed_K_points.sum()).backward()
+            results.append(
+                [output.detach(), fitting.detach(), features.grad, K_values.grad, offsets.grad, modulations.grad]
+            )
+        self.assertEqual(sq_distances.shape, (self.n_query, 1, self.n_kp))
+        for ref, chunked in zip(*results):
+            torch.testing.assert_allclose(chunked, ref, rtol=1e-5, atol=1e-5)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+import os
+import sys
+import tempfile
+import numpy.testing as npt
+import torch
+from torch_geometric.data import Data, InMemoryDataset
+
+DIR_PATH = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(DIR_PATH, ".."))
+
+from src.datasets.memmap_storage import save_collated, load_collated, is_memmap_storage, concat_collated
+
+
+class MockInMemoryDataset(InMemoryDataset):
+    def __init__(self, data, slices):
+        self.data, self.slices = data, slices
+        self.transform = None
+        self.__indices__ = None
+
+    def __len__(self):
+        return self.slices["pos"].shape[0] - 1
+
+
+class TestMemmapStorage(unittest.TestCase):
+    def setUp(self):
+        self.data_list = [
+            Data(
+                pos=torch.randn((n, 3)),
+                rgb=torch.rand((n, 3)),
+                y=torch.randint(0, 13, (n,)),
+                room_object_indices=torch.randint(0, 5, (n,)),
+            )
+            for n in [10, 25, 7]
+        ]
+
+    def test_roundtrip(self):
+        collated = InMemoryDataset.collate(None, self.data_list)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "train.pt")
+            save_collated(collated, path, memmap=True)
+            self.assertTrue(is_memmap_storage(torch.load(path)))
+            self.assertTrue(os.path.exists(os.path.join(tmp, "train.pt.columns", "pos.npy")))
+
+            data, slices = load_collated(path, memmap=True)
+            dataset = MockInMemoryDataset(data, slices)
+            self.assertEqual(len(dataset), 3)
+            for i, ref in enumerate(self.data_list):
+                d = dataset.get(i)
+                for key in ref.keys:
+                    npt.assert_array_equal(d[key].numpy(), ref[key].numpy())
+
+    def test_convert_legacy(self):
+        collated = InMemoryDataset.collate(None, self.data_list)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "train.pt")
+            save_collated(collated, path, memmap=False)
+            data, _ = load_collated(path, memmap=False)
+            self.assertFalse(is_memmap_storage(torch.load(path)))
+
+            data, slices = load_collated(path, memmap=True)
+            self.assertTrue(is_memmap_storage(torch.load(path)))
+            npt.assert_array_equal(data.y.numpy(), collated[0].y.numpy())
+            npt.assert_array_equal(slices["pos"].numpy(), collated[1]["pos"].numpy())
+
+    def test_concat(self):
+        extra = Data(pos=torch.randn((4, 3)), rgb=torch.rand((4, 3)), y=torch.zeros(4).long())
+        extra.room_object_indices = torch.zeros(4).long()
+        data_list = self.data_list + [extra]
+        collated = InMemoryDataset.collate(None, data_list)
+        parts = [InMemoryDataset.collate(None, data_list[:1]), InMemoryDataset.collate(None, data_list[1:])]
+        data, slices = concat_collated(parts)
+        for key in collated[0].keys:
+            npt.assert_array_equal(data[key].numpy(), collated[0][key].numpy())
+            npt.assert_array_equal(slices[key].numpy(), collated[1][key].numpy())
+
+
+if __name__ == "__main__":
+    unittest.main()
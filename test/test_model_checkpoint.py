@@ -54,6 +54,8 @@ class TestModelCheckpoint(unittest.TestCase):
 
         mock_metrics = {"current_metrics": {"acc": 12}, "stage": "test", "epoch": 10}
         model_checkpoint.save_best_models_under_current_metrics(model, mock_metrics)
+        mock_metrics = {"current_metrics": {"acc": 10}, "stage": "test", "epoch": 11}
+        model_checkpoint.save_best_models_under_current_metrics(model, mock_metrics)
 
         # Load checkpoint and initialize model
         model_checkpoint = ModelCheckpoint(self.run_path, name, "test", self.config, resume=True)
@@ -63,10 +65,14 @@ class TestModelCheckpoint(unittest.TestCase):
         self.assertEqual(model.optimizer.defaults, model2.optimizer.defaults)
         self.assertEqual(model.schedulers["lr_scheduler"].state_dict(), model2.schedulers["lr_scheduler"].state_dict())
         self.assertEqual(model.schedulers["bn_scheduler"].state_dict(), model2.schedulers["bn_scheduler"].state_dict())
+        # One blob for the weights and one for the optimizer
+        self.assertEqual(len(os.listdir(os.path.join(self.run_path, "{}.pt.blobs".format(name)))), 2)
 
         shutil.rmtree(self.run_path)
         remove(os.path.join(ROOT, "{}.pt".format(name)))
         remove(os.path.join(DIR, "{}.pt".format(name)))
+        shutil.rmtree(os.path.join(ROOT, "{}.pt.blobs".format(name)), ignore_errors=True)
+        shutil.rmtree(os.path.join(DIR, "{}.pt.blobs".format(name)), ignore_errors=True)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,69 @@
+import unittest
+import os
+import sys
+import tempfile
+import numpy as np
+import numpy.testing as npt
+import torch
+
+DIR_PATH = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(DIR_PATH, ".."))
+
+from src.metrics.prediction_writer import PredictionWriter, RemainingSamples
+
+
+class MockForwardDataset(torch.utils.data.Dataset):
+    def __init__(self, names):
+        self.names = names
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, index):
+        return index
+
+    def get_filename(self, index):
+        return self.names[index]
+
+
+class TestPredictionWriter(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.prediction = np.hstack((np.random.rand(10, 3), np.arange(10)[:, None] % 3))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_npy(self):
+        with PredictionWriter(self.tmp.name) as writer:
+            writer.write("example1.txt", self.prediction)
+        self.assertTrue(writer.is_done("example1.txt"))
+        self.assertEqual(os.listdir(self.tmp.name), ["example1_pred.npy"])
+        npt.assert_allclose(np.load(os.path.join(self.tmp.name, "example1_pred.npy")), self.prediction)
+
+    def test_compact(self):
+        probabilities = torch.softmax(torch.randn(10, 3), -1)
+        with PredictionWriter(self.tmp.name, output_format="compact", save_probabilities=True) as writer:
+            writer.write("example1.txt", self.prediction, probabilities)
+        out = np.load(writer.path("example1.txt"))
+        self.assertEqual(out["labels"].dtype, np.uint8)
+        npt.assert_equal(out["labels"], self.prediction[:, -1])
+        self.assertEqual(out["probabilities"].dtype, np.float16)
+        npt.assert_allclose(out["probabilities"], probabilities.numpy(), atol=1e-3)
+
+        with self.assertRaises(ValueError):
+            PredictionWriter(self.tmp.name, save_probabilities=True)
+
+    def test_resume(self):
+        dataset = MockForwardDataset(["example1.txt", "example2.txt", "example3.txt"])
+        with PredictionWriter(self.tmp.name) as writer:
+            writer.write("example2.txt", self.prediction)
+
+        remaining = RemainingSamples(dataset, writer)
+        self.assertEqual(len(remaining), 2)
+        self.assertEqual([remaining[i] for i in range(2)], [0, 2])
+        self.assertEqual(remaining.get_filename(2), "example3.txt")
+
+
+if __name__ == "__main__":
+    unittest.main()
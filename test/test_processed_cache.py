@@ -0,0 +1,86 @@
+import unittest
+import os
+import sys
+import tempfile
+import torch
+from torch_geometric.data import Data, InMemoryDataset
+import torch_geometric.transforms as T
+
+DIR_PATH = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(DIR_PATH, ".."))
+
+from src.datasets.processed_cache import ProcessedCacheMixin, save_raw_cache
+from src.core.data_transform import GridSampling
+
+
+class MockCachedDataset(ProcessedCacheMixin, InMemoryDataset):
+    def __init__(self, root, pre_transform=None, scale=1.0):
+        self.scale = scale
+        self.num_parsed = 0
+        super(MockCachedDataset, self).__init__(root, None, pre_transform, None)
+        self.data, self.slices = torch.load(self.processed_paths[0])
+
+    @property
+    def raw_file_names(self):
+        return []
+
+    @property
+    def processed_file_names(self):
+        return ["data.pt"]
+
+    def download(self):
+        pass
+
+    def processed_params(self):
+        return {"scale": self.scale}
+
+    def parse(self):
+        self.num_parsed += 1
+        torch.manual_seed(0)
+        return torch.rand(100, 3)
+
+    def process(self):
+        path = self.raw_cache_path("cloud")
+        if os.path.exists(path):
+            pos = torch.load(path)
+        else:
+            pos = self.parse()
+            save_raw_cache(pos, path)
+        pos = pos * self.scale
+        data = Data(pos=pos, y=torch.zeros(pos.shape[0], dtype=torch.long))
+        if self.pre_transform is not None:
+            data = self.pre_transform(data)
+        torch.save(self.collate([data]), self.processed_paths[0])
+
+
+class TestProcessedCache(unittest.TestCase):
+    def test_variants(self):
+        with tempfile.TemporaryDirectory() as root:
+            coarse = MockCachedDataset(root, pre_transform=GridSampling(0.5))
+            fine = MockCachedDataset(root, pre_transform=GridSampling(0.1))
+            self.assertNotEqual(coarse.processed_dir, fine.processed_dir)
+            self.assertLess(coarse[0].num_nodes, fine[0].num_nodes)
+            self.assertTrue(os.path.exists(coarse.processed_paths[0]))
+
+            # raw parsing done once for both variants
+            self.assertEqual(coarse.num_parsed, 1)
+            self.assertEqual(fine.num_parsed, 0)
+
+            again = MockCachedDataset(root, pre_transform=GridSampling(0.5))
+            self.assertEqual(again.processed_dir, coarse.processed_dir)
+            self.assertEqual(again[0].num_nodes, coarse[0].num_nodes)
+
+    def test_signature(self):
+        with tempfile.TemporaryDirectory() as root:
+            dataset = MockCachedDataset(root, pre_transform=T.Compose([GridSampling(0.1), T.Center()]))
+            self.assertNotEqual(
+                dataset.processed_dir, MockCachedDataset(root, pre_transform=GridSampling(0.1)).processed_dir
+            )
+            self.assertNotEqual(dataset.processed_dir, MockCachedDataset(root, scale=2.0).processed_dir)
+            self.assertNotEqual(
+                MockCachedDataset(root).processed_dir, MockCachedDataset(root, scale=2.0).processed_dir
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
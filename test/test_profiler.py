@@ -0,0 +1,135 @@
+import unittest
+import os
+import sys
+import json
+import tempfile
+from unittest import mock
+import torch
+
+DIR_PATH = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(DIR_PATH, ".."))
+
+from src.utils.timer import Profiler, PROFILER, time_func
+
+
+@time_func()
+def decorated():
+    with PROFILER.scope("inner"):
+        pass
+
+
+class TestProfiler(unittest.TestCase):
+    def tearDown(self):
+        PROFILER.disable()
+        PROFILER.reset()
+
+    def test_disabled(self):
+        profiler = Profiler()
+        with profiler.scope("a"):
+            pass
+        self.assertEqual(profiler.summary(), {})
+
+    def test_nested_scopes(self):
+        profiler = Profiler()
+        profiler.enable(memory=True)
+        for _ in range(3):
+            with profiler.scope("iteration"):
+                with profiler.scope("forward"):
+                    pass
+        summary = profiler.summary()
+        self.assertEqual(set(summary.keys()), {"iteration", "iteration/forward"})
+        self.assertEqual(summary["iteration/forward"]["count"], 3)
+        self.assertGreaterEqual(summary["iteration"]["total"], summary["iteration/forward"]["total"])
+        self.assertIn("peak_memory", summary["iteration"])
+        self.assertIn("memory_iteration", profiler.get_scalars())
+
+    def test_scope_peak_memory(self):
+        class FakeCuda:
+            allocated = 100
+            peak = 1000
+
+            def allocate(self, size):
+                self.allocated += size
+                self.peak = max(self.peak, self.allocated)
+
+            def reset(self):
+                self.peak = self.allocated
+
+        cuda = FakeCuda()
+        profiler = Profiler()
+        profiler.enable(memory=True)
+        with mock.patch.multiple(
+            "torch.cuda",
+            is_available=lambda: True,
+            memory_allocated=lambda: cuda.allocated,
+            max_memory_allocated=lambda: cuda.peak,
+            reset_max_memory_allocated=cuda.reset,
+        ):
+            with profiler.scope("iteration"):
+                cuda.allocate(50)
+                with profiler.scope("forward"):
+                    cuda.allocate(30)
+                    cuda.allocate(-30)
+                cuda.allocate(-50)
+                with profiler.scope("backward"):
+                    cuda.allocate(10)
+                    cuda.allocate(-10)
+        summary = profiler.summary()
+        self.assertEqual(summary["iteration/forward"]["peak_memory"], 30)
+        self.assertEqual(summary["iteration/backward"]["peak_memory"], 10)
+        self.assertEqual(summary["iteration"]["peak_memory"], 80)
+
+    def test_workers(self):
+        def no_cuda_in_workers(*args):
+            if torch.utils.data.get_worker_info() is not None:
+                raise RuntimeError("Cannot re-initialize CUDA in forked subprocess")
+            return 0
+
+        class ProfiledDataset(torch.utils.data.Dataset):
+            def __len__(self):
+                return 4
+
+            def __getitem__(self, index):
+                with PROFILER.scope("transform"):
+                    return torch.tensor([index])
+
+        with mock.patch.multiple(
+            "torch.cuda",
+            is_available=lambda: True,
+            synchronize=no_cuda_in_workers,
+            memory_allocated=no_cuda_in_workers,
+            max_memory_allocated=no_cuda_in_workers,
+            reset_max_memory_allocated=no_cuda_in_workers,
+        ):
+            PROFILER.enable(memory=True, synchronize=True)
+            loader = torch.utils.data.DataLoader(ProfiledDataset(), batch_size=2, num_workers=2)
+            with PROFILER.scope("epoch"):
+                batches = [batch for batch in loader]
+        self.assertEqual(len(batches), 2)
+        self.assertEqual(set(PROFILER.summary().keys()), {"epoch"})
+
+    def test_time_func(self):
+        decorated()
+        self.assertEqual(PROFILER.summary(), {})
+        PROFILER.enable()
+        with PROFILER.scope("train"):
+            decorated()
+        self.assertEqual(set(PROFILER.summary().keys()), {"train", "train/decorated", "train/decorated/inner"})
+
+    def test_chrome_trace(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "trace.json")
+            profiler = Profiler()
+            profiler.enable(trace_path=path)
+            with profiler.scope("a"):
+                with profiler.scope("b"):
+                    pass
+            profiler.export_chrome_trace()
+            with open(path, "r") as f:
+                events = json.load(f)["traceEvents"]
+        self.assertEqual([e["args"]["path"] for e in events], ["a/b", "a"])
+        self.assertTrue(all(e["ph"] == "X" and e["dur"] >= 0 for e in events))
+
+
+if __name__ == "__main__":
+    unittest.main()
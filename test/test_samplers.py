@@ -2,6 +2,7 @@ import os
 import sys
 import unittest
 import numpy as np
+import torch
 
 
 ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)))
@@ -27,6 +28,32 @@ class TestBalancedRandomSampler(unittest.TestCase):
         _, c = np.unique(labels[list(indices)], return_counts=True)
         self.assertGreater(0.005, np.std(c) / num_samples)
 
+    def test_labels(self):
+        labels = np.random.randint(0, 5, 1000)
+        sampler = BalancedRandomSampler([torch.tensor(label) for label in labels])
+        self.assertEqual(sampler.idx_classes.tolist(), list(range(5)))
+        self.assertEqual(sampler.counts.tolist(), np.bincount(labels).tolist())
+        for _ in range(3):
+            indices = list(sampler)
+            self.assertEqual(len(indices), 1000)
+            self.assertTrue(all(0 <= i < 1000 for i in indices))
+
+    def test_sharding(self):
+        labels = np.random.randint(0, 5, 1001)
+        samplers = [BalancedRandomSampler(labels, num_replicas=3, rank=rank, seed=2) for rank in range(3)]
+        self.assertEqual([len(sampler) for sampler in samplers], [334] * 3)
+
+        epoch = [list(sampler) for sampler in samplers]
+        self.assertEqual([len(indices) for indices in epoch], [334] * 3)
+        expected = BalancedRandomSampler(labels, seed=2).draw(334 * 3, np.random.RandomState(2))
+        self.assertEqual(np.stack(epoch, 1).reshape(-1).tolist(), expected.tolist())
+
+        # Same epoch for the same seed, different epochs
+        self.assertEqual(list(BalancedRandomSampler(labels, num_replicas=3, rank=1, seed=2)), epoch[1])
+        self.assertNotEqual(list(samplers[1]), epoch[1])
+        samplers[1].set_epoch(0)
+        self.assertEqual(list(samplers[1]), epoch[1])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,161 @@
+import unittest
+import os
+import sys
+import json
+import tempfile
+import numpy as np
+import numpy.testing as npt
+from plyfile import PlyData, PlyElement
+
+DIR_PATH = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(DIR_PATH, ".."))
+
+from src.datasets.segmentation import IGNORE_LABEL
+from src.datasets.segmentation.scannet import (
+    Scannet,
+    export,
+    read_aggregation,
+    read_label_mapping,
+    read_mesh_vertices_rgb,
+    read_segmentation,
+)
+
+
+def export_loops(mesh_file, agg_file, seg_file, meta_file, label_map_file):
+    """ Vertex by vertex implementation of export, used as reference
+    """
+    label_map = read_label_mapping(label_map_file, label_from="raw_category", label_to="nyu40id")
+    mesh_vertices = read_mesh_vertices_rgb(mesh_file)
+    for line in open(meta_file).readlines():
+        if "axisAlignment" in line:
+            axis_align_matrix = [float(x) for x in line.rstrip().strip("axisAlignment = ").split(" ")]
+            break
+    axis_align_matrix = np.array(axis_align_matrix).reshape((4, 4))
+    pts = np.ones((mesh_vertices.shape[0], 4))
+    pts[:, 0:3] = mesh_vertices[:, 0:3]
+    mesh_vertices[:, 0:3] = np.dot(pts, axis_align_matrix.transpose())[:, 0:3]
+
+    object_id_to_segs, label_to_segs = read_aggregation(agg_file)
+    with open(seg_file) as f:
+        seg_indices = json.load(f)["segIndices"]
+    seg_to_verts = {}
+    for i, seg_id in enumerate(seg_indices):
+        seg_to_verts.setdefault(seg_id, []).append(i)
+    num_verts = len(seg_indices)
+
+    label_ids = np.zeros(shape=(num_verts), dtype=np.uint32)
+    for label, segs in label_to_segs.items():
+        for seg in segs:
+            label_ids[seg_to_verts[seg]] = label_map[label]
+    instance_ids = np.zeros(shape=(num_verts), dtype=np.uint32)
+    object_id_to_label_id = {}
+    for object_id, segs in object_id_to_segs.items():
+        for seg in segs:
+            verts = seg_to_verts[seg]
+            instance_ids[verts] = object_id
+            if object_id not in object_id_to_label_id:
+                object_id_to_label_id[object_id] = label_ids[verts][0]
+    instance_bboxes = np.zeros((len(object_id_to_segs), 7))
+    for obj_id in object_id_to_segs:
+        obj_pc = mesh_vertices[instance_ids == obj_id, 0:3]
+        if len(obj_pc) == 0:
+            continue
+        xmin, ymin, zmin = np.min(obj_pc, 0)
+        xmax, ymax, zmax = np.max(obj_pc, 0)
+        instance_bboxes[obj_id - 1, :] = np.array(
+            [
+                (xmin + xmax) / 2,
+                (ymin + ymax) / 2,
+                (zmin + zmax) / 2,
+                xmax - xmin,
+                ymax - ymin,
+                zmax - zmin,
+                object_id_to_label_id[obj_id],
+            ]
+        )
+    return mesh_vertices, label_ids, instance_ids, instance_bboxes.astype(np.float32), object_id_to_label_id
+
+
+class TestScannetExport(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        rng = np.random.RandomState(0)
+        num_verts = 500
+
+        vertices = np.zeros(
+            num_verts, dtype=[("x", "f4"), ("y", "f4"), ("z", "f4"), ("red", "u1"), ("green", "u1"), ("blue", "u1")]
+        )
+        for key in ["x", "y", "z"]:
+            vertices[key] = rng.rand(num_verts) * 5
+        for key in ["red", "green", "blue"]:
+            vertices[key] = rng.randint(0, 256, num_verts)
+        self.mesh_file = os.path.join(self.tmp.name, "scene_vh_clean_2.ply")
+        PlyData([PlyElement.describe(vertices, "vertex")]).write(self.mesh_file)
+
+        # Sparse segment ids, the last segments are not annotated
+        seg_indices = (rng.randint(0, 30, num_verts) * 7 + 3).tolist()
+        self.seg_file = os.path.join(self.tmp.name, "scene_vh_clean_2.0.010000.segs.json")
+        with open(self.seg_file, "w") as f:
+            json.dump({"segIndices": seg_indices}, f)
+
+        # Segment 3 belongs to two objects with different labels, two objects share the label chair
+        groups = [
+            ("chair", [3, 10, 17]),
+            ("table", [24, 31]),
+            ("chair", [38, 45, 52, 59]),
+            ("wall", [66, 3]),
+            ("floor", [73, 80, 87, 94]),
+            ("unknown", [101, 108]),
+        ]
+        self.agg_file = os.path.join(self.tmp.name, "scene.aggregation.json")
+        with open(self.agg_file, "w") as f:
+            seg_groups = [{"objectId": i, "label": label, "segments": segs} for i, (label, segs) in enumerate(groups)]
+            json.dump({"segGroups": seg_groups}, f)
+
+        self.label_map_file = os.path.join(self.tmp.name, "labels.tsv")
+        with open(self.label_map_file, "w") as f:
+            f.write("raw_category\tnyu40id\n")
+            for label, nyu40id in [("chair", 5), ("table", 7), ("wall", 1), ("floor", 2), ("unknown", 40)]:
+                f.write("{}\t{}\n".format(label, nyu40id))
+
+        self.meta_file = os.path.join(self.tmp.name, "scene.txt")
+        with open(self.meta_file, "w") as f:
+            f.write("axisAlignment = 0 -1 0 1.5 1 0 0 -2 0 0 1 0.1 0 0 0 1\n")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_export(self):
+        files = [self.mesh_file, self.agg_file, self.seg_file, self.meta_file, self.label_map_file]
+        mesh_vertices, label_ids, instance_ids, instance_bboxes, object_id_to_label_id = export(*files)
+        reference = export_loops(*files)
+
+        npt.assert_array_equal(mesh_vertices, reference[0])
+        npt.assert_array_equal(label_ids, reference[1])
+        npt.assert_array_equal(instance_ids, reference[2])
+        npt.assert_array_equal(instance_bboxes, reference[3])
+        self.assertEqual(object_id_to_label_id, reference[4])
+        self.assertEqual(label_ids[instance_ids == 4][0], 1)
+
+    def test_read_segmentation(self):
+        seg_to_verts, num_verts = read_segmentation(self.seg_file)
+        self.assertEqual(num_verts, 500)
+        with open(self.seg_file) as f:
+            seg_indices = json.load(f)["segIndices"]
+        self.assertEqual(sum([len(verts) for verts in seg_to_verts.values()]), 500)
+        for seg_id, verts in seg_to_verts.items():
+            self.assertEqual(verts, [i for i, seg in enumerate(seg_indices) if seg == seg_id])
+
+    def test_remap_labels(self):
+        semantic_labels = np.random.RandomState(0).randint(0, 45, 1000)
+        expected = semantic_labels.copy()
+        for i in range(45):
+            if i in Scannet.VALID_CLASS_IDS:
+                expected[semantic_labels == i] = Scannet.VALID_CLASS_IDS.index(i)
+            elif i <= max(Scannet.SCANNET_COLOR_MAP.keys()):
+                expected[semantic_labels == i] = IGNORE_LABEL
+        npt.assert_array_equal(Scannet.remap_labels(semantic_labels), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,6 @@
 import unittest
 import numpy as np
+import torch
 import os
 import sys
 
@@ -69,6 +70,19 @@ class TestSegmentationTracker(unittest.TestCase):
         for k in ["test_acc", "test_miou", "test_macc"]:
             self.assertAlmostEqual(metrics[k], 0, 5)
 
+    def test_track_tensors(self):
+        tracker = SegmentationTracker(MockDataset(), ignore_label=-1)
+        model = MockModel()
+        model.outputs = [torch.tensor(o, dtype=torch.float) for o in model.outputs]
+        model.labels = [torch.tensor(l) for l in model.labels]
+        model.labels[3][2] = -1
+        model.iter = 3
+        tracker.track(model)
+        metrics = tracker.get_metrics(verbose=True)
+        for k in ["train_acc", "train_miou", "train_macc"]:
+            self.assertAlmostEqual(metrics[k], 100, 5)
+        self.assertEqual(list(metrics["train_iou_per_class"].keys()), [0])
+
     def test_ignore_label(self):
         tracker = SegmentationTracker(MockDataset())
         tracker.reset("test")
@@ -6,26 +6,34 @@ from omegaconf.dictconfig import DictConfig
 import numpy.testing as npt
 import numpy as np
 import copy
+import tempfile
+import shutil
 
 DIR = os.path.dirname(os.path.realpath(__file__))
 sys.path.insert(0, os.path.join(DIR, ".."))
 
 from test.mock_models import MockModel
+from src.datasets.segmentation.forward.base import BaseForwardDataset
 from src.datasets.segmentation.forward.shapenet import _ForwardShapenet, ForwardShapenetDataset
 
 
 class TestForwardData(unittest.TestCase):
     def setUp(self):
         self.datadir = os.path.join(DIR, "test_dataset")
+        self.tmp = tempfile.TemporaryDirectory()
         self.config = DictConfig(
             {
                 "dataroot": self.datadir,
+                "raw_cache_dir": self.tmp.name,
                 "test_transforms": [{"transform": "FixedPoints", "lparams": [2]}],
                 "category": ["Airplane", "Cap"],
                 "forward_category": "Airplane",
             }
         )
 
+    def tearDown(self):
+        self.tmp.cleanup()
+
     def test_fileList(self):
         test = _ForwardShapenet(self.datadir, 0)
         self.assertEqual(len(test), 2)
@@ -36,6 +44,45 @@ class TestForwardData(unittest.TestCase):
         self.assertEqual(data.sampleid, torch.tensor([0]))
         self.assertEqual(data.category[0], 10)
 
+    def test_raw_cache(self):
+        test = _ForwardShapenet(self.datadir, 0, cache_dir=self.tmp.name)
+        parsed = []
+        parse_file = test.parse_file
+        test.parse_file = lambda filename: parsed.append(filename) or parse_file(filename)
+
+        data = test[1]
+        raw = test.get_raw(1)
+        self.assertEqual(len(parsed), 1)
+        self.assertTrue(os.path.exists(test.cache_path(1)))
+        torch.testing.assert_allclose(raw.pos, data.pos)
+
+        uncached = _ForwardShapenet(self.datadir, 0).get_raw(1)
+        torch.testing.assert_allclose(raw.pos, uncached.pos)
+        torch.testing.assert_allclose(raw.x, uncached.x)
+
+    def test_raw_cache_sources(self):
+        other_dir = os.path.join(self.tmp.name, "other")
+        shutil.copytree(self.datadir, other_dir)
+        with open(os.path.join(other_dir, "example2.txt"), "w") as f:
+            f.write("0 0 0 1 0 0 3\n1 0 0 1 0 0 3\n")
+        cache_dir = os.path.join(self.tmp.name, "cache")
+        test = _ForwardShapenet(self.datadir, 0, cache_dir=cache_dir)
+        other = _ForwardShapenet(other_dir, 0, cache_dir=cache_dir)
+        self.assertNotEqual(test.cache_path(1), other.cache_path(1))
+        self.assertEqual(other.read_raw(1).shape[0], 2)
+        self.assertGreater(test.read_raw(1).shape[0], 2)
+
+        with open(os.path.join(other_dir, "example2.txt"), "a") as f:
+            f.write("2 0 0 1 0 0 3\n")
+        self.assertEqual(other.read_raw(1).shape[0], 3)
+
+    def test_parse_file_required(self):
+        class NoParser(BaseForwardDataset):
+            pass
+
+        with self.assertRaises(TypeError):
+            NoParser([])
+
     def test_break(self):
         config = copy.deepcopy(self.config)
         config.forward_category = "Other"
@@ -49,7 +96,14 @@ class TestForwardData(unittest.TestCase):
         for b in forward_set:
             self.assertEqual(b.origin_id.shape, (2, 2))
 
-        sparseconfig = DictConfig({"dataroot": self.datadir, "category": "Airplane", "forward_category": "Airplane"})
+        sparseconfig = DictConfig(
+            {
+                "dataroot": self.datadir,
+                "raw_cache_dir": self.tmp.name,
+                "category": "Airplane",
+                "forward_category": "Airplane",
+            }
+        )
         dataset = ForwardShapenetDataset(sparseconfig)
         dataset.create_dataloaders(MockModel(DictConfig({"conv_type": "PARTIAL_DENSE"})), 2, False, 1, False)
         forward_set = dataset.test_dataloaders[0]
@@ -70,6 +124,11 @@ class TestForwardData(unittest.TestCase):
             npt.assert_allclose(predicted["example1.txt"][:, -1], np.asarray([0, 0, 0]))
             npt.assert_allclose(predicted["example2.txt"][:, -1], np.asarray([1, 1, 1, 1]))
 
+            predicted, probabilities = dataset.predict_original_samples(b, "DENSE", output, with_probabilities=True)
+            self.assertEqual(predicted["example1.txt"].shape, (3, 4))
+            self.assertEqual(probabilities["example2.txt"].shape, (4, 2))
+            torch.testing.assert_allclose(probabilities["example2.txt"].sum(-1), torch.ones(4))
+
     def test_predictupsamplepartialdense(self):
         dataset = ForwardShapenetDataset(self.config)
         dataset.create_dataloaders(MockModel(DictConfig({"conv_type": "PARTIAL_DENSE"})), 2, False, 1, False)
@@ -0,0 +1,57 @@
+import unittest
+import os
+import sys
+import pickle
+import tempfile
+import numpy as np
+import torch
+from sklearn.neighbors import KDTree
+from torch_geometric.data import Data
+
+DIR_PATH = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(DIR_PATH, ".."))
+
+from src.datasets.spatial_index import SpatialIndexStore
+from src.core.data_transform import GridSphereSampling
+
+
+class TestSpatialIndexStore(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.clouds = [(i * 2, (rng.rand(5000 + 1000 * i, 3) * [4, 3, 2]).astype(np.float32)) for i in range(3)]
+        self.tmp = tempfile.TemporaryDirectory()
+        SpatialIndexStore.save(self.tmp.name, self.clouds)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_queries(self):
+        store = pickle.loads(pickle.dumps(SpatialIndexStore(self.tmp.name)))
+        self.assertEqual(len(store), 3)
+        self.assertNotIn(1, store)
+        for cloud_id, pos in self.clouds:
+            index, tree = store[cloud_id], KDTree(pos)
+            queries = pos[:50] + 0.01
+            for found, expected in zip(index.query_radius(queries, r=0.5), tree.query_radius(queries, r=0.5)):
+                np.testing.assert_array_equal(np.sort(found), np.sort(expected))
+            dist, ind = index.query(queries, k=1)
+            expected_dist, expected_ind = tree.query(queries, k=1)
+            np.testing.assert_array_equal(ind, expected_ind)
+            np.testing.assert_allclose(dist, expected_dist, atol=1e-5)
+
+    def test_sphere_sampling(self):
+        cloud_id, pos = self.clouds[1]
+        data = Data(pos=torch.from_numpy(pos), y=torch.arange(pos.shape[0]))
+        data_with_index = data.clone()
+        data_with_index.kd_tree = SpatialIndexStore(self.tmp.name)[cloud_id]
+        spheres = GridSphereSampling(0.5, grid_size=1.0)(data_with_index)
+        expected = GridSphereSampling(0.5, grid_size=1.0)(data)
+        self.assertEqual(len(spheres), len(expected))
+        for sphere, sphere_expected in zip(spheres, expected):
+            self.assertFalse(hasattr(sphere, "kd_tree"))
+            self.assertTrue(torch.equal(sphere.y.sort()[0], sphere_expected.y.sort()[0]))
+            self.assertEqual(sphere.center_label, sphere_expected.center_label)
+
+
+if __name__ == "__main__":
+    unittest.main()
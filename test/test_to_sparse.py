@@ -11,7 +11,7 @@ from omegaconf import OmegaConf
 DIR_PATH = os.path.dirname(os.path.realpath(__file__))
 sys.path.insert(0, os.path.join(DIR_PATH, ".."))
 
-from src.core.data_transform import ToSparseInput
+from src.core.data_transform import ToSparseInput, ShiftVoxels, quantize_data
 from src.utils.enums import ConvolutionFormat
 from src.datasets.multiscale_data import MultiScaleBatch
 
@@ -43,6 +43,30 @@ class TestSparse(unittest.TestCase):
         self.assertEqual(2, data_out.pos.shape[0])
         torch.testing.assert_allclose(data_out.x, torch.tensor([2, 1.5]))
 
+    def test_quantize_data(self):
+        pos = torch.randint(-50, 50, (5000, 3)).int()
+        batch = torch.cat([torch.zeros(2000), torch.ones(3000)]).long()
+        data = Data(pos=pos, x=torch.arange(5000), batch=batch)
+        data_out = quantize_data(data.clone(), mode="last", save_inverse=True)
+
+        # Same voxels and order as the unique rows of (batch, pos)
+        unique_pos, inverse = torch.unique(torch.cat([batch.unsqueeze(-1), pos.long()], -1), return_inverse=True, dim=0)
+        self.assertTrue(torch.equal(data_out.pos.long(), unique_pos[:, 1:]))
+        self.assertTrue(torch.equal(data_out.batch, unique_pos[:, 0]))
+        self.assertTrue(torch.equal(data_out.inverse_index, inverse))
+        last = torch.zeros(len(unique_pos), dtype=torch.long).scatter_(0, inverse, torch.arange(5000))
+        self.assertTrue(torch.equal(data_out.x, last))
+
+    def test_save_inverse(self):
+        pos = torch.rand(1000, 3) * 10
+        data = Data(pos=pos, y=torch.randint(0, 4, (1000,)))
+        transform = ToSparseInput(grid_size=1, mode="last", save_inverse=True)
+        data_out = ShiftVoxels()(transform(data.clone()))
+        self.assertEqual(data_out.inverse_index.shape[0], 1000)
+        voxel_pos = torch.floor(pos).int()
+        shift = data_out.pos[0] - voxel_pos[data_out.inverse_index == 0][0]
+        self.assertTrue(torch.equal(data_out.pos[data_out.inverse_index], voxel_pos + shift))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,6 +1,8 @@
 import unittest
 import sys
 import os
+import tempfile
+import random
 import torch_geometric.transforms as T
 import numpy as np
 import numpy.testing as npt
@@ -17,7 +19,9 @@ from src.core.data_transform import (
     instantiate_transform,
     instantiate_transforms,
     GridSampling,
+    GridSphereSampling,
     MultiScaleTransform,
+    MultiScaleCache,
     AddFeatByKey,
     AddFeatsByKeys,
     RemoveAttributes,
@@ -25,6 +29,11 @@ from src.core.data_transform import (
     RandomDropout,
     ShiftVoxels,
     PCACompute,
+    RandomNoise,
+    RandomSymmetry,
+    RandomScaleAnisotropic,
+    FusedAffineTransform,
+    fuse_affine_transforms,
 )
 from src.core.spatial_ops import RadiusNeighbourFinder, KNNInterpolate
 from src.utils.enums import ConvolutionFormat
@@ -95,6 +104,46 @@ class Testhelpers(unittest.TestCase):
         self.assertEqual(upsample[1].__inc__("x_idx", 0), ms[0].num_nodes)
         self.assertEqual(upsample[1].__inc__("y_idx", 0), pos.shape[0])
 
+    def test_multiscaleTransformsCache(self):
+        samplers = [GridSampling(0.25), None, GridSampling(0.5)]
+        search = [
+            RadiusNeighbourFinder(0.5, 100, ConvolutionFormat.PARTIAL_DENSE.value),
+            RadiusNeighbourFinder(0.5, 150, ConvolutionFormat.PARTIAL_DENSE.value),
+            RadiusNeighbourFinder(1, 200, ConvolutionFormat.PARTIAL_DENSE.value),
+        ]
+        upsampler = [KNNInterpolate(1), KNNInterpolate(1)]
+        strategies = {"sampler": samplers, "neighbour_finder": search, "upsample_op": upsampler}
+
+        pos = torch.rand((100, 3))
+        d = Data(pos=pos, x=torch.ones_like(pos)).contiguous()
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = MultiScaleCache(cache_dir, strategies)
+            ms_transform = MultiScaleTransform(strategies, cache=cache)
+            reference = MultiScaleTransform(strategies)(d.clone())
+            computed = ms_transform(d.clone())
+            self.assertEqual(len(os.listdir(cache.root)), 1)
+            cached = ms_transform(d.clone())
+
+            for ms in [computed, cached]:
+                for scale in range(reference.num_scales):
+                    npt.assert_almost_equal(ms.multiscale[scale].pos.numpy(), reference.multiscale[scale].pos.numpy())
+                    npt.assert_equal(
+                        ms.multiscale[scale].idx_neighboors.numpy(), reference.multiscale[scale].idx_neighboors.numpy()
+                    )
+                    self.assertEqual(
+                        ms.multiscale[scale].__inc__("idx_neighboors", 0),
+                        reference.multiscale[scale].__inc__("idx_neighboors", 0),
+                    )
+                for up in range(reference.num_upsample):
+                    self.assertEqual(ms.upsample[up].num_nodes, reference.upsample[up].num_nodes)
+                    npt.assert_equal(ms.upsample[up].x_idx.numpy(), reference.upsample[up].x_idx.numpy())
+                    self.assertEqual(ms.upsample[up].__inc__("x_idx", 0), reference.upsample[up].__inc__("x_idx", 0))
+                    self.assertEqual(ms.upsample[up].__inc__("y_idx", 0), reference.upsample[up].__inc__("y_idx", 0))
+
+            # A different configuration does not reuse the cache
+            other = MultiScaleCache(cache_dir, {"sampler": [GridSampling(0.3)], "neighbour_finder": search[:1]})
+            self.assertNotEqual(other.root, cache.root)
+
     def test_AddFeatByKey(self):
 
         add_to_x = [False, True]
@@ -187,6 +236,72 @@ class Testhelpers(unittest.TestCase):
         tr_data = tr(data.clone())
         self.assertGreaterEqual(tr_data.pos[0][0], data.pos[0][0])
 
+    def test_GridSphereSampling(self):
+        pos = torch.rand(500, 3) * torch.tensor([4.0, 2.0, 1.0])
+        data = Data(pos=pos, y=torch.arange(500), rgb=torch.rand(500, 3))
+        grid_centers = GridSampling(1.0)(data.clone()).pos
+        spheres = GridSphereSampling(0.8, grid_size=1.0)(data.clone())
+        self.assertEqual(len(spheres), len(grid_centers))
+        for sphere, center in zip(spheres, grid_centers):
+            dist = torch.norm(pos - center, dim=1)
+            expected = torch.nonzero(dist <= 0.8).view(-1)
+            ind = sphere.y.sort()[1]
+            npt.assert_array_equal(sphere.y[ind], expected)
+            npt.assert_allclose(sphere.pos[ind], pos[expected] - center, atol=1e-6)
+            npt.assert_array_equal(sphere.rgb[ind], data.rgb[expected])
+            self.assertEqual(sphere.center_label.item(), dist.argmin().item())
+
+    def test_GridSampling(self):
+        from torch_geometric.nn import voxel_grid
+        from torch_geometric.nn.pool.consecutive import consecutive_cluster
+        from torch_scatter import scatter_mean, scatter_add
+
+        pos = torch.rand(2000, 3) * torch.tensor([4.0, 2.0, 1.0])
+        batch = torch.cat([torch.zeros(800), torch.ones(1200)]).long()
+        data = Data(pos=pos, y=torch.randint(-1, 5, (2000,)), rgb=torch.rand(2000, 3), batch=batch)
+
+        # Former implementation, one hot encoding of the labels
+        cluster, perm = consecutive_cluster(voxel_grid(pos, batch, 0.3))
+        one_hot = torch.nn.functional.one_hot(data.y + 1)
+        expected_y = scatter_add(one_hot, cluster, dim=0).argmax(-1) - 1
+
+        sampled = GridSampling(0.3)(data.clone())
+        npt.assert_allclose(sampled.pos, scatter_mean(pos, cluster, dim=0), atol=1e-6)
+        npt.assert_allclose(sampled.rgb, scatter_mean(data.rgb, cluster, dim=0), atol=1e-6)
+        npt.assert_array_equal(sampled.y, expected_y)
+        npt.assert_array_equal(sampled.batch, batch[perm])
+
+        sampled = GridSampling(0.3, mode="last")(data.clone())
+        npt.assert_array_equal(sampled.pos, pos[perm])
+        npt.assert_array_equal(sampled.y, data.y[perm])
+
+    def test_fuse_affine_transforms(self):
+        transforms = [
+            RandomNoise(sigma=0.01),
+            T.RandomRotate(180, axis=2),
+            RandomScaleAnisotropic([0.8, 1.2]),
+            T.Center(),
+            RandomSymmetry([True, False, False]),
+            ShiftVoxels(),
+            RandomNoise(sigma=0.01),
+            T.RandomScale([0.9, 1.1]),
+        ]
+        fused = fuse_affine_transforms(T.Compose(transforms))
+        self.assertEqual(len(fused.transforms), 3)
+        self.assertIsInstance(fused.transforms[0], FusedAffineTransform)
+        self.assertIsInstance(fused.transforms[1], T.Center)
+        self.assertIsInstance(fused.transforms[2], FusedAffineTransform)
+
+        pos = torch.randn(100, 3)
+        for seed in range(5):
+            torch.manual_seed(seed)
+            random.seed(seed)
+            expected = T.Compose(transforms)(Data(pos=pos.clone())).pos
+            torch.manual_seed(seed)
+            random.seed(seed)
+            result = fused(Data(pos=pos.clone())).pos
+            torch.testing.assert_allclose(result, expected)
+
     def test_PCACompute(self):
         vec1 = torch.randn(3)
         vec1 = vec1 / torch.norm(vec1)
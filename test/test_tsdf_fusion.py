@@ -0,0 +1,79 @@
+import unittest
+import os
+import sys
+import numpy as np
+import numpy.testing as npt
+
+DIR_PATH = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(DIR_PATH, ".."))
+
+from src.datasets.registration.fusion import TSDFVolume, SparseTSDFVolume
+
+
+def render_depth(h, w, intrinsic, pose):
+    """ depth image of the plane z = 2 and of a sphere, some pixels are missing
+    """
+    pix_y, pix_x = np.mgrid[0:h, 0:w]
+    rays = np.stack(
+        [
+            (pix_x - intrinsic[0, 2]) / intrinsic[0, 0],
+            (pix_y - intrinsic[1, 2]) / intrinsic[1, 1],
+            np.ones((h, w)),
+        ],
+        -1,
+    )
+    rays = rays @ pose[:3, :3].T
+    origin = pose[:3, 3]
+    depth = (2.0 - origin[2]) / rays[..., 2]
+
+    oc = origin - np.array([0.2, 0.1, 1.6])
+    a = (rays ** 2).sum(-1)
+    b = 2 * (rays * oc).sum(-1)
+    c = (oc ** 2).sum() - 0.25 ** 2
+    disc = b * b - 4 * a * c
+    hit = disc > 0
+    depth_sphere = (-b - np.sqrt(np.maximum(disc, 0))) / (2 * a)
+    depth[hit] = np.minimum(depth, depth_sphere)[hit]
+    depth[np.random.RandomState(0).rand(h, w) < 0.05] = 0
+    return depth
+
+
+class TestSparseTSDFVolume(unittest.TestCase):
+    def setUp(self):
+        self.intrinsic = np.array([[60.0, 0, 32], [0, 60.0, 24], [0, 0, 1]])
+        self.poses = []
+        for angle in [0.0, 0.15, -0.1]:
+            pose = np.eye(4)
+            c, s = np.cos(angle), np.sin(angle)
+            pose[:3, :3] = np.array([[c, 0, s], [0, 1, 0], [-s, 0, c]])
+            pose[:3, 3] = [0.1 * angle, 0.05, 0.0]
+            self.poses.append(pose)
+        bounds = np.array([[-1.2, 1.2], [-1.0, 1.0], [0.5, 2.3]])
+        self.dense = TSDFVolume(bounds.copy(), 0.02, use_gpu=False)
+        self.sparse = SparseTSDFVolume(bounds.copy(), 0.02)
+
+    def _integrate(self, poses):
+        for pose in poses:
+            depth = render_depth(48, 64, self.intrinsic, pose)
+            self.dense.integrate(depth, self.intrinsic, pose)
+            self.sparse.integrate(depth, self.intrinsic, pose)
+
+    def test_point_cloud(self):
+        self._integrate(self.poses[:2])
+        npt.assert_array_equal(self.sparse.get_point_cloud(0.2, 0.0), self.dense.get_point_cloud(0.2, 0.0))
+        # blocks allocated by the last frame also integrate the previous frames
+        self._integrate(self.poses[2:])
+        npt.assert_array_equal(self.sparse.get_point_cloud(0.2, 0.0), self.dense.get_point_cloud(0.2, 0.0))
+        self.assertLess(self.sparse.num_blocks, np.prod(self.sparse._grid_dim))
+
+    def test_mesh(self):
+        self._integrate(self.poses)
+        verts, faces, norms = self.sparse.get_mesh()
+        verts_dense, faces_dense, norms_dense = self.dense.get_mesh()
+        npt.assert_allclose(verts, verts_dense, atol=1e-5)
+        npt.assert_array_equal(faces, faces_dense)
+        npt.assert_array_equal(norms, norms_dense)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import unittest
+import os
+import sys
+import torch
+
+DIR_PATH = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(DIR_PATH, ".."))
+
+from src.core.spatial_ops.voxel_search import VoxelGridSearch
+from src.core.spatial_ops import (
+    RadiusNeighbourFinder,
+    KNNNeighbourFinder,
+    MultiscaleRadiusNeighbourFinder,
+    DenseRadiusNeighbourFinder,
+)
+
+
+def brute_force(x, y, batch_x, batch_y):
+    dist = torch.cdist(y, x) ** 2
+    dist[batch_y.view(-1, 1) != batch_x.view(1, -1)] = float("inf")
+    return dist
+
+
+class IndexOrderSearch:
+    """ Returns the first neighbours by index like the cuda kernels of torch_cluster and torch_points_kernels
+    """
+
+    def radius(self, x, y, radius, max_num_neighbors, batch_x=None, batch_y=None, mode="partial_dense"):
+        if mode == "dense":
+            dist = torch.cdist(y, x) ** 2
+        else:
+            dist = brute_force(x, y, batch_x, batch_y)
+        within = dist <= radius ** 2
+        rank = within.long().cumsum(-1) - 1
+        keep = within & (rank < max_num_neighbors)
+        if mode != "dense":
+            row, col = keep.nonzero().t()
+            return row, col
+
+        rank[~keep] = max_num_neighbors
+        idx = torch.full(dist.shape[:-1] + (max_num_neighbors + 1,), -1, dtype=torch.long)
+        idx.scatter_(-1, rank, torch.arange(x.shape[1]).expand_as(rank))
+        sq_dist = torch.full(idx.shape, -1.0).scatter_(-1, rank, dist)
+        idx, sq_dist = idx[:, :, :max_num_neighbors], sq_dist[:, :, :max_num_neighbors]
+        return torch.where(idx >= 0, idx, idx[:, :, :1].expand_as(idx)), sq_dist
+
+
+class TestVoxelGridSearch(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        self.x = torch.rand(3000, 3)
+        self.batch_x = torch.cat([torch.zeros(1000), torch.ones(2000)]).long()
+        self.y = torch.rand(500, 3)
+        self.batch_y = torch.cat([torch.zeros(200), torch.ones(300)]).long()
+        self.backend = VoxelGridSearch(num_threads=2, chunk_size=64)
+
+    def test_radius(self):
+        idx, dist = self.backend.radius(self.x, self.y, 0.1, 16, self.batch_x, self.batch_y)
+        expected = brute_force(self.x, self.y, self.batch_x, self.batch_y)
+        for i in range(self.y.shape[0]):
+            found = idx[i][idx[i] >= 0]
+            within = torch.nonzero(expected[i] <= 0.01).view(-1)
+            self.assertEqual(len(found), min(len(within), 16))
+            self.assertTrue(bool((expected[i][found] <= 0.01).all()))
+            # closest first
+            found_dist = dist[i][: len(found)]
+            self.assertTrue(bool((found_dist[1:] >= found_dist[:-1]).all()))
+
+    def test_knn(self):
+        idx, dist = self.backend.knn(self.x, self.y, 8, self.batch_x, self.batch_y, mode="partial_dense")
+        expected = brute_force(self.x, self.y, self.batch_x, self.batch_y).topk(8, largest=False)
+        torch.testing.assert_allclose(dist, expected[0], atol=1e-5, rtol=0)
+        self.assertTrue(torch.equal(self.batch_x[idx], self.batch_y.view(-1, 1).expand_as(idx)))
+
+    def test_layouts(self):
+        row, col = self.backend.radius(self.x, self.y, 0.1, 16, self.batch_x, self.batch_y, mode="message_passing")
+        idx, _ = self.backend.radius(self.x, self.y, 0.1, 16, self.batch_x, self.batch_y)
+        self.assertTrue(torch.equal(col, idx[idx >= 0]))
+        self.assertTrue(torch.equal(row.bincount(minlength=500), (idx >= 0).sum(1)))
+
+        x = torch.rand(2, 200, 3)
+        idx, dist = self.backend.radius(x, x[:, :20], 0.2, 8, mode="dense")
+        self.assertEqual(idx.shape, (2, 20, 8))
+        self.assertTrue(torch.equal(idx[:, :, 0], torch.arange(20).expand(2, 20)))
+        self.assertTrue(bool(((idx == idx[:, :, :1]) | (dist >= 0)).all()))
+
+    def test_neighbour_finders(self):
+        finder = RadiusNeighbourFinder(0.1, 16, backend="voxel_grid")
+        self.assertEqual(finder(self.x, self.y, self.batch_x, self.batch_y).shape[0], 2)
+        finder = MultiscaleRadiusNeighbourFinder([0.1, 0.2], 16, backend=self.backend)
+        self.assertEqual(finder(self.x, self.y, self.batch_x, self.batch_y, scale_idx=1).shape[0], 2)
+        finder = KNNNeighbourFinder(4, backend=self.backend)
+        self.assertEqual(finder(self.x, self.y, self.batch_x, self.batch_y).shape, (2, 500 * 4))
+
+    def test_nested_multiscale(self):
+        finder = MultiscaleRadiusNeighbourFinder([0.05, 0.1, 0.08], [4, 32, 16], backend=self.backend, nested=True)
+        nested = finder.find_multiscale_neighbours(self.x, self.y, self.batch_x, self.batch_y)
+        finder.nested = False
+        expected = finder.find_multiscale_neighbours(self.x, self.y, self.batch_x, self.batch_y)
+        for (row, col), (row_expected, col_expected) in zip(nested, expected):
+            self.assertTrue(torch.equal(row, row_expected))
+            self.assertTrue(torch.equal(col, col_expected))
+
+        x = torch.rand(2, 500, 3)
+        finder = DenseRadiusNeighbourFinder([0.1, 0.2], [8, 16], backend=self.backend, nested=True)
+        nested = finder.find_multiscale_neighbours(x, x[:, :50])
+        finder.nested = False
+        expected = finder.find_multiscale_neighbours(x, x[:, :50])
+        for idx, idx_expected in zip(nested, expected):
+            self.assertTrue(torch.equal(idx, idx_expected))
+
+    def test_nested_saturated(self):
+        # The largest search is saturated, the smaller scales are searched again for the incomplete query points
+        backend = IndexOrderSearch()
+        finder = MultiscaleRadiusNeighbourFinder([0.05, 0.2, 0.1], [16, 12, 8], backend=backend, nested=True)
+        nested = finder.find_multiscale_neighbours(self.x, self.y, self.batch_x, self.batch_y)
+        finder.nested = False
+        expected = finder.find_multiscale_neighbours(self.x, self.y, self.batch_x, self.batch_y)
+        for (row, col), (row_expected, col_expected) in zip(nested, expected):
+            self.assertTrue(torch.equal(row, row_expected))
+            self.assertTrue(torch.equal(col, col_expected))
+
+        x = torch.rand(2, 500, 3)
+        finder = DenseRadiusNeighbourFinder([0.1, 0.2], [8, 4], backend=backend, nested=True)
+        nested = finder.find_multiscale_neighbours(x, x[:, :50])
+        finder.nested = False
+        expected = finder.find_multiscale_neighbours(x, x[:, :50])
+        for idx, idx_expected in zip(nested, expected):
+            self.assertTrue(torch.equal(idx, idx_expected))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -18,13 +18,20 @@ from src.metrics.base_tracker import BaseTracker
 from src.metrics.colored_tqdm import Coloredtqdm as Ctq
 from src.metrics.model_checkpoint import ModelCheckpoint
 
+from src.core.spatial_ops.neighbour_finder import set_search_backend
+
 # Utils import
 from src.utils.colors import COLORS
 from src.utils.config import launch_wandb
+from src.utils.timer import PROFILER, profile_scope
 from src.visualization import Visualizer
 
 log = logging.getLogger(__name__)
 
+# Number of iterations between two updates of the metrics shown in the progress bars, computing the metrics
+# waits for the device
+PROGRESS_REFRESH_RATE = 10
+
 
 def train_epoch(
     epoch: int,
@@ -44,20 +51,23 @@ def train_epoch(
     iter_data_time = time.time()
     with Ctq(train_loader) as tq_train_loader:
         for i, data in enumerate(tq_train_loader):
-            model.set_input(data, device)
+            with profile_scope("set_input"):
+                model.set_input(data, device)
             t_data = time.time() - iter_data_time
+            tracker.track_timing(data_loading=t_data)
 
             iter_start_time = time.time()
-            model.optimize_parameters(epoch, dataset.batch_size)
-            if i % 10 == 0:
-                tracker.track(model)
-
-            tq_train_loader.set_postfix(
-                **tracker.get_metrics(),
-                data_loading=float(t_data),
-                iteration=float(time.time() - iter_start_time),
-                color=COLORS.TRAIN_COLOR
-            )
+            with profile_scope("optimize_parameters"):
+                model.optimize_parameters(epoch, dataset.batch_size)
+            if i % PROGRESS_REFRESH_RATE == 0:
+                with profile_scope("metrics"):
+                    tracker.track(model)
+                    tq_train_loader.set_postfix(
+                        **tracker.get_metrics(),
+                        data_loading=float(t_data),
+                        iteration=float(time.time() - iter_start_time),
+                        color=COLORS.TRAIN_COLOR
+                    )
 
             if visualizer.is_active:
                 visualizer.save_visuals(model.get_current_visuals())
@@ -87,13 +97,14 @@ def eval_epoch(
     visualizer.reset(epoch, "val")
     loader = dataset.val_dataloader
     with Ctq(loader) as tq_val_loader:
-        for data in tq_val_loader:
+        for i, data in enumerate(tq_val_loader):
             with torch.no_grad():
                 model.set_input(data, device)
                 model.forward()
 
             tracker.track(model)
-            tq_val_loader.set_postfix(**tracker.get_metrics(), color=COLORS.VAL_COLOR)
+            if i % PROGRESS_REFRESH_RATE == 0:
+                tq_val_loader.set_postfix(**tracker.get_metrics(), color=COLORS.VAL_COLOR)
 
             if visualizer.is_active:
                 visualizer.save_visuals(model.get_current_visuals())
@@ -125,13 +136,14 @@ def test_epoch(
         tracker.reset(stage_name)
         visualizer.reset(epoch, stage_name)
         with Ctq(loader) as tq_test_loader:
-            for data in tq_test_loader:
+            for i, data in enumerate(tq_test_loader):
                 with torch.no_grad():
                     model.set_input(data, device)
                     model.forward()
 
                 tracker.track(model)
-                tq_test_loader.set_postfix(**tracker.get_metrics(), color=COLORS.TEST_COLOR)
+                if i % PROGRESS_REFRESH_RATE == 0:
+                    tq_test_loader.set_postfix(**tracker.get_metrics(), color=COLORS.TEST_COLOR)
 
                 if visualizer.is_active:
                     visualizer.save_visuals(model.get_current_visuals())
@@ -158,6 +170,9 @@ def run(
         if dataset.has_test_loaders:
             test_epoch(epoch, model, dataset, device, tracker, checkpoint, visualizer, early_break)
 
+        if PROFILER.enabled and PROFILER.trace_path:
+            PROFILER.export_chrome_trace()
+
     # Single test evaluation in resume case
     if checkpoint.start_epoch > cfg.training.epochs:
         if dataset.has_test_loaders:
@@ -174,6 +189,15 @@ def main(cfg):
     device = torch.device("cuda" if (torch.cuda.is_available() and cfg.training.cuda) else "cpu")
     log.info("DEVICE : {}".format(device))
 
+    # Profiling of the training loop
+    profiling = getattr(cfg.debugging, "profiling", None)
+    if profiling and profiling.enable:
+        PROFILER.enable(
+            memory=profiling.get("memory", False),
+            trace_path=profiling.get("trace", None),
+            synchronize=profiling.get("synchronize", True),
+        )
+
     # Enable CUDNN BACKEND
     torch.backends.cudnn.enabled = cfg.training.enable_cudnn
 
@@ -202,12 +226,17 @@ def main(cfg):
     log.info("Model size = %i", sum(param.numel() for param in model.parameters() if param.requires_grad))
 
     # Set dataloaders
+    set_search_backend(getattr(cfg.training, "search_backend", None))
     dataset.create_dataloaders(
         model,
         cfg.training.batch_size,
         cfg.training.shuffle,
         cfg.training.num_workers,
         cfg.training.precompute_multi_scale,
+        persistent_workers=cfg.training.get("persistent_workers", False) or False,
+        prefetch=cfg.training.get("prefetch", 0) or 0,
+        pin_memory=cfg.training.get("pin_memory", False) or False,
+        device=device,
     )
     log.info(dataset)
 